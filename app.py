@@ -1,14 +1,35 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_from_directory, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, send_from_directory, jsonify, make_response, Response, stream_with_context
+from jinja2 import FileSystemBytecodeCache
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import secrets
+import base64
 import json
 import os
 import pickle
 import sqlite3
+import hashlib
+import threading
 from pathlib import Path
 
+from media_integrity_scrubber import integrity_scrubber
+from media_garbage_collector import media_gc
+from video_catalog_cache import video_catalog_cache
+from search_index import video_search_index, ticket_search_index
+from video_recommendations import video_recommender
+from video_view_stats import video_view_rollup, POPULAR_PERIODS
+from fragment_cache import fragment_cache, TAG_CATALOG, TAG_USERS, TAG_FAQS
+from report_rollups import report_rollups
+from stats_snapshot import stats_snapshot
+from support_metrics import support_metrics
+from ticket_classifier import ticket_classifier
+from faq_similarity import faq_similarity
+from ticket_queue import ticket_queue
+from chat_inbox import chat_inbox, HISTORY_PAGE_SIZE
+from event_stream import event_broker, gateway_forwarder
+from bulk_tickets import bulk_ticket_operations, ANSWER_TEMPLATES, render_template_text
+
 # Import cloud sync system
 try:
     from cloud_sync_system import sync_manager
@@ -70,6 +91,21 @@ except ImportError:
                     face_id_system = None
                     print("WARNING: Face ID system not available (install opencv-python)")
 
+# Optional compact binary encodings for /api/videos (negotiated via Accept)
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    msgpack = None
+
+try:
+    import cbor2
+    CBOR_AVAILABLE = True
+except ImportError:
+    CBOR_AVAILABLE = False
+    cbor2 = None
+
 # Global sync trigger function
 def trigger_comprehensive_sync(action_type, details=""):
     """Trigger comprehensive sync for ANY change made by non-student users"""
@@ -102,8 +138,35 @@ def log_and_sync_change(user_id, action, details):
         if user and user[0] != 'student':
             trigger_comprehensive_sync(action, details)
 
+# Shared with chat_gateway.py, which reads the same session cookie
+SESSION_SECRET_FILE = 'session_secret.key'
+
+def load_session_secret(path=SESSION_SECRET_FILE):
+    """Session signing key, generated on first start and kept across restarts"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            secret = f.read().strip()
+        if secret:
+            return secret
+    except FileNotFoundError:
+        pass
+    secret = secrets.token_hex(32)
+    try:
+        # Created owner-only from the start, never readable under the umask
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another process created it first; use that one
+        with open(path, 'r', encoding='utf-8') as f:
+            secret = f.read().strip()
+        if not secret:
+            raise RuntimeError(f"{path} is empty; delete it to generate a new session key")
+        return secret
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(secret)
+    return secret
+
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
+app.secret_key = load_session_secret()
 
 # Debug mode disabled - simplified authentication working
 app.config['DEBUG'] = True
@@ -112,9 +175,24 @@ app.config['DEBUG'] = True
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv'}
 MAX_CONTENT_LENGTH = 5 * 1024 * 1024 * 1024  # 5GB max file size
+API_VIDEOS_DEFAULT_LIMIT = 50  # /api/videos page size
+API_VIDEOS_MAX_LIMIT = 200
+
+# /api/videos field projection (fields=...) and compact column format (format=columns)
+API_VIDEO_FIELDS = ['id', 'title', 'description', 'course_category', 'subject', 'upload_date',
+                    'uploaded_by', 'teacher_name', 'teacher_subdivision', 'views', 'filename',
+                    'video_url', 'streaming_url', 'cross_device_compatible', 'mobile_optimized']
+API_VIDEO_ADMIN_FIELDS = ['is_active', 'file_path']
+API_VIDEO_COMPACT_FIELDS = ['id', 'title', 'course_category', 'subject', 'upload_date',
+                            'teacher_name', 'teacher_subdivision', 'views', 'filename']
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+# The daily media GC sweep only reports orphans unless this is turned on
+app.config['MEDIA_GC_DELETE_ORPHANS'] = False
+
+# Compiled templates are kept on disk (system temp dir) so restarts skip Jinja compilation
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
 
 # Create upload directory if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -250,6 +328,42 @@ def restore_session_if_exists():
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Video catalog version - bumped on upload, delete, toggle and edit so API clients
+# can revalidate with If-None-Match. The boot token keeps ETags from a previous
+# process from matching after a restart. View counts do not bump the version.
+catalog_version_lock = threading.Lock()
+catalog_version_state = {'boot': secrets.token_hex(4), 'counter': 0}
+
+def get_catalog_version():
+    """Current catalog version string (no database access)"""
+    return f"{catalog_version_state['boot']}-{catalog_version_state['counter']}"
+
+def bump_catalog_version(event, video_id=None):
+    """Record a catalog change (event: upload, delete, toggle, edit)"""
+    with catalog_version_lock:
+        catalog_version_state['counter'] += 1
+        version = get_catalog_version()
+    video_catalog_cache.invalidate(event, video_id)
+    fragment_cache.bump(TAG_CATALOG)
+    stats_snapshot.invalidate()
+    print(f"INFO: Video catalog version {version} after {event}" + (f" of video {video_id}" if video_id else ""))
+    return version
+
+def render_cached_page(name, template, build_context, ttl=300, tags=(), key=()):
+    """render_template through the fragment cache
+    
+    build_context() only runs on a miss, so repeat views skip their SQL as well
+    as the template. The context is shared by every user of a role; the HTML is
+    kept per viewer because layouts show the logged-in user, and it is rendered
+    fresh while flash messages are pending so they are not lost.
+    """
+    role = session.get('role')
+    context = fragment_cache.get_or_render((name, 'context', role) + key, build_context, ttl, tags)
+    if session.get('_flashes'):
+        return render_template(template, **context)
+    return fragment_cache.get_or_render((name, 'html', role, session.get('user_id')) + key,
+                                        lambda: render_template(template, **context), ttl, tags)
+
 def init_database():
     """Initialize the database with required tables"""
     # Run database migration first to ensure enhanced columns exist
@@ -443,6 +557,19 @@ def init_database():
         )
     ''')
     
+    # Playback events (one row per stream) feeding recommendations and view rollups
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS video_view_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            video_id INTEGER NOT NULL,
+            viewed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (video_id) REFERENCES videos (id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_video_view_events_user ON video_view_events (user_id, video_id)')
+    
     # Chat messages table for communication system
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS chat_messages (
@@ -458,23 +585,86 @@ def init_database():
         )
     ''')
     
-    # Chat conversations table
+    # Chat polling: per-direction id range scans, and a small index of unread messages only
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_messages_pair ON chat_messages (sender_id, receiver_id, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_messages_unread ON chat_messages (receiver_id, sender_id) '
+                   'WHERE is_read = 0')
+    
+    # Full-text search index over videos (kept in sync by triggers)
+    video_search_index.ensure_schema(cursor)
+    
+    # Full-text search index over support tickets (kept in sync by triggers)
+    ticket_search_index.ensure_schema(cursor)
+    
+    # Media integrity scrubber results and resume cursor
+    integrity_scrubber.ensure_schema(cursor)
+    
+    # Last source row folded into each rollup or backfill, by name (shared by the jobs below)
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user1_id INTEGER NOT NULL,
-            user2_id INTEGER NOT NULL,
-            last_message_id INTEGER,
-            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user1_id) REFERENCES users (id),
-            FOREIGN KEY (user2_id) REFERENCES users (id),
-            FOREIGN KEY (last_message_id) REFERENCES chat_messages (id)
+        CREATE TABLE IF NOT EXISTS rollup_watermarks (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
     
-    conn.commit()
+    # Daily view counts and trending scores rolled up from video_view_events
+    video_view_rollup.ensure_schema(cursor)
+    
+    # Daily report aggregates (backfilled on first run against an existing database)
+    report_rollups.ensure_schema(cursor)
     
+    # Indexes behind the support center's pending and resolved lists
+    support_metrics.ensure_schema(cursor)
+    
+    # Ticket categories are assigned at submit time; index them for breakdowns
+    ticket_classifier.ensure_schema(cursor)
+    
+    # Priority, SLA deadline and claim lease columns for the pending-ticket queue
+    ticket_queue.ensure_schema(cursor)
+    
+    # One row per chat pair with unread counters and the last message (merges duplicates once)
+    chat_inbox.ensure_schema(cursor)
+    
+    conn.commit()
+
+def record_category_batch():
+    """on_batch hook for the ticket classifier backfill: fold changed categories into the support metrics"""
+    batch = {}
+    def record(cursor, ticket_ids, phase):
+        if phase == 'committed':
+            support_metrics.record(batch.pop('before'), batch.pop('after'))
+            fragment_cache.bump(TAG_FAQS)
+            stats_snapshot.invalidate()
+        else:
+            batch[phase] = support_metrics.capture(cursor, ticket_ids)
+    return record
+
+def start_background_services():
+    """Start background maintenance workers (call once after init_database)"""
+    integrity_scrubber.start()
+    print("SUCCESS: Media integrity scrubber started")
+    media_gc.start(delete_orphans=app.config['MEDIA_GC_DELETE_ORPHANS'])
+    print(f"SUCCESS: Media garbage collector scheduled "
+          f"({'deleting' if media_gc.delete_orphans else 'report only'})")
+    video_recommender.start()
+    print("SUCCESS: Video recommendations scheduled")
+    video_view_rollup.start()
+    print("SUCCESS: Video view rollups scheduled")
+    report_rollups.start()
+    print("SUCCESS: Report rollups scheduled")
+    support_metrics.start()
+    print("SUCCESS: Support metrics reconciliation scheduled")
+    ticket_classifier.start(on_batch=record_category_batch())
+    print("SUCCESS: Ticket classifier backfill scheduled")
+    faq_similarity.start()
+    print("SUCCESS: FAQ similarity index scheduled")
+    ticket_queue.start()
+    print("SUCCESS: Ticket queue rescoring scheduled")
+    event_broker.add_listener(gateway_forwarder.send)
+    gateway_forwarder.start(app.secret_key)
+    print("SUCCESS: Chat gateway event feed scheduled")
+
 # Create default accounts after database initialization
 def create_default_accounts():
     """Create default accounts for all 7 roles"""
@@ -679,6 +869,7 @@ def update_existing_accounts_with_names(conn, cursor):
                     print(f"Updated {username} with name: {name_mapping[username]}")
             
             conn.commit()
+            fragment_cache.bump(TAG_USERS)
             print("Account names updated successfully!")
             
     except Exception as e:
@@ -1068,11 +1259,13 @@ def dashboard():
     
     role = session.get('role')
     display_name = session.get('full_name') or session.get('username')
-    return render_template(f'dashboard_{role}.html', 
-                         username=session.get('username'),
-                         display_name=display_name,
-                         role=role,
-                         subdivision=session.get('subdivision'))
+    # Dashboards only vary by viewer, so the whole page is cached per user
+    return render_cached_page('dashboard', f'dashboard_{role}.html', lambda: {
+                                  'username': session.get('username'),
+                                  'display_name': display_name,
+                                  'role': role,
+                                  'subdivision': session.get('subdivision')
+                              }, key=(session.get('user_id'), session.get('username'), display_name))
 
 @app.route('/upload_video', methods=['GET', 'POST'])
 @check_permission('upload_videos')
@@ -1158,8 +1351,10 @@ def upload_video():
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (title, description, filename, final_file_path, session['user_id'],
                   course_category, subject, session.get('subdivision')))
+            video_id = cursor.lastrowid
             conn.commit()
             conn.close()
+            bump_catalog_version('upload', video_id)
             
             # Log and trigger comprehensive sync for cross-device availability
             log_and_sync_change(session['user_id'], 'video_upload', 
@@ -1209,31 +1404,158 @@ def student_faqs():
 @check_permission('view_videos')
 def view_videos():
     """Video viewing for students - Cross-device compatible"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT v.id, v.title, v.description, v.course_category, v.subject,
-               v.upload_date, u.username as uploaded_by, u.full_name as teacher_name,
-               v.teacher_subdivision, v.views, v.filename
-        FROM videos v
-        JOIN users u ON v.uploaded_by = u.id
-        WHERE v.is_active = 1
-        ORDER BY v.upload_date DESC
-    ''')
-    videos = cursor.fetchall()
-    conn.close()
+    def build_context():
+        videos = [(v.id, v.title, v.description, v.course_category, v.subject,
+                   v.upload_date, v.uploader_username, v.uploader_name,
+                   v.teacher_subdivision, v.views, v.filename)
+                  for v in video_catalog_cache.videos()]
+        return {'videos': videos}
     
-    return render_template('view_videos.html', videos=videos)
+    # View counts may lag by up to the TTL; catalog changes invalidate via the version key
+    return render_cached_page('view_videos', 'view_videos.html', build_context, ttl=120,
+                              key=(get_catalog_version(),))
 
 @app.route('/mobile_videos')
 @check_permission('view_videos')
 def mobile_videos():
     """Mobile-optimized video viewing for cross-device access"""
-    return render_template('mobile_videos.html')
+    # Render only the first page; the page pulls the rest from /api/videos?after=<next_cursor>
+    include_inactive = session.get('role', 'student') != 'student'
+    videos, next_cursor, _ = fetch_video_page(include_inactive, API_VIDEOS_DEFAULT_LIMIT)
+    
+    return render_template('mobile_videos.html',
+                         videos=[format_video_for_api(video, session.get('role', 'student')) for video in videos],
+                         next_cursor=next_cursor,
+                         page_size=API_VIDEOS_DEFAULT_LIMIT)
+
+# Keyset pagination for the video catalog, ordered by (upload_date, id) newest first
+def encode_video_cursor(upload_date, video_id):
+    """Opaque cursor pointing just after the given (upload_date, id) row"""
+    raw = json.dumps([upload_date, video_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_video_cursor(cursor_value):
+    """Inverse of encode_video_cursor; raises ValueError for malformed cursors"""
+    try:
+        padded = cursor_value + '=' * (-len(cursor_value) % 4)
+        upload_date, video_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return str(upload_date), int(video_id)
+    except Exception:
+        raise ValueError('Invalid pagination cursor')
+
+def parse_page_limit(value, default=API_VIDEOS_DEFAULT_LIMIT, maximum=API_VIDEOS_MAX_LIMIT):
+    try:
+        limit = int(value) if value not in (None, '') else default
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
+def fetch_video_page(include_inactive, limit, after=None, include_total=False):
+    """Fetch one page of videos (limit=None: all) from the catalog cache; returns (records, next_cursor, total)"""
+    after_key = decode_video_cursor(after) if after else None
+    records, has_more = video_catalog_cache.page(include_inactive, limit, after_key)
+    
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_video_cursor(records[-1].upload_date, records[-1].id)
+    
+    total = video_catalog_cache.count(include_inactive) if include_total else None
+    
+    return records, next_cursor, total
+
+def format_video_for_api(video, user_role):
+    """Format a catalog cache record for cross-device API clients"""
+    video_info = {
+        'id': video.id,
+        'title': video.title,
+        'description': video.description,
+        'course_category': video.course_category,
+        'subject': video.subject,
+        'upload_date': video.upload_date,
+        'uploaded_by': video.uploader_username,
+        'teacher_name': video.uploader_name,
+        'teacher_subdivision': video.teacher_subdivision,
+        'views': video.views,
+        'filename': video.filename,
+        'video_url': f"/uploads/{video.filename}",  # Direct video access URL
+        'streaming_url': f"/stream_video/{video.id}",  # Streaming endpoint
+        'cross_device_compatible': True,
+        'mobile_optimized': True
+    }
+    
+    # Add admin-only fields
+    if user_role != 'student':
+        video_info['is_active'] = video.is_active
+        video_info['file_path'] = video.file_path
+    
+    return video_info
+
+def video_catalog_etag(user_role, mimetype='application/json'):
+    """Weak ETag from the catalog version, the caller's role, the query string and encoding"""
+    query = '&'.join(f"{key}={value}" for key, value in sorted(request.args.items(multi=True)))
+    digest = hashlib.sha1(f"{get_catalog_version()}|{user_role}|{query}|{mimetype}".encode('utf-8')).hexdigest()
+    return digest[:20]
+
+def negotiate_api_encoding():
+    """Pick JSON, MessagePack or CBOR from the Accept header (JSON unless asked otherwise)"""
+    offered = ['application/json']
+    if MSGPACK_AVAILABLE:
+        offered.extend(['application/msgpack', 'application/x-msgpack'])
+    if CBOR_AVAILABLE:
+        offered.append('application/cbor')
+    return request.accept_mimetypes.best_match(offered, default='application/json')
+
+def encode_api_response(payload, mimetype):
+    """Serialize an API payload in the negotiated encoding"""
+    if mimetype in ('application/msgpack', 'application/x-msgpack'):
+        response = make_response(msgpack.packb(payload, use_bin_type=True))
+    elif mimetype == 'application/cbor':
+        response = make_response(cbor2.dumps(payload))
+    else:
+        return jsonify(payload)
+    response.mimetype = mimetype
+    return response
+
+def resolve_video_fields(user_role, compact):
+    """Fields selected by ?fields=; raises ValueError for unknown names"""
+    available = API_VIDEO_FIELDS + (API_VIDEO_ADMIN_FIELDS if user_role != 'student' else [])
+    requested = request.args.get('fields', '').strip()
+    if not requested:
+        if compact:
+            return API_VIDEO_COMPACT_FIELDS + (['is_active'] if user_role != 'student' else [])
+        return available
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return fields
+
+def columnize_videos(videos_list, fields):
+    """Column-oriented representation: one array per field instead of one object per video"""
+    return {field: [video.get(field) for video in videos_list] for field in fields}
+
+def add_catalog_cache_headers(response, etag):
+    """Validator and caching hints for catalog responses"""
+    response.set_etag(etag, weak=True)
+    # Per-session data: browsers and service workers may keep it but must
+    # revalidate; shared caches must not store it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    # JSON, msgpack and CBOR share a URL; 304s need the same Vary as 200s
+    response.vary.add('Accept')
+    return response
 
 @app.route('/api/videos', methods=['GET'])
 def api_get_videos():
-    """Cross-device API endpoint for video access - Works on all devices"""
+    """Cross-device API endpoint for video access - Works on all devices
+    
+    Query parameters: limit (max 200) and after (next_cursor from the previous
+    page) page the list; without either every video is returned, as before
+    pagination existed. fields=a,b,c projects each video and format=columns
+    returns column-oriented arrays. total_videos is always included.
+    Accept: application/msgpack or application/cbor selects a binary encoding
+    when the msgpack / cbor2 packages are installed.
+    """
     try:
         # Check if user is authenticated (for API access)
         if 'user_id' not in session:
@@ -1246,70 +1568,59 @@ def api_get_videos():
         # Get user role to determine access level
         user_role = session.get('role', 'student')
         
-        conn = sqlite3.connect('bs_nexora_educational.db')
-        cursor = conn.cursor()
+        # Answer revalidation requests before touching the database
+        mimetype = negotiate_api_encoding()
+        etag = video_catalog_etag(user_role, mimetype)
+        if request.if_none_match.contains_weak(etag):
+            return add_catalog_cache_headers(make_response('', 304), etag)
         
-        if user_role == 'student':
-            # Students see all active videos from all teachers
-            cursor.execute('''
-                SELECT v.id, v.title, v.description, v.course_category, v.subject,
-                       v.upload_date, u.username as uploaded_by, u.full_name as teacher_name,
-                       v.teacher_subdivision, v.views, v.filename, v.file_path
-                FROM videos v
-                JOIN users u ON v.uploaded_by = u.id
-                WHERE v.is_active = 1
-                ORDER BY v.upload_date DESC
-            ''')
-        else:
-            # Teachers/Admins see all videos (including inactive)
-            cursor.execute('''
-                SELECT v.id, v.title, v.description, v.course_category, v.subject,
-                       v.upload_date, u.username as uploaded_by, u.full_name as teacher_name,
-                       v.teacher_subdivision, v.views, v.filename, v.file_path, v.is_active
-                FROM videos v
-                JOIN users u ON v.uploaded_by = u.id
-                ORDER BY v.upload_date DESC
-            ''')
-        
-        videos_data = cursor.fetchall()
-        conn.close()
+        compact = request.args.get('format') == 'columns'
+        try:
+            fields = resolve_video_fields(user_role, compact)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e), 'videos': []}), 400
+        
+        after = request.args.get('after') or None
+        # Existing clients that do not page still get the whole catalog
+        paged = after is not None or request.args.get('limit') is not None
+        limit = parse_page_limit(request.args.get('limit')) if paged else None
+        
+        try:
+            # Students see active videos only; teachers/admins also see inactive ones
+            videos_data, next_cursor, total = fetch_video_page(
+                user_role != 'student', limit, after, include_total=True)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e), 'videos': []}), 400
         
         # Format videos for cross-device compatibility
-        videos_list = []
-        for video in videos_data:
-            video_info = {
-                'id': video[0],
-                'title': video[1],
-                'description': video[2],
-                'course_category': video[3],
-                'subject': video[4],
-                'upload_date': video[5],
-                'uploaded_by': video[6],
-                'teacher_name': video[7],
-                'teacher_subdivision': video[8],
-                'views': video[9],
-                'filename': video[10],
-                'video_url': f"/uploads/{video[10]}",  # Direct video access URL
-                'streaming_url': f"/stream_video/{video[0]}",  # Streaming endpoint
-                'cross_device_compatible': True,
-                'mobile_optimized': True
-            }
-            
-            # Add admin-only fields
-            if user_role != 'student' and len(video) > 12:
-                video_info['is_active'] = video[12]
-                video_info['file_path'] = video[11]
-            
-            videos_list.append(video_info)
+        videos_list = [format_video_for_api(video, user_role) for video in videos_data]
         
-        return jsonify({
+        response = {
             'success': True,
             'message': f'Retrieved {len(videos_list)} videos for cross-device access',
-            'videos': videos_list,
             'user_role': user_role,
             'cross_device_sync': True,
-            'total_videos': len(videos_list)
-        })
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }
+        if compact:
+            # Constant and derivable values are sent once instead of per video
+            response.update({
+                'format': 'columns',
+                'count': len(videos_list),
+                'fields': fields,
+                'columns': columnize_videos(videos_list, fields),
+                'constants': {'cross_device_compatible': True, 'mobile_optimized': True},
+                'url_templates': {'video_url': '/uploads/{filename}', 'streaming_url': '/stream_video/{id}'}
+            })
+        elif request.args.get('fields'):
+            response['videos'] = [{field: video.get(field) for field in fields} for video in videos_list]
+        else:
+            response['videos'] = videos_list
+        response['total_videos'] = total
+        
+        return add_catalog_cache_headers(encode_api_response(response, mimetype), etag)
         
     except Exception as e:
         return jsonify({
@@ -1318,6 +1629,224 @@ def api_get_videos():
             'videos': []
         }), 500
 
+@app.route('/api/videos/search', methods=['GET'])
+def api_search_videos():
+    """Full-text video search - BM25 ranked with prefix matching and highlighted snippets
+    
+    Query parameters: q (search text), limit (default 20, max 50), offset.
+    """
+    if 'user_id' not in session:
+        return jsonify({
+            'success': False,
+            'message': 'Authentication required',
+            'results': []
+        }), 401
+    
+    user_role = session.get('role', 'student')
+    query = request.args.get('q', '').strip()
+    limit = parse_page_limit(request.args.get('limit'), default=20, maximum=50)
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        offset = 0
+    
+    try:
+        results, has_more = video_search_index.search(query, user_role != 'student', limit, offset)
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'message': f'Search error: {str(e)}', 'results': []}), 500
+    
+    return jsonify({
+        'success': True,
+        'query': query,
+        'results': results,
+        'count': len(results),
+        'offset': offset,
+        'next_offset': offset + len(results) if has_more else None,
+        'has_more': has_more
+    })
+
+@app.route('/api/videos/facets', methods=['GET'])
+def api_video_facets():
+    """Faceted video browsing - one page of matches plus per-facet counts
+    
+    Query parameters: category, subject, subdivision and teacher (teacher id),
+    each repeatable to select several values; date_from / date_to (YYYY-MM-DD,
+    both inclusive); limit (default 50, max 200) and after (next_cursor).
+    """
+    if 'user_id' not in session:
+        return jsonify({
+            'success': False,
+            'message': 'Authentication required',
+            'videos': []
+        }), 401
+    
+    user_role = session.get('role', 'student')
+    limit = parse_page_limit(request.args.get('limit'))
+    
+    try:
+        after = request.args.get('after')
+        after_key = decode_video_cursor(after) if after else None
+        filters = {
+            'category': request.args.getlist('category'),
+            'subject': request.args.getlist('subject'),
+            'subdivision': request.args.getlist('subdivision'),
+            'teacher': [int(value) for value in request.args.getlist('teacher')]
+        }
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), 'videos': []}), 400
+    
+    date_from = request.args.get('date_from') or None
+    date_to = request.args.get('date_to') or None
+    
+    records, has_more, total, facets = video_catalog_cache.facet_index().query(
+        filters, user_role != 'student', date_from, date_to, limit, after_key)
+    
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_video_cursor(records[-1].upload_date, records[-1].id)
+    
+    return jsonify({
+        'success': True,
+        'videos': [format_video_for_api(video, user_role) for video in records],
+        'count': len(records),
+        'total_matches': total,
+        'facets': facets,
+        'filters': dict(filters, date_from=date_from, date_to=date_to),
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    })
+
+@app.route('/api/videos/<int:video_id>/related', methods=['GET'])
+def api_related_videos(video_id):
+    """Up next videos - co-viewed videos first, then same-subject and same-category picks
+    
+    Query parameters: limit (default 10, max 20).
+    """
+    if 'user_id' not in session:
+        return jsonify({
+            'success': False,
+            'message': 'Authentication required',
+            'videos': []
+        }), 401
+    
+    user_role = session.get('role', 'student')
+    include_inactive = user_role != 'student'
+    limit = parse_page_limit(request.args.get('limit'), default=10, maximum=20)
+    
+    video = video_catalog_cache.get(video_id)
+    if video is None or not (include_inactive or video.is_active):
+        return jsonify({'success': False, 'message': 'Video not found', 'videos': []}), 404
+    
+    related = []
+    seen = {video_id}
+    for related_id, score in video_recommender.recommend(video_id):
+        record = video_catalog_cache.get(related_id)
+        if record is not None and related_id not in seen and (include_inactive or record.is_active):
+            related.append((record, 'co_viewed', score))
+            seen.add(related_id)
+    
+    # Cold start: fill up with the newest videos on the same subject, then category
+    for reason, filters in (('same_subject', {'subject': video.subject}),
+                            ('same_category', {'category': video.course_category})):
+        if len(related) >= limit:
+            break
+        for record in video_catalog_cache.videos(include_inactive, **filters):
+            if record.id not in seen:
+                related.append((record, reason, None))
+                seen.add(record.id)
+                if len(related) >= limit:
+                    break
+    
+    videos_list = []
+    for record, reason, score in related[:limit]:
+        video_info = format_video_for_api(record, user_role)
+        video_info['reason'] = reason
+        video_info['score'] = score
+        videos_list.append(video_info)
+    
+    return jsonify({
+        'success': True,
+        'video_id': video_id,
+        'videos': videos_list,
+        'count': len(videos_list)
+    })
+
+def ranked_videos_response(ranking, value_name, user_role, limit):
+    """Resolve a precomputed [(video_id, value)] ranking against the catalog cache"""
+    include_inactive = user_role != 'student'
+    videos_list = []
+    for video_id, value in ranking:
+        record = video_catalog_cache.get(video_id)
+        if record is None or not (include_inactive or record.is_active):
+            continue
+        video_info = format_video_for_api(record, user_role)
+        video_info[value_name] = value
+        videos_list.append(video_info)
+        if len(videos_list) == limit:
+            break
+    return videos_list
+
+@app.route('/api/videos/trending', methods=['GET'])
+def api_trending_videos():
+    """Trending videos - views with exponential time decay (48 hour half-life)
+    
+    Query parameters: limit (default 20, max 100).
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Authentication required', 'videos': []}), 401
+    
+    user_role = session.get('role', 'student')
+    limit = parse_page_limit(request.args.get('limit'), default=20, maximum=100)
+    videos_list = ranked_videos_response(video_view_rollup.ranking('trending'), 'trending_score', user_role, limit)
+    
+    return jsonify({'success': True, 'videos': videos_list, 'count': len(videos_list)})
+
+@app.route('/api/videos/popular', methods=['GET'])
+def api_popular_videos():
+    """Most viewed videos over a recent period
+    
+    Query parameters: period (today, week or month; default week), limit (default 20, max 100).
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Authentication required', 'videos': []}), 401
+    
+    period = request.args.get('period', 'week')
+    if period not in POPULAR_PERIODS:
+        return jsonify({
+            'success': False,
+            'message': f"period must be one of: {', '.join(POPULAR_PERIODS)}",
+            'videos': []
+        }), 400
+    
+    user_role = session.get('role', 'student')
+    limit = parse_page_limit(request.args.get('limit'), default=20, maximum=100)
+    videos_list = ranked_videos_response(video_view_rollup.ranking(period), 'period_views', user_role, limit)
+    
+    return jsonify({'success': True, 'period': period, 'videos': videos_list, 'count': len(videos_list)})
+
+@app.route('/api/videos/<int:video_id>/views', methods=['GET'])
+def api_video_daily_views(video_id):
+    """Views per day for one video (teachers and administrators)
+    
+    Query parameters: days (default 30, max 365).
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Authentication required'}), 401
+    if session.get('role', 'student') == 'student':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    days = parse_page_limit(request.args.get('days'), default=30, maximum=365)
+    daily = video_view_rollup.daily_views(video_id, days)
+    
+    return jsonify({
+        'success': True,
+        'video_id': video_id,
+        'days': days,
+        'daily_views': [{'day': day, 'views': views} for day, views in daily],
+        'total_views': sum(views for _, views in daily)
+    })
+
 @app.route('/stream_video/<int:video_id>')
 def stream_video(video_id):
     """Stream video for cross-device compatibility"""
@@ -1341,9 +1870,15 @@ def stream_video(video_id):
             conn.close()
             return "Video not found or inactive", 404
         
-        # Update view count
-        cursor.execute('UPDATE videos SET views = views + 1 WHERE id = ?', (video_id,))
-        conn.commit()
+        # Players fetch a video in many Range requests; only the one starting at byte 0 is a view
+        byte_range = request.range
+        if byte_range is None or byte_range.ranges[0][0] == 0:
+            # Update view count and record who watched it
+            cursor.execute('UPDATE videos SET views = views + 1 WHERE id = ?', (video_id,))
+            cursor.execute('INSERT INTO video_view_events (user_id, video_id) VALUES (?, ?)',
+                           (session['user_id'], video_id))
+            conn.commit()
+            video_catalog_cache.record_view(video_id)
         conn.close()
         
         filename, file_path, title, views = video
@@ -1435,6 +1970,8 @@ def create_account():
                     VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', (username, email, password_hash, role, full_name, subdivision, 'local'))
                 conn.commit()
+                fragment_cache.bump(TAG_USERS)
+                stats_snapshot.invalidate()
                 
                 # Log and trigger comprehensive sync for new account
                 log_and_sync_change(session['user_id'], 'account_creation', 
@@ -1498,25 +2035,12 @@ def cloud_accounts_list():
 def widget_management():
     """Widget management for CTO"""
     # Get system statistics for widgets
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
-    # Get basic stats
-    cursor.execute('SELECT COUNT(*) FROM users')
-    total_users = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM videos')
-    total_videos = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM system_logs')
-    total_logs = cursor.fetchone()[0]
-    
-    conn.close()
+    snapshot = stats_snapshot.get()
     
     widgets = [
-        {'name': 'User Counter', 'value': total_users, 'type': 'counter', 'color': '#4ecdc4'},
-        {'name': 'Video Library', 'value': total_videos, 'type': 'counter', 'color': '#ff6b6b'},
-        {'name': 'System Logs', 'value': total_logs, 'type': 'counter', 'color': '#feca57'},
+        {'name': 'User Counter', 'value': snapshot['total_users'], 'type': 'counter', 'color': '#4ecdc4'},
+        {'name': 'Video Library', 'value': snapshot['total_videos'], 'type': 'counter', 'color': '#ff6b6b'},
+        {'name': 'System Logs', 'value': snapshot['total_logs'], 'type': 'counter', 'color': '#feca57'},
         {'name': 'Platform Status', 'value': 'Online', 'type': 'status', 'color': '#5f27cd'}
     ]
     
@@ -1526,19 +2050,11 @@ def widget_management():
 @check_permission('system_access')
 def database_stats():
     """Database statistics for CTO and Master"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
     # Get table statistics
-    stats = {}
-    tables = ['users', 'videos', 'system_logs', 'student_faqs', 'enrollments', 'video_progress']
+    stats = dict(stats_snapshot.get()['table_counts'])
     
-    for table in tables:
-        try:
-            cursor.execute(f'SELECT COUNT(*) FROM {table}')
-            stats[table] = cursor.fetchone()[0]
-        except:
-            stats[table] = 0
+    conn = sqlite3.connect('bs_nexora_educational.db')
+    cursor = conn.cursor()
     
     # Get recent activity
     cursor.execute('''
@@ -1571,27 +2087,14 @@ def system_settings():
 @check_permission('video_management')
 def video_management():
     """Video management for Master and CTO"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
     # Get all videos with uploader info
-    cursor.execute('''
-        SELECT v.id, v.title, v.description, v.filename, v.uploaded_date, 
-               u.username, u.full_name, v.course_category, v.subject
-        FROM videos v
-        JOIN users u ON v.uploaded_by = u.id
-        ORDER BY v.uploaded_date DESC
-    ''')
-    videos = cursor.fetchall()
+    videos = [(v.id, v.title, v.description, v.filename, v.upload_date,
+               v.uploader_username, v.uploader_name, v.course_category, v.subject)
+              for v in video_catalog_cache.videos(include_inactive=True)]
     
     # Get video statistics
-    cursor.execute('SELECT COUNT(*) FROM videos')
-    total_videos = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(DISTINCT uploaded_by) FROM videos')
-    unique_uploaders = cursor.fetchone()[0]
-    
-    conn.close()
+    total_videos = len(videos)
+    unique_uploaders = video_catalog_cache.distinct_count('uploader')
     
     return render_template('video_management.html', 
                          videos=videos, 
@@ -1624,6 +2127,7 @@ def delete_video(video_id):
         # Delete from database
         cursor.execute('DELETE FROM videos WHERE id = ?', (video_id,))
         conn.commit()
+        bump_catalog_version('delete', video_id)
         
         # Log and trigger comprehensive sync for video deletion
         log_and_sync_change(session['user_id'], 'video_deletion', 
@@ -1662,6 +2166,7 @@ def toggle_video_status(video_id):
         # Update status
         cursor.execute('UPDATE videos SET is_active = ? WHERE id = ?', (new_status, video_id))
         conn.commit()
+        bump_catalog_version('toggle', video_id)
         
         # Log the action
         log_system_action(session['user_id'], 'video_status_change', 
@@ -1681,28 +2186,14 @@ def toggle_video_status(video_id):
 @check_permission('system_access')
 def analytics():
     """Platform analytics for Master and CTO"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
     # User analytics
-    cursor.execute('SELECT role, COUNT(*) FROM users GROUP BY role')
-    user_by_role = cursor.fetchall()
+    user_by_role = stats_snapshot.get()['user_breakdown']
     
     # Video analytics
-    cursor.execute('SELECT course_category, COUNT(*) FROM videos GROUP BY course_category')
-    videos_by_category = cursor.fetchall()
+    videos_by_category = video_catalog_cache.group_counts('category', include_inactive=True)
     
     # Activity analytics
-    cursor.execute('''
-        SELECT DATE(timestamp) as date, COUNT(*) as activities
-        FROM system_logs 
-        WHERE timestamp >= date('now', '-7 days')
-        GROUP BY DATE(timestamp)
-        ORDER BY date DESC
-    ''')
-    daily_activity = cursor.fetchall()
-    
-    conn.close()
+    daily_activity = report_rollups.daily('activity', 7)
     
     analytics_data = {
         'user_by_role': user_by_role,
@@ -1716,15 +2207,13 @@ def analytics():
 @check_permission('system_access')
 def security_audit():
     """Security audit for Master and CTO"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
+    snapshot = stats_snapshot.get()
     
     # Check for security issues
     security_checks = []
     
     # Check for inactive users
-    cursor.execute('SELECT COUNT(*) FROM users WHERE is_active = 0')
-    inactive_users = cursor.fetchone()[0]
+    inactive_users = snapshot['inactive_users']
     security_checks.append({
         'check': 'Inactive Users',
         'status': 'warning' if inactive_users > 0 else 'good',
@@ -1733,11 +2222,7 @@ def security_audit():
     })
     
     # Check recent login attempts
-    cursor.execute('''
-        SELECT COUNT(*) FROM system_logs 
-        WHERE action = 'login' AND timestamp >= datetime('now', '-24 hours')
-    ''')
-    recent_logins = cursor.fetchone()[0]
+    recent_logins = snapshot['recent_logins']
     security_checks.append({
         'check': 'Recent Login Activity',
         'status': 'good',
@@ -1746,8 +2231,7 @@ def security_audit():
     })
     
     # Check for admin accounts
-    cursor.execute("SELECT COUNT(*) FROM users WHERE role IN ('master', 'cto')")
-    admin_count = cursor.fetchone()[0]
+    admin_count = snapshot['admin_users']
     security_checks.append({
         'check': 'Admin Accounts',
         'status': 'good' if admin_count >= 2 else 'warning',
@@ -1755,8 +2239,6 @@ def security_audit():
         'action': 'Ensure proper admin account backup' if admin_count < 2 else None
     })
     
-    conn.close()
-    
     return render_template('security_audit.html', security_checks=security_checks)
 
 @app.route('/homepage_video_management', methods=['GET', 'POST'])
@@ -1810,6 +2292,7 @@ def homepage_video_management():
                 
                 conn.commit()
                 conn.close()
+                bump_catalog_version('edit')
                 
                 # Log and trigger comprehensive sync for homepage video
                 log_and_sync_change(session['user_id'], 'homepage_video_upload', 
@@ -1890,30 +2373,14 @@ def debug_uploads():
 @check_permission('executive_overview')
 def executive_overview():
     """Executive overview for CEO"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
     # Get executive statistics
-    cursor.execute('SELECT COUNT(*) FROM users WHERE role IN ("student", "crew_lead", "teacher")')
-    managed_users = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM videos')
-    total_content = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM system_logs WHERE timestamp >= date("now", "-30 days")')
-    monthly_activity = cursor.fetchone()[0]
-    
-    # Get user breakdown
-    cursor.execute('SELECT role, COUNT(*) FROM users GROUP BY role')
-    user_breakdown = cursor.fetchall()
-    
-    conn.close()
+    snapshot = stats_snapshot.get()
     
     stats = {
-        'managed_users': managed_users,
-        'total_content': total_content,
-        'monthly_activity': monthly_activity,
-        'user_breakdown': user_breakdown
+        'managed_users': snapshot['managed_users'],
+        'total_content': snapshot['total_videos'],
+        'monthly_activity': snapshot['monthly_activity'],
+        'user_breakdown': snapshot['user_breakdown']
     }
     
     return render_template('executive_overview.html', stats=stats)
@@ -1922,30 +2389,9 @@ def executive_overview():
 @check_permission('strategic_reports')
 def strategic_reports():
     """Strategic reports for CEO"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
-    # Platform growth metrics
-    cursor.execute('''
-        SELECT DATE(created_date) as date, COUNT(*) as new_users
-        FROM users 
-        WHERE created_date >= date('now', '-30 days')
-        GROUP BY DATE(created_date)
-        ORDER BY date DESC
-    ''')
-    growth_data = cursor.fetchall()
-    
-    # Content creation metrics
-    cursor.execute('''
-        SELECT DATE(upload_date) as date, COUNT(*) as videos
-        FROM videos 
-        WHERE upload_date >= date('now', '-30 days')
-        GROUP BY DATE(upload_date)
-        ORDER BY date DESC
-    ''')
-    content_data = cursor.fetchall()
-    
-    conn.close()
+    # Platform growth and content creation metrics from the daily rollups
+    growth_data = report_rollups.daily('new_users', 30)
+    content_data = report_rollups.daily('uploads', 30)
     
     reports = {
         'growth_data': growth_data,
@@ -1959,18 +2405,11 @@ def strategic_reports():
 @check_permission('academic_operations')
 def academic_oversight():
     """Academic oversight for CAO"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
     # Get academic statistics
-    cursor.execute('SELECT COUNT(*) FROM users WHERE role = "student"')
-    total_students = cursor.fetchone()[0]
+    snapshot = stats_snapshot.get()
     
-    cursor.execute('SELECT COUNT(*) FROM users WHERE role = "teacher"')
-    total_teachers = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM student_faqs')
-    total_faqs = cursor.fetchone()[0]
+    conn = sqlite3.connect('bs_nexora_educational.db')
+    cursor = conn.cursor()
     
     # Get recent FAQs
     cursor.execute('''
@@ -1985,9 +2424,9 @@ def academic_oversight():
     conn.close()
     
     data = {
-        'total_students': total_students,
-        'total_teachers': total_teachers,
-        'total_faqs': total_faqs,
+        'total_students': snapshot['users_by_role'].get('student', 0),
+        'total_teachers': snapshot['users_by_role'].get('teacher', 0),
+        'total_faqs': snapshot['total_faqs'],
         'recent_faqs': recent_faqs
     }
     
@@ -2057,14 +2496,21 @@ def submit_faq():
             cursor = conn.cursor()
             
             cursor.execute('''
-                INSERT INTO student_faqs (student_id, question, submitted_date)
-                VALUES (?, ?, ?)
-            ''', (session['user_id'], question, datetime.now()))
+                INSERT INTO student_faqs (student_id, question, category, submitted_date)
+                VALUES (?, ?, ?, ?)
+            ''', (session['user_id'], question, ticket_classifier.classify(question), datetime.now()))
+            created = support_metrics.capture(cursor, [cursor.lastrowid])
             
             conn.commit()
             conn.close()
+            support_metrics.record([], created)
+            fragment_cache.bump(TAG_FAQS)
+            stats_snapshot.invalidate()
             
             flash('Your question has been submitted successfully!', 'success')
+            # Point the student at an existing answer while the ticket waits
+            for suggestion in faq_similarity.suggest(question, limit=1):
+                flash(f"A similar question has already been answered: {suggestion['answer']}", 'info')
             return redirect(url_for('submit_faq'))
     
     return render_template('submit_faq.html')
@@ -2074,19 +2520,9 @@ def submit_faq():
 @check_permission('upload_videos')
 def teacher_content():
     """Teacher content management"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
     # Get teacher's uploaded videos
-    cursor.execute('''
-        SELECT id, title, description, course_category, subject, upload_date
-        FROM videos
-        WHERE uploaded_by = ?
-        ORDER BY upload_date DESC
-    ''', (session['user_id'],))
-    teacher_videos = cursor.fetchall()
-    
-    conn.close()
+    teacher_videos = [(v.id, v.title, v.description, v.course_category, v.subject, v.upload_date)
+                      for v in video_catalog_cache.videos(include_inactive=True, uploader=session['user_id'])]
     
     return render_template('teacher_content.html', videos=teacher_videos)
 
@@ -2094,23 +2530,14 @@ def teacher_content():
 @check_permission('upload_videos')
 def lesson_planner():
     """Lesson planning for teachers"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
-    # Get teacher's subject
-    cursor.execute('SELECT teacher_subdivision FROM users WHERE id = ?', (session['user_id'],))
-    subject = cursor.fetchone()[0] if cursor.fetchone() else 'General'
-    
-    # Get subject-specific videos
-    cursor.execute('''
-        SELECT title, description, upload_date
-        FROM videos
-        WHERE subject = ? OR uploaded_by = ?
-        ORDER BY upload_date DESC
-    ''', (subject, session['user_id']))
-    subject_videos = cursor.fetchall()
+    # Get teacher's subject (stored in the session at login)
+    subject = session.get('subdivision') or 'General'
     
-    conn.close()
+    # Get subject-specific videos plus the teacher's own uploads
+    matches = {v.id: v for v in video_catalog_cache.videos(include_inactive=True, subject=subject)}
+    matches.update((v.id, v) for v in video_catalog_cache.videos(include_inactive=True, uploader=session['user_id']))
+    subject_videos = [(v.title, v.description, v.upload_date)
+                      for v in sorted(matches.values(), key=lambda v: v.sort_key, reverse=True)]
     
     return render_template('lesson_planner.html', 
                          subject=subject, 
@@ -2121,147 +2548,124 @@ def lesson_planner():
 @check_permission('oversight')
 def ceo_executive_overview():
     """CEO Executive Overview Dashboard"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
-    # Get comprehensive platform statistics
-    cursor.execute("SELECT COUNT(*) FROM users")
-    total_users = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM users WHERE role IN ('student', 'teacher', 'crew_lead')")
-    managed_accounts = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM videos")
-    total_videos = cursor.fetchone()[0]
+    def build_context():
+        # Get comprehensive platform statistics
+        snapshot = stats_snapshot.get()
+        users_by_role = snapshot['users_by_role']
+        
+        conn = sqlite3.connect('bs_nexora_educational.db')
+        cursor = conn.cursor()
+        
+        # Get recent activity
+        cursor.execute("""
+            SELECT u.username, u.role, u.created_date, u.full_name
+            FROM users u 
+            WHERE u.role IN ('student', 'teacher', 'crew_lead')
+            ORDER BY u.created_date DESC 
+            LIMIT 10
+        """)
+        recent_activity = cursor.fetchall()
+        
+        conn.close()
+        
+        return {
+            'total_users': snapshot['total_users'],
+            'managed_accounts': snapshot['managed_users'],
+            'total_videos': snapshot['total_videos'],
+            'total_faqs': snapshot['total_faqs'],
+            'recent_activity': recent_activity,
+            # (students, teachers, crew_leads)
+            'role_breakdown': (users_by_role.get('student', 0), users_by_role.get('teacher', 0),
+                               users_by_role.get('crew_lead', 0))
+        }
     
-    cursor.execute("SELECT COUNT(*) FROM student_faqs")
-    total_faqs = cursor.fetchone()[0]
+    return render_cached_page('ceo_executive_overview', 'ceo_executive_overview.html', build_context,
+                              ttl=300, tags=(TAG_USERS, TAG_CATALOG, TAG_FAQS),
+                              key=(stats_snapshot.generation,))
+
+@app.route('/ceo/strategic-reports')
+@check_permission('reports')
+def ceo_strategic_reports():
+    """CEO Strategic Reports and Analytics"""
+    def build_context():
+        # Generate comprehensive reports
+        reports = {
+            'user_growth': [],
+            'content_metrics': [],
+            'engagement_stats': [],
+            'system_health': []
+        }
+        
+        # User growth analysis
+        reports['user_growth'] = report_rollups.daily('new_users', 30)
+        
+        # Content metrics (subject, video_count, avg_size)
+        reports['content_metrics'] = [(subject, count, 0) for subject, count
+                                      in video_catalog_cache.group_counts('subject', include_inactive=True)]
+        
+        return {'reports': reports}
     
-    # Get recent activity
-    cursor.execute("""
-        SELECT u.username, u.role, u.created_date, u.full_name
-        FROM users u 
-        WHERE u.role IN ('student', 'teacher', 'crew_lead')
-        ORDER BY u.created_date DESC 
-        LIMIT 10
-    """)
-    recent_activity = cursor.fetchall()
-    
-    # Get performance metrics
-    cursor.execute("""
-        SELECT 
-            COUNT(CASE WHEN role = 'student' THEN 1 END) as students,
-            COUNT(CASE WHEN role = 'teacher' THEN 1 END) as teachers,
-            COUNT(CASE WHEN role = 'crew_lead' THEN 1 END) as crew_leads
-        FROM users
-    """)
-    role_breakdown = cursor.fetchone()
-    
-    conn.close()
-    
-    return render_template('ceo_executive_overview.html',
-                         total_users=total_users,
-                         managed_accounts=managed_accounts,
-                         total_videos=total_videos,
-                         total_faqs=total_faqs,
-                         recent_activity=recent_activity,
-                         role_breakdown=role_breakdown)
-
-@app.route('/ceo/strategic-reports')
-@check_permission('reports')
-def ceo_strategic_reports():
-    """CEO Strategic Reports and Analytics"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
-    # Generate comprehensive reports
-    reports = {
-        'user_growth': [],
-        'content_metrics': [],
-        'engagement_stats': [],
-        'system_health': []
-    }
-    
-    # User growth analysis
-    cursor.execute("""
-        SELECT DATE(created_date) as date, COUNT(*) as new_users
-        FROM users 
-        WHERE created_date >= DATE('now', '-30 days')
-        GROUP BY DATE(created_date)
-        ORDER BY date DESC
-    """)
-    reports['user_growth'] = cursor.fetchall()
-    
-    # Content metrics
-    cursor.execute("""
-        SELECT 
-            subject,
-            COUNT(*) as video_count,
-            0 as avg_size
-        FROM videos 
-        GROUP BY subject
-    """)
-    reports['content_metrics'] = cursor.fetchall()
-    
-    conn.close()
-    
-    return render_template('ceo_strategic_reports.html', reports=reports)
+    return render_cached_page('ceo_strategic_reports', 'ceo_strategic_reports.html', build_context,
+                              ttl=900, tags=(TAG_USERS, TAG_CATALOG))
 
 @app.route('/ceo/account-oversight')
 @check_permission('account_management')
 def ceo_account_oversight():
     """CEO Account Management and Oversight"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
-    # Get all managed accounts (students, teachers, crew leads)
-    cursor.execute("""
-        SELECT id, username, email, role, subdivision, full_name, created_date, 'Never' as last_login
-        FROM users 
-        WHERE role IN ('student', 'teacher', 'crew_lead')
-        ORDER BY role, created_date DESC
-    """)
-    managed_accounts = cursor.fetchall()
-    
-    conn.close()
+    def build_context():
+        conn = sqlite3.connect('bs_nexora_educational.db')
+        cursor = conn.cursor()
+        
+        # Get all managed accounts (students, teachers, crew leads)
+        cursor.execute("""
+            SELECT id, username, email, role, subdivision, full_name, created_date, 'Never' as last_login
+            FROM users 
+            WHERE role IN ('student', 'teacher', 'crew_lead')
+            ORDER BY role, created_date DESC
+        """)
+        managed_accounts = cursor.fetchall()
+        
+        conn.close()
+        
+        return {'accounts': managed_accounts}
     
-    return render_template('ceo_account_oversight.html', accounts=managed_accounts)
+    return render_cached_page('ceo_account_oversight', 'ceo_account_oversight.html', build_context,
+                              ttl=300, tags=(TAG_USERS,))
 
 # CAO Academic Operations Routes
 @app.route('/cao/academic-operations')
 @check_permission('oversight')
 def cao_academic_operations():
     """CAO Academic Operations Dashboard"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
-    # Get academic statistics
-    cursor.execute("SELECT COUNT(*) FROM student_faqs WHERE status = 'pending'")
-    pending_faqs = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM videos WHERE course_category IS NOT NULL")
-    academic_content = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'student'")
-    total_students = cursor.fetchone()[0]
-    
-    # Get recent FAQ submissions
-    cursor.execute("""
-        SELECT f.id, f.question, 'general' as category, f.status, f.created_at, u.full_name
-        FROM student_faqs f
-        JOIN users u ON f.student_id = u.id
-        ORDER BY f.created_at DESC
-        LIMIT 15
-    """)
-    recent_faqs = cursor.fetchall()
-    
-    conn.close()
+    def build_context():
+        # Get academic statistics
+        snapshot = stats_snapshot.get()
+        
+        conn = sqlite3.connect('bs_nexora_educational.db')
+        cursor = conn.cursor()
+        
+        # Get recent FAQ submissions
+        cursor.execute("""
+            SELECT f.id, f.question, COALESCE(f.category, 'general') as category, f.status, f.created_at, u.full_name
+            FROM student_faqs f
+            JOIN users u ON f.student_id = u.id
+            ORDER BY f.created_at DESC
+            LIMIT 15
+        """)
+        recent_faqs = cursor.fetchall()
+        
+        conn.close()
+        
+        return {
+            'pending_faqs': snapshot['pending_faqs'],
+            'academic_content': snapshot['categorized_videos'],
+            'total_students': snapshot['users_by_role'].get('student', 0),
+            'recent_faqs': recent_faqs
+        }
     
-    return render_template('cao_academic_operations.html',
-                         pending_faqs=pending_faqs,
-                         academic_content=academic_content,
-                         total_students=total_students,
-                         recent_faqs=recent_faqs)
+    return render_cached_page('cao_academic_operations', 'cao_academic_operations.html', build_context,
+                              ttl=120, tags=(TAG_FAQS, TAG_USERS, TAG_CATALOG),
+                              key=(stats_snapshot.generation,))
 
 @app.route('/cao/student-faq-management')
 @check_permission('student_faqs')
@@ -2272,7 +2676,7 @@ def cao_faq_management():
     
     # Get all FAQs with student information
     cursor.execute("""
-        SELECT f.id, f.question, 'general' as category, f.status, f.created_at, f.answer, u.full_name, u.username
+        SELECT f.id, f.question, COALESCE(f.category, 'general') as category, f.status, f.created_at, f.answer, u.full_name, u.username
         FROM student_faqs f
         JOIN users u ON f.student_id = u.id
         ORDER BY f.created_at DESC
@@ -2297,14 +2701,34 @@ def cao_answer_faq():
     conn = sqlite3.connect('bs_nexora_educational.db')
     cursor = conn.cursor()
     
+    holder = ticket_queue.holder(cursor, faq_id)
+    if holder is not None and holder != session['user_id']:
+        conn.close()
+        flash('This question is claimed by another agent.', 'error')
+        return redirect(url_for('cao_faq_management'))
+    
+    before = support_metrics.capture(cursor, [faq_id])
     cursor.execute("""
         UPDATE student_faqs 
         SET answer = ?, status = 'answered', answered_at = CURRENT_TIMESTAMP
         WHERE id = ?
     """, (answer, faq_id))
+    after = support_metrics.capture(cursor, [faq_id])
+    cursor.execute('''
+        SELECT f.question, f.student_id, u.full_name FROM student_faqs f
+        LEFT JOIN users u ON u.id = f.student_id
+        WHERE f.id = ?
+    ''', (faq_id,))
+    answered = cursor.fetchone()
     
     conn.commit()
     conn.close()
+    support_metrics.record(before, after)
+    if answered:
+        faq_similarity.add(int(faq_id), answered[0], answer, answered[2])
+        event_broker.publish([answered[1]], 'ticket_answered', {'ticket_id': int(faq_id), 'question': answered[0]})
+    fragment_cache.bump(TAG_FAQS)
+    stats_snapshot.invalidate()
     
     flash('FAQ answered successfully!', 'success')
     return redirect(url_for('cao_faq_management'))
@@ -2313,132 +2737,99 @@ def cao_answer_faq():
 @check_permission('academic_operations')
 def cao_academic_reports():
     """CAO Academic Reports and Analytics"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
-    # Student performance metrics
-    cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'student'")
-    total_students = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM videos")
-    total_content = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM student_faqs WHERE status = 'answered'")
-    resolved_faqs = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM student_faqs WHERE status = 'pending'")
-    pending_faqs = cursor.fetchone()[0]
-    
-    # Recent activity
-    cursor.execute("""
-        SELECT DATE(created_at) as date, COUNT(*) as count
-        FROM student_faqs 
-        WHERE created_at >= DATE('now', '-7 days')
-        GROUP BY DATE(created_at)
-        ORDER BY date DESC
-    """)
-    faq_activity = cursor.fetchall()
-    
-    conn.close()
-    
-    reports = {
-        'total_students': total_students,
-        'total_content': total_content,
-        'resolved_faqs': resolved_faqs,
-        'pending_faqs': pending_faqs,
-        'faq_activity': faq_activity,
-        'satisfaction_rate': 95.8,
-        'response_time': '2.3 hours'
-    }
+    def build_context():
+        # Student performance metrics
+        snapshot = stats_snapshot.get()
+        
+        # Recent activity
+        faq_activity = report_rollups.daily('tickets_created', 7)
+        
+        reports = {
+            'total_students': snapshot['users_by_role'].get('student', 0),
+            'total_content': snapshot['total_videos'],
+            'resolved_faqs': snapshot['answered_faqs'],
+            'pending_faqs': snapshot['pending_faqs'],
+            'faq_activity': faq_activity,
+            'satisfaction_rate': 95.8,
+            'response_time': '2.3 hours'
+        }
+        
+        return {'reports': reports}
     
-    return render_template('cao_academic_reports.html', reports=reports)
+    return render_cached_page('cao_academic_reports', 'cao_academic_reports.html', build_context,
+                              ttl=300, tags=(TAG_FAQS, TAG_USERS, TAG_CATALOG),
+                              key=(stats_snapshot.generation,))
 
 @app.route('/cao/account-oversight')
 @check_permission('oversight')
 def cao_account_oversight():
     """CAO Account Oversight for Students, Teachers, and Crew Leads"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
-    # Get students
-    cursor.execute("""
-        SELECT id, username, email, full_name, created_date, is_active
-        FROM users 
-        WHERE role = 'student'
-        ORDER BY created_date DESC
-    """)
-    students = cursor.fetchall()
-    
-    # Get teachers
-    cursor.execute("""
-        SELECT id, username, email, full_name, subdivision, created_date, is_active
-        FROM users 
-        WHERE role = 'teacher'
-        ORDER BY subdivision, created_date DESC
-    """)
-    teachers = cursor.fetchall()
-    
-    # Get crew leads
-    cursor.execute("""
-        SELECT id, username, email, full_name, created_date, is_active
-        FROM users 
-        WHERE role = 'crew_lead'
-        ORDER BY created_date DESC
-    """)
-    crew_leads = cursor.fetchall()
-    
-    conn.close()
+    def build_context():
+        conn = sqlite3.connect('bs_nexora_educational.db')
+        cursor = conn.cursor()
+        
+        # Get students
+        cursor.execute("""
+            SELECT id, username, email, full_name, created_date, is_active
+            FROM users 
+            WHERE role = 'student'
+            ORDER BY created_date DESC
+        """)
+        students = cursor.fetchall()
+        
+        # Get teachers
+        cursor.execute("""
+            SELECT id, username, email, full_name, subdivision, created_date, is_active
+            FROM users 
+            WHERE role = 'teacher'
+            ORDER BY subdivision, created_date DESC
+        """)
+        teachers = cursor.fetchall()
+        
+        # Get crew leads
+        cursor.execute("""
+            SELECT id, username, email, full_name, created_date, is_active
+            FROM users 
+            WHERE role = 'crew_lead'
+            ORDER BY created_date DESC
+        """)
+        crew_leads = cursor.fetchall()
+        
+        conn.close()
+        
+        return {
+            'students': students,
+            'teachers': teachers,
+            'crew_leads': crew_leads
+        }
     
-    return render_template('cao_account_oversight.html', 
-                         students=students, 
-                         teachers=teachers, 
-                         crew_leads=crew_leads)
+    return render_cached_page('cao_account_oversight', 'cao_account_oversight.html', build_context,
+                              ttl=300, tags=(TAG_USERS,))
 
 @app.route('/cao/student-support')
 @check_permission('student_support')
 def cao_student_support():
     """CAO Student Support Center - Complete Implementation"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
-    # === SUPPORT STATISTICS ===
-    
-    # Open tickets
-    cursor.execute("SELECT COUNT(*) FROM student_faqs WHERE status = 'pending'")
-    open_tickets = cursor.fetchone()[0]
-    
-    # Resolved today
-    cursor.execute("SELECT COUNT(*) FROM student_faqs WHERE status = 'answered' AND DATE(answered_at) = DATE('now')")
-    resolved_today = cursor.fetchone()[0]
-    
-    # Total tickets
-    cursor.execute("SELECT COUNT(*) FROM student_faqs")
-    total_tickets = cursor.fetchone()[0]
-    
-    # Resolved this week
-    cursor.execute("SELECT COUNT(*) FROM student_faqs WHERE status = 'answered' AND DATE(answered_at) >= DATE('now', '-7 days')")
-    resolved_week = cursor.fetchone()[0]
+    # === SUPPORT STATISTICS (incrementally maintained, see support_metrics.py) ===
+    summary = support_metrics.summary()
+    open_tickets = summary['open_tickets']
+    resolved_today = summary['resolved_today']
+    total_tickets = summary['total_tickets']
+    resolved_week = summary['resolved_week']
     
     # Average response time calculation
-    cursor.execute("""
-        SELECT AVG(JULIANDAY(answered_at) - JULIANDAY(created_at)) * 24
-        FROM student_faqs
-        WHERE status = 'answered' AND answered_at IS NOT NULL
-    """)
-    avg_hours = cursor.fetchone()[0]
+    avg_hours = summary['avg_response_hours']
     avg_response_time = f"{avg_hours:.1f} hours" if avg_hours else "N/A"
     
-    # === URGENT SUPPORT REQUESTS ===
-    cursor.execute("""
-        SELECT f.id, f.question, f.status, f.created_at, u.full_name, u.username, u.email,
-               ROUND((JULIANDAY('now') - JULIANDAY(f.created_at)) * 24, 1) as hours_waiting
-        FROM student_faqs f
-        JOIN users u ON f.student_id = u.id
-        WHERE f.status = 'pending'
-        ORDER BY f.created_at ASC
-        LIMIT 15
-    """)
-    urgent_requests = cursor.fetchall()
+    conn = sqlite3.connect('bs_nexora_educational.db')
+    cursor = conn.cursor()
+    
+    # === URGENT SUPPORT REQUESTS (head of the priority queue, see ticket_queue.py) ===
+    urgent_requests = [(t['id'], t['question'], 'pending', t['created_at'], t['student_name'],
+                        t['student_username'], t['student_email'], t['hours_waiting'],
+                        t['category'], t['sla_breached'], t['claimed_by'])
+                       for t in ticket_queue.peek(cursor, limit=15)]
+    sla_report = ticket_queue.sla_report(cursor)
     
     # === RECENT RESOLVED TICKETS ===
     cursor.execute("""
@@ -2455,65 +2846,50 @@ def cao_student_support():
     recent_resolved = cursor.fetchall()
     
     # === STUDENT ACTIVITY ===
-    cursor.execute("""
-        SELECT u.id, u.username, u.full_name, u.email, u.created_date,
-               COUNT(f.id) as total_questions,
-               SUM(CASE WHEN f.status = 'pending' THEN 1 ELSE 0 END) as pending_questions,
-               MAX(f.created_at) as last_question_date
-        FROM users u
-        LEFT JOIN student_faqs f ON u.id = f.student_id
-        WHERE u.role = 'student' AND u.is_active = 1
-        GROUP BY u.id
-        ORDER BY pending_questions DESC, last_question_date DESC
-        LIMIT 20
-    """)
-    active_students = cursor.fetchall()
+    # Page through the maintained ranking, keeping active students, then pad with students without questions
+    active_students = []
+    start = 0
+    while len(active_students) < 20:
+        batch = support_metrics.ranked_students(start, 40)
+        if not batch:
+            break
+        start += len(batch)
+        cursor.execute(f"""
+            SELECT id, username, full_name, email, created_date
+            FROM users
+            WHERE role = 'student' AND is_active = 1 AND id IN ({','.join('?' * len(batch))})
+        """, [student_id for student_id, _, _, _ in batch])
+        students = {row[0]: row for row in cursor.fetchall()}
+        active_students.extend(students[student_id] + (total, pending, last_question)
+                               for student_id, total, pending, last_question in batch
+                               if student_id in students)
+    active_students = active_students[:20]
+    if len(active_students) < 20:
+        cursor.execute("""
+            SELECT u.id, u.username, u.full_name, u.email, u.created_date, 0, 0, NULL
+            FROM users u
+            WHERE u.role = 'student' AND u.is_active = 1
+              AND NOT EXISTS (SELECT 1 FROM student_faqs f WHERE f.student_id = u.id)
+            LIMIT ?
+        """, (20 - len(active_students),))
+        active_students.extend(cursor.fetchall())
     
     # === SUPPORT CATEGORIES ===
-    cursor.execute("""
-        SELECT 
-            CASE 
-                WHEN LOWER(question) LIKE '%video%' OR LOWER(question) LIKE '%watch%' THEN 'Video Issues'
-                WHEN LOWER(question) LIKE '%login%' OR LOWER(question) LIKE '%password%' THEN 'Login Issues'
-                WHEN LOWER(question) LIKE '%course%' OR LOWER(question) LIKE '%enroll%' THEN 'Course Access'
-                WHEN LOWER(question) LIKE '%progress%' OR LOWER(question) LIKE '%track%' THEN 'Progress Tracking'
-                WHEN LOWER(question) LIKE '%account%' OR LOWER(question) LIKE '%profile%' THEN 'Account Issues'
-                ELSE 'General Support'
-            END as category,
-            COUNT(*) as count
-        FROM student_faqs
-        WHERE DATE(created_at) >= DATE('now', '-30 days')
-        GROUP BY category
-        ORDER BY count DESC
-    """)
-    support_categories = cursor.fetchall()
+    support_categories = summary['support_categories']
     
     # === PERFORMANCE METRICS ===
-    cursor.execute("""
-        SELECT 
-            DATE(created_at) as date,
-            COUNT(*) as tickets_created,
-            SUM(CASE WHEN status = 'answered' THEN 1 ELSE 0 END) as tickets_resolved
-        FROM student_faqs
-        WHERE DATE(created_at) >= DATE('now', '-7 days')
-        GROUP BY DATE(created_at)
-        ORDER BY date DESC
-    """)
-    daily_metrics = cursor.fetchall()
+    daily_metrics = summary['daily_metrics']
     
     # === TOP SUPPORT AGENTS (CAO users who answered most) ===
-    cursor.execute("""
-        SELECT cao.full_name, cao.username,
-               COUNT(f.id) as tickets_answered,
-               AVG(JULIANDAY(f.answered_at) - JULIANDAY(f.created_at)) * 24 as avg_response_hours
-        FROM student_faqs f
-        JOIN users cao ON f.answered_by = cao.id
-        WHERE f.status = 'answered' AND f.answered_at IS NOT NULL
-        GROUP BY cao.id
-        ORDER BY tickets_answered DESC
-        LIMIT 5
-    """)
-    top_agents = cursor.fetchall()
+    agents = support_metrics.top_agents(limit=10)
+    agent_names = {}
+    if agents:
+        cursor.execute(f"SELECT id, full_name, username FROM users WHERE id IN ({','.join('?' * len(agents))})",
+                       [agent_id for agent_id, _, _ in agents])
+        agent_names = {row[0]: row[1:] for row in cursor.fetchall()}
+    top_agents = [agent_names[agent_id] + (answered, avg_response_hours)
+                  for agent_id, answered, avg_response_hours in agents
+                  if agent_id in agent_names][:5]
     
     # === SATISFACTION SCORE (based on resolved tickets) ===
     resolution_rate = (resolved_week / total_tickets * 100) if total_tickets > 0 else 0
@@ -2533,6 +2909,7 @@ def cao_student_support():
         
         # Lists
         'urgent_requests': urgent_requests,
+        'sla': sla_report,
         'recent_resolved': recent_resolved,
         'active_students': active_students,
         'support_categories': support_categories,
@@ -2559,16 +2936,23 @@ def cao_answer_ticket(ticket_id):
         conn = sqlite3.connect('bs_nexora_educational.db')
         cursor = conn.cursor()
         
+        holder = ticket_queue.holder(cursor, ticket_id)
+        if holder is not None and holder != session['user_id']:
+            conn.close()
+            return jsonify({'success': False, 'message': f'Ticket #{ticket_id} is claimed by another agent'})
+        
         # Update the FAQ with answer
+        before = support_metrics.capture(cursor, [ticket_id])
         cursor.execute("""
             UPDATE student_faqs
             SET answer = ?, status = 'answered', answered_at = CURRENT_TIMESTAMP, answered_by = ?
             WHERE id = ?
         """, (answer, session['user_id'], ticket_id))
+        after = support_metrics.capture(cursor, [ticket_id])
         
         # Get student info for notification
         cursor.execute("""
-            SELECT u.full_name, u.email, f.question
+            SELECT u.full_name, u.email, f.question, f.student_id
             FROM student_faqs f
             JOIN users u ON f.student_id = u.id
             WHERE f.id = ?
@@ -2577,6 +2961,12 @@ def cao_answer_ticket(ticket_id):
         
         conn.commit()
         conn.close()
+        support_metrics.record(before, after)
+        if student_info:
+            faq_similarity.add(ticket_id, student_info[2], answer, student_info[0])
+            event_broker.publish([student_info[3]], 'ticket_answered', {'ticket_id': ticket_id, 'question': student_info[2]})
+        fragment_cache.bump(TAG_FAQS)
+        stats_snapshot.invalidate()
         
         # Log action
         log_system_action(session['user_id'], 'support_ticket_answered', 
@@ -2599,14 +2989,24 @@ def cao_close_ticket(ticket_id):
         conn = sqlite3.connect('bs_nexora_educational.db')
         cursor = conn.cursor()
         
+        holder = ticket_queue.holder(cursor, ticket_id)
+        if holder is not None and holder != session['user_id']:
+            conn.close()
+            return jsonify({'success': False, 'message': f'Ticket #{ticket_id} is claimed by another agent'})
+        
+        before = support_metrics.capture(cursor, [ticket_id])
         cursor.execute("""
             UPDATE student_faqs
             SET status = 'closed'
             WHERE id = ?
         """, (ticket_id,))
+        after = support_metrics.capture(cursor, [ticket_id])
         
         conn.commit()
         conn.close()
+        support_metrics.record(before, after)
+        fragment_cache.bump(TAG_FAQS)
+        stats_snapshot.invalidate()
         
         log_system_action(session['user_id'], 'support_ticket_closed', f'Closed support ticket #{ticket_id}')
         
@@ -2623,14 +3023,20 @@ def cao_reopen_ticket(ticket_id):
         conn = sqlite3.connect('bs_nexora_educational.db')
         cursor = conn.cursor()
         
+        before = support_metrics.capture(cursor, [ticket_id])
         cursor.execute("""
             UPDATE student_faqs
             SET status = 'pending'
             WHERE id = ?
         """, (ticket_id,))
+        after = support_metrics.capture(cursor, [ticket_id])
         
         conn.commit()
         conn.close()
+        support_metrics.record(before, after)
+        faq_similarity.remove([ticket_id])
+        fragment_cache.bump(TAG_FAQS)
+        stats_snapshot.invalidate()
         
         log_system_action(session['user_id'], 'support_ticket_reopened', f'Reopened support ticket #{ticket_id}')
         
@@ -2685,90 +3091,242 @@ def cao_get_ticket(ticket_id):
 @app.route('/cao/support/bulk-action', methods=['POST'])
 @check_permission('student_support')
 def cao_bulk_action():
-    """Perform bulk actions on tickets"""
+    """Perform bulk actions on tickets: close, reopen, delete or answer
+    
+    JSON body: ticket_ids, action, and for 'answer' either answer (text) or
+    template (a key of ANSWER_TEMPLATES, with answer filling its {answer}).
+    Answers may use {student_name}, {ticket_id} and {question}.
+    """
     try:
         data = request.get_json()
-        ticket_ids = data.get('ticket_ids', [])
+        ticket_ids = [int(tid) for tid in data.get('ticket_ids', [])]
         action = data.get('action', '')
-        
-        if not ticket_ids or not action:
-            return jsonify({'success': False, 'message': 'Missing ticket IDs or action'})
-        
+        answer = (data.get('answer') or '').strip()
+        template = data.get('template')
+        
+        if template:
+            if action != 'answer' or template not in ANSWER_TEMPLATES:
+                return jsonify({'success': False, 'message': 'Unknown answer template'})
+            answer = render_template_text(template, answer)
+        error = bulk_ticket_operations.validate(action, ticket_ids, answer)
+        if error:
+            return jsonify({'success': False, 'message': error})
+        
+        # Tickets another agent has claimed are left to them
         conn = sqlite3.connect('bs_nexora_educational.db')
-        cursor = conn.cursor()
-        
-        if action == 'close':
-            cursor.executemany("UPDATE student_faqs SET status = 'closed' WHERE id = ?", 
-                             [(tid,) for tid in ticket_ids])
-            message = f'Closed {len(ticket_ids)} tickets'
-            
-        elif action == 'reopen':
-            cursor.executemany("UPDATE student_faqs SET status = 'pending' WHERE id = ?", 
-                             [(tid,) for tid in ticket_ids])
-            message = f'Reopened {len(ticket_ids)} tickets'
-            
-        elif action == 'delete':
-            cursor.executemany("DELETE FROM student_faqs WHERE id = ?", 
-                             [(tid,) for tid in ticket_ids])
-            message = f'Deleted {len(ticket_ids)} tickets'
-        else:
+        try:
+            leased = ticket_queue.leased_by_others(conn.cursor(), session['user_id'])
+        finally:
             conn.close()
-            return jsonify({'success': False, 'message': 'Invalid action'})
+        requested = len(ticket_ids)
+        ticket_ids = [tid for tid in ticket_ids if tid not in leased]
+        skipped_claimed = requested - len(ticket_ids)
+        
+        before, after, answered, processed_ids = [], [], [], []
+        chunk = {}
+        def capture(cursor, chunk_ids, phase):
+            if phase == 'committed':
+                # Only chunks that made it to disk count towards metrics and the FAQ index
+                before.extend(chunk['before'])
+                after.extend(chunk['after'])
+                answered.extend(chunk['answered'])
+                processed_ids.extend(chunk_ids)
+                return
+            chunk[phase] = support_metrics.capture(cursor, chunk_ids)
+            if phase == 'before':
+                chunk['answered'] = []
+            elif action == 'answer':
+                # The chunk holds only the tickets that were pending, i.e. the ones this UPDATE answered
+                cursor.execute("""
+                    SELECT f.id, f.question, f.answer, f.student_id, u.full_name FROM student_faqs f
+                    JOIN temp.bulk_ticket_chunk c ON c.id = f.id
+                    LEFT JOIN users u ON u.id = f.student_id
+                    WHERE f.status = 'answered'
+                """)
+                chunk['answered'] = cursor.fetchall()
         
-        conn.commit()
-        conn.close()
+        conn = sqlite3.connect('bs_nexora_educational.db')
+        try:
+            processed, skipped_not_pending = bulk_ticket_operations.run(
+                conn, action, ticket_ids, session['user_id'], answer=answer, on_chunk=capture)
+        finally:
+            conn.close()
+            # Chunks commit one by one; record whatever was committed
+            support_metrics.record(before, after)
+            answered_by_student = {}
+            for tid, question, ticket_answer, student_id, student_name in answered:
+                faq_similarity.add(tid, question, ticket_answer, student_name)
+                answered_by_student.setdefault(student_id, []).append(tid)
+            for student_id, student_ticket_ids in answered_by_student.items():
+                event_broker.publish([student_id], 'ticket_answered', {'ticket_ids': student_ticket_ids})
+            if action in ('reopen', 'delete'):
+                faq_similarity.remove(processed_ids)
+            fragment_cache.bump(TAG_FAQS)
+            stats_snapshot.invalidate()
         
         log_system_action(session['user_id'], f'support_bulk_{action}', 
-                         f'Bulk {action} on {len(ticket_ids)} tickets')
+                         f'Bulk {action} on {processed} tickets')
         
-        return jsonify({'success': True, 'message': message})
+        past_tense = {'close': 'Closed', 'reopen': 'Reopened', 'delete': 'Deleted', 'answer': 'Answered'}
+        message = f'{past_tense[action]} {processed} tickets'
+        if skipped_claimed:
+            message += f' ({skipped_claimed} claimed by other agents were skipped)'
+        if skipped_not_pending:
+            message += f' ({skipped_not_pending} already answered or closed were skipped)'
+        return jsonify({'success': True, 'message': message, 'processed': processed, 'requested': requested,
+                        'skipped_claimed': skipped_claimed, 'skipped_not_pending': skipped_not_pending})
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
 
+@app.route('/cao/support/answer-templates')
+@check_permission('student_support')
+def cao_answer_templates():
+    """Answer templates for the bulk 'answer' action"""
+    return jsonify({'success': True, 'templates': ANSWER_TEMPLATES})
+
+@app.route('/cao/support/duplicates')
+@check_permission('student_support')
+def cao_duplicate_tickets():
+    """Clusters of near-duplicate pending tickets with a suggested existing answer
+    
+    Answer a whole cluster through /cao/support/bulk-action with action 'answer'.
+    """
+    try:
+        limit = parse_page_limit(request.args.get('limit'), default=20, maximum=100)
+        clusters = faq_similarity.pending_clusters()
+        return jsonify({
+            'success': True,
+            'clusters': clusters[:limit],
+            'count': len(clusters),
+            'duplicate_tickets': sum(cluster['size'] for cluster in clusters)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/api/faq/suggestions', methods=['GET'])
+def api_faq_suggestions():
+    """Existing answers similar to a question being typed (q), best first"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Authentication required', 'suggestions': []}), 401
+    
+    question = request.args.get('q', '').strip()
+    limit = parse_page_limit(request.args.get('limit'), default=3, maximum=10)
+    suggestions = faq_similarity.suggest(question, limit=limit) if question else []
+    return jsonify({'success': True, 'suggestions': suggestions, 'count': len(suggestions)})
+
+@app.route('/cao/support/queue')
+@check_permission('student_support')
+def cao_ticket_queue():
+    """Pending tickets in priority order (query: limit, default 25, max 100; unclaimed=1)"""
+    try:
+        limit = parse_page_limit(request.args.get('limit'), default=25, maximum=100)
+        conn = sqlite3.connect('bs_nexora_educational.db')
+        try:
+            tickets = ticket_queue.peek(conn.cursor(), limit=limit,
+                                        include_claimed=request.args.get('unclaimed') != '1')
+        finally:
+            conn.close()
+        return jsonify({'success': True, 'tickets': tickets, 'count': len(tickets)})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/cao/support/queue/next', methods=['POST'])
+@check_permission('student_support')
+def cao_queue_next():
+    """Claim the most urgent unclaimed ticket for the current agent"""
+    try:
+        conn = sqlite3.connect('bs_nexora_educational.db')
+        try:
+            ticket = ticket_queue.claim_next(conn, session['user_id'])
+        finally:
+            conn.close()
+        if ticket is None:
+            return jsonify({'success': True, 'ticket': None, 'message': 'The queue is empty'})
+        return jsonify({'success': True, 'ticket': ticket,
+                        'lease_seconds': ticket_queue.lease_seconds})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/cao/support/queue/<int:ticket_id>/claim', methods=['POST'])
+@check_permission('student_support')
+def cao_queue_claim(ticket_id):
+    """Claim (or renew the lease on) a specific pending ticket"""
+    try:
+        conn = sqlite3.connect('bs_nexora_educational.db')
+        try:
+            claimed = ticket_queue.claim(conn, ticket_id, session['user_id'])
+        finally:
+            conn.close()
+        if not claimed:
+            return jsonify({'success': False, 'message': f'Ticket #{ticket_id} is not pending or is claimed by another agent'}), 409
+        return jsonify({'success': True, 'message': f'Ticket #{ticket_id} claimed',
+                        'lease_seconds': ticket_queue.lease_seconds})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/cao/support/queue/<int:ticket_id>/release', methods=['POST'])
+@check_permission('student_support')
+def cao_queue_release(ticket_id):
+    """Return a claimed ticket to the queue"""
+    try:
+        conn = sqlite3.connect('bs_nexora_educational.db')
+        try:
+            released = ticket_queue.release(conn, ticket_id, session['user_id'])
+        finally:
+            conn.close()
+        if not released:
+            return jsonify({'success': False, 'message': f'You do not hold a claim on ticket #{ticket_id}'})
+        return jsonify({'success': True, 'message': f'Ticket #{ticket_id} released'})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/cao/support/sla')
+@check_permission('student_support')
+def cao_sla_report():
+    """SLA breach counts for pending tickets"""
+    try:
+        conn = sqlite3.connect('bs_nexora_educational.db')
+        try:
+            report = ticket_queue.sla_report(conn.cursor())
+        finally:
+            conn.close()
+        return jsonify({'success': True, 'sla': report})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
 @app.route('/cao/support/search', methods=['POST'])
 @check_permission('student_support')
 def cao_search_tickets():
-    """Search support tickets"""
+    """Search support tickets - BM25 ranked with prefix matching and highlights
+    
+    JSON body: query, status ('all' or a ticket status), limit (default 20,
+    max 50) and cursor (next_cursor from the previous page).
+    """
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         search_query = data.get('query', '').strip()
         status_filter = data.get('status', 'all')
+        limit = parse_page_limit(data.get('limit'), default=20, maximum=50)
         
-        conn = sqlite3.connect('bs_nexora_educational.db')
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT f.id, f.question, f.answer, f.status, f.created_at,
-                   u.full_name, u.username
-            FROM student_faqs f
-            JOIN users u ON f.student_id = u.id
-            WHERE (f.question LIKE ? OR f.answer LIKE ? OR u.full_name LIKE ?)
-        """
-        params = [f'%{search_query}%', f'%{search_query}%', f'%{search_query}%']
-        
-        if status_filter != 'all':
-            query += " AND f.status = ?"
-            params.append(status_filter)
-        
-        query += " ORDER BY f.created_at DESC LIMIT 50"
-        
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        conn.close()
-        
-        tickets = [{
-            'id': r[0],
-            'question': r[1],
-            'answer': r[2],
-            'status': r[3],
-            'created_at': r[4],
-            'student_name': r[5],
-            'student_username': r[6]
-        } for r in results]
+        tickets, next_cursor = ticket_search_index.search(search_query, status_filter, limit,
+                                                          data.get('cursor') or None)
         
-        return jsonify({'success': True, 'tickets': tickets, 'count': len(tickets)})
+        return jsonify({
+            'success': True,
+            'tickets': tickets,
+            'count': len(tickets),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        })
         
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
 
@@ -2815,21 +3373,11 @@ def crew_teacher_management():
 @check_permission('teacher_management')
 def content_approval():
     """Content approval for Crew Lead"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
     # Get recent teacher uploads for approval
-    cursor.execute('''
-        SELECT v.id, v.title, v.description, v.course_category, v.subject, 
-               v.upload_date, u.full_name, u.teacher_subdivision
-        FROM videos v
-        JOIN users u ON v.uploaded_by = u.id
-        WHERE u.role = 'teacher'
-        ORDER BY v.upload_date DESC
-    ''')
-    pending_content = cursor.fetchall()
-    
-    conn.close()
+    pending_content = [(v.id, v.title, v.description, v.course_category, v.subject,
+                        v.upload_date, v.uploader_name, v.uploader_subdivision)
+                       for v in video_catalog_cache.videos(include_inactive=True)
+                       if v.uploader_role == 'teacher']
     
     return render_template('content_approval.html', content=pending_content)
 
@@ -3073,35 +3621,35 @@ def teacher_advanced_excel_tools():
 @check_permission('system_access')
 def cto_system_monitoring():
     """CTO System Monitoring Dashboard"""
-    conn = sqlite3.connect('bs_nexora_educational.db')
-    cursor = conn.cursor()
-    
-    # Get system health metrics
-    cursor.execute("SELECT COUNT(*) FROM users")
-    total_users = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM videos")
-    total_videos = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM chat_messages WHERE created_at >= DATE('now', '-24 hours')")
-    daily_messages = cursor.fetchone()[0]
-    
-    # Get database size
-    cursor.execute("SELECT page_count * page_size as size FROM pragma_page_count(), pragma_page_size()")
-    db_size = cursor.fetchone()[0] if cursor.fetchone() else 0
-    
-    system_metrics = {
-        'total_users': total_users,
-        'total_videos': total_videos,
-        'daily_messages': daily_messages,
-        'database_size': db_size,
-        'uptime': '99.9%',
-        'server_status': 'Healthy'
-    }
-    
-    conn.close()
+    def build_context():
+        # Get system health metrics
+        snapshot = stats_snapshot.get()
+        
+        system_metrics = {
+            'total_users': snapshot['total_users'],
+            'total_videos': snapshot['total_videos'],
+            'daily_messages': snapshot['daily_messages'],
+            'database_size': snapshot['database_size'],
+            'uptime': '99.9%',
+            'server_status': 'Healthy'
+        }
+        
+        # Media integrity scrubber results (missing / truncated / corrupt files confirmed recently)
+        integrity = integrity_scrubber.get_summary()
+        if integrity['failed_files'] > 0:
+            system_metrics['server_status'] = 'Degraded'
+        
+        return {
+            'metrics': system_metrics,
+            'integrity': integrity,
+            'catalog_cache': video_catalog_cache.get_metrics(),
+            'fragment_cache': fragment_cache.get_metrics(),
+            'stats_snapshot': stats_snapshot.get_metrics()
+        }
     
-    return render_template('cto_system_monitoring.html', metrics=system_metrics)
+    return render_cached_page('cto_system_monitoring', 'cto_system_monitoring.html', build_context,
+                              ttl=30, tags=(TAG_USERS, TAG_CATALOG),
+                              key=(stats_snapshot.generation,))
 
 @app.route('/cto/database-management')
 @check_permission('system_access')
@@ -3125,6 +3673,23 @@ def cto_database_management():
     
     return render_template('cto_database_management.html', tables=table_info)
 
+@app.route('/cto/media-gc', methods=['POST'])
+@check_permission('system_access')
+def cto_media_gc():
+    """Sweep orphaned media files (dry run unless dry_run=0 is posted)"""
+    dry_run = request.form.get('dry_run', request.args.get('dry_run', '1')) != '0'
+    
+    try:
+        report = media_gc.collect(dry_run=dry_run)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Media GC failed: {str(e)}'}), 500
+    
+    if not dry_run:
+        log_system_action(session['user_id'], 'media_gc', 
+                         f"Reclaimed {report['reclaimed_bytes']} bytes from {len(report['orphaned_files'])} orphaned files")
+    
+    return jsonify({'success': True, 'report': report})
+
 # CTO Layout Management Routes
 @app.route('/cto/layout-manager')
 @check_permission('widgets')  # CTO permission
@@ -3537,25 +4102,8 @@ def chat_main():
     ''', (session['user_id'],))
     available_users = cursor.fetchall()
     
-    # Get recent conversations
-    cursor.execute('''
-        SELECT DISTINCT 
-            CASE 
-                WHEN c.user1_id = ? THEN c.user2_id 
-                ELSE c.user1_id 
-            END as other_user_id,
-            u.username, u.full_name, u.role,
-            m.message, m.created_at, m.is_read,
-            (SELECT COUNT(*) FROM chat_messages 
-             WHERE receiver_id = ? AND sender_id = CASE WHEN c.user1_id = ? THEN c.user2_id ELSE c.user1_id END AND is_read = 0) as unread_count
-        FROM chat_conversations c
-        JOIN users u ON u.id = CASE WHEN c.user1_id = ? THEN c.user2_id ELSE c.user1_id END
-        LEFT JOIN chat_messages m ON m.id = c.last_message_id
-        WHERE c.user1_id = ? OR c.user2_id = ?
-        ORDER BY c.last_activity DESC
-        LIMIT 10
-    ''', (session['user_id'], session['user_id'], session['user_id'], session['user_id'], session['user_id'], session['user_id']))
-    recent_conversations = cursor.fetchall()
+    # Get recent conversations (counters and snippets are kept on chat_conversations, see chat_inbox.py)
+    recent_conversations = chat_inbox.recent(cursor, session['user_id'], limit=10)
     
     conn.close()
     
@@ -3579,17 +4127,23 @@ def chat_conversation(user_id):
         flash('User not found', 'error')
         return redirect(url_for('chat_main'))
     
-    # Get conversation messages
-    cursor.execute('''
+    # Get the latest page of messages; ?before=<older_cursor> pages further back
+    limit = parse_page_limit(request.args.get('limit'), default=HISTORY_PAGE_SIZE, maximum=200)
+    try:
+        message_ids, older_cursor = chat_inbox.history_page(cursor, session['user_id'], user_id, limit,
+                                                            request.args.get('before'))
+    except ValueError:
+        conn.close()
+        flash('Invalid conversation page', 'error')
+        return redirect(url_for('chat_conversation', user_id=user_id))
+    cursor.execute(f'''
         SELECT m.id, m.sender_id, m.message, m.created_at, m.is_read,
                u.username, u.full_name
         FROM chat_messages m
         JOIN users u ON u.id = m.sender_id
-        WHERE (m.sender_id = ? AND m.receiver_id = ?) 
-           OR (m.sender_id = ? AND m.receiver_id = ?)
-        AND m.is_deleted = 0
-        ORDER BY m.created_at ASC
-    ''', (session['user_id'], user_id, user_id, session['user_id']))
+        WHERE m.id IN ({','.join('?' * len(message_ids))})
+        ORDER BY m.created_at ASC, m.id ASC
+    ''', message_ids)
     messages = cursor.fetchall()
     
     # Mark messages as read
@@ -3598,14 +4152,59 @@ def chat_conversation(user_id):
         SET is_read = 1, read_at = CURRENT_TIMESTAMP
         WHERE sender_id = ? AND receiver_id = ? AND is_read = 0
     ''', (user_id, session['user_id']))
+    read_count = cursor.rowcount
+    # Unconditional so a counter that drifted from chat_messages resets when the page is opened
+    chat_inbox.mark_read(cursor, session['user_id'], user_id)
     conn.commit()
     conn.close()
+    if read_count:
+        event_broker.publish([user_id], 'read', {'reader_id': session['user_id'], 'count': read_count})
     
     return render_template('chat_conversation.html',
                          other_user=other_user,
                          messages=messages,
+                         older_cursor=older_cursor,
                          current_user_id=session['user_id'])
 
+@app.route('/chat/history/<int:user_id>')
+@check_permission('chat')
+def chat_history(user_id):
+    """Older messages with a specific user (AJAX): before=<cursor>, limit (default 50, max 200)"""
+    limit = parse_page_limit(request.args.get('limit'), default=HISTORY_PAGE_SIZE, maximum=200)
+    conn = sqlite3.connect('bs_nexora_educational.db')
+    cursor = conn.cursor()
+    try:
+        message_ids, next_cursor = chat_inbox.history_page(cursor, session['user_id'], user_id, limit,
+                                                           request.args.get('before'))
+    except ValueError as e:
+        conn.close()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    cursor.execute(f'''
+        SELECT m.id, m.sender_id, m.message, m.created_at, m.is_read,
+               u.username, u.full_name
+        FROM chat_messages m
+        JOIN users u ON u.id = m.sender_id
+        WHERE m.id IN ({','.join('?' * len(message_ids))})
+        ORDER BY m.created_at ASC, m.id ASC
+    ''', message_ids)
+    messages = cursor.fetchall()
+    conn.close()
+    
+    return jsonify({
+        'success': True,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+        'messages': [{
+            'id': msg[0],
+            'sender_id': msg[1],
+            'message': msg[2],
+            'created_at': msg[3],
+            'is_read': msg[4],
+            'sender_username': msg[5],
+            'sender_name': msg[6]
+        } for msg in messages]
+    })
+
 @app.route('/chat/send', methods=['POST'])
 @check_permission('chat')
 def chat_send_message():
@@ -3632,19 +4231,24 @@ def chat_send_message():
         VALUES (?, ?, ?)
     ''', (session['user_id'], receiver_id, message))
     message_id = cursor.lastrowid
+    cursor.execute('SELECT created_at FROM chat_messages WHERE id = ?', (message_id,))
+    created_at = cursor.fetchone()[0]
     
-    # Update or create conversation
-    cursor.execute('''
-        INSERT OR REPLACE INTO chat_conversations 
-        (user1_id, user2_id, last_message_id, last_activity)
-        VALUES (
-            MIN(?, ?), MAX(?, ?), ?, CURRENT_TIMESTAMP
-        )
-    ''', (session['user_id'], receiver_id, session['user_id'], receiver_id, message_id))
+    # Update or create conversation, counting the message unread for the receiver
+    chat_inbox.record_message(cursor, session['user_id'], receiver_id, message_id, message, created_at)
     
     conn.commit()
     conn.close()
     
+    event_broker.publish([session['user_id'], receiver_id], 'message', {
+        'id': message_id,
+        'sender_id': session['user_id'],
+        'receiver_id': int(receiver_id),
+        'message': message,
+        'created_at': created_at,
+        'sender_name': session.get('full_name')
+    })
+    
     # Log the message for CTO oversight
     log_system_action(session['user_id'], 'chat_message_sent', f'Message sent to user {receiver_id}')
     
@@ -3653,33 +4257,52 @@ def chat_send_message():
 @app.route('/chat/messages/<int:user_id>')
 @check_permission('chat')
 def chat_get_messages(user_id):
-    """Get messages with specific user (AJAX)"""
+    """Get messages with specific user (AJAX)
+    
+    Pass since_id (the last_id of the previous response) to receive only
+    newer messages; without it the whole conversation is returned.
+    """
+    since_id = request.args.get('since_id', default=0, type=int)
     conn = sqlite3.connect('bs_nexora_educational.db')
     cursor = conn.cursor()
     
+    # One id range scan per direction on idx_chat_messages_pair
     cursor.execute('''
         SELECT m.id, m.sender_id, m.message, m.created_at, m.is_read,
                u.username, u.full_name
         FROM chat_messages m
         JOIN users u ON u.id = m.sender_id
-        WHERE (m.sender_id = ? AND m.receiver_id = ?) 
-           OR (m.sender_id = ? AND m.receiver_id = ?)
-        AND m.is_deleted = 0
-        ORDER BY m.created_at ASC
-    ''', (session['user_id'], user_id, user_id, session['user_id']))
+        WHERE ((m.sender_id = ? AND m.receiver_id = ?)
+            OR (m.sender_id = ? AND m.receiver_id = ?))
+          AND m.id > ?
+          AND m.is_deleted = 0
+        ORDER BY m.id ASC
+    ''', (session['user_id'], user_id, user_id, session['user_id'], since_id))
     messages = cursor.fetchall()
     
-    # Mark as read
+    # Mark as read, only when something is unread (an empty poll writes nothing)
     cursor.execute('''
-        UPDATE chat_messages 
-        SET is_read = 1, read_at = CURRENT_TIMESTAMP
-        WHERE sender_id = ? AND receiver_id = ? AND is_read = 0
-    ''', (user_id, session['user_id']))
-    conn.commit()
+        SELECT 1 FROM chat_messages
+        WHERE receiver_id = ? AND sender_id = ? AND is_read = 0
+        LIMIT 1
+    ''', (session['user_id'], user_id))
+    read_count = 0
+    if cursor.fetchone():
+        cursor.execute('''
+            UPDATE chat_messages 
+            SET is_read = 1, read_at = CURRENT_TIMESTAMP
+            WHERE receiver_id = ? AND sender_id = ? AND is_read = 0
+        ''', (session['user_id'], user_id))
+        read_count = cursor.rowcount
+        chat_inbox.mark_read(cursor, session['user_id'], user_id)
+        conn.commit()
     conn.close()
+    if read_count:
+        event_broker.publish([user_id], 'read', {'reader_id': session['user_id'], 'count': read_count})
     
     return jsonify({
         'success': True,
+        'last_id': messages[-1][0] if messages else since_id,
         'messages': [{
             'id': msg[0],
             'sender_id': msg[1],
@@ -3691,6 +4314,21 @@ def chat_get_messages(user_id):
         } for msg in messages]
     })
 
+@app.route('/events/stream')
+@check_permission('chat')
+def event_stream():
+    """Server-Sent Events: new messages, read receipts and ticket-answered notifications
+    
+    Browsers resend Last-Event-ID on reconnect; last_event_id in the query
+    string does the same for the first connection of a new page.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = Response(stream_with_context(event_broker.stream(session['user_id'], last_event_id)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # CTO CHAT OVERSIGHT - READ ALL PRIVATE MESSAGES
 @app.route('/cto/chat-oversight')
 @check_permission('chat_admin')
@@ -3748,19 +4386,25 @@ def cto_view_conversation(user1_id, user2_id):
     cursor.execute('SELECT username, full_name, role FROM users WHERE id IN (?, ?)', (user1_id, user2_id))
     users = cursor.fetchall()
     
-    # Get all messages between these users
-    cursor.execute('''
+    # Get the latest page of messages between these users; ?before=<older_cursor> pages back
+    limit = parse_page_limit(request.args.get('limit'), default=HISTORY_PAGE_SIZE, maximum=200)
+    try:
+        message_ids, older_cursor = chat_inbox.history_page(cursor, user1_id, user2_id, limit,
+                                                            request.args.get('before'))
+    except ValueError:
+        conn.close()
+        flash('Invalid conversation page', 'error')
+        return redirect(url_for('cto_view_conversation', user1_id=user1_id, user2_id=user2_id))
+    cursor.execute(f'''
         SELECT m.id, m.sender_id, m.receiver_id, m.message, m.created_at, m.is_read,
                s.username as sender_name, s.full_name as sender_full,
                r.username as receiver_name, r.full_name as receiver_full
         FROM chat_messages m
         JOIN users s ON s.id = m.sender_id
         JOIN users r ON r.id = m.receiver_id
-        WHERE (m.sender_id = ? AND m.receiver_id = ?) 
-           OR (m.sender_id = ? AND m.receiver_id = ?)
-        AND m.is_deleted = 0
-        ORDER BY m.created_at ASC
-    ''', (user1_id, user2_id, user2_id, user1_id))
+        WHERE m.id IN ({','.join('?' * len(message_ids))})
+        ORDER BY m.created_at ASC, m.id ASC
+    ''', message_ids)
     messages = cursor.fetchall()
     
     conn.close()
@@ -3768,6 +4412,7 @@ def cto_view_conversation(user1_id, user2_id):
     return render_template('cto_conversation_view.html',
                          users=users,
                          messages=messages,
+                         older_cursor=older_cursor,
                          user1_id=user1_id,
                          user2_id=user2_id)
 
@@ -4459,6 +5104,8 @@ if __name__ == '__main__':
     init_database()
     print("Creating default accounts...")
     create_default_accounts()
+    print("Starting background services...")
+    start_background_services()
     
     # Security notice - simplified authentication
     print("\n" + "="*50)
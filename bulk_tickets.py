@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Bulk Ticket Operations for B's Nexora Educational Platform
+Set-based close / reopen / delete / answer over student_faqs: selected ids
+go into a temp table and each chunk is one UPDATE or DELETE joined against
+it, with per-ticket audit rows written in the same statement batch
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+MAX_BULK_TICKETS = 50000
+CHUNK_SIZE = 5000
+
+BULK_ACTIONS = ('close', 'reopen', 'delete', 'answer')
+# Actions that only apply to pending tickets; others in the selection are skipped
+PENDING_ONLY_ACTIONS = ('answer',)
+
+# Placeholders: {student_name}, {ticket_id}, {question}
+ANSWER_TEMPLATES = {
+    'duplicate': 'Hi {student_name}, this question has come up before. {answer}',
+    'password_reset': ('Hi {student_name}, use the "Forgot password" link on the login page to reset '
+                       'your password. Contact support again if the reset email does not arrive.'),
+    'video_playback': ('Hi {student_name}, please refresh the page and try another browser. If the video '
+                       'still does not play, reply with the video title and we will check the file.'),
+    'course_access': ('Hi {student_name}, course access is granted by your teacher after enrollment. '
+                      'We have forwarded ticket #{ticket_id} to them.'),
+    'resolved': 'Hi {student_name}, this has been resolved. Thank you for your patience.'
+}
+
+ACTION_SQL = {
+    'close': "UPDATE student_faqs SET status = 'closed' WHERE id IN (SELECT id FROM temp.bulk_ticket_chunk)",
+    'reopen': "UPDATE student_faqs SET status = 'pending' WHERE id IN (SELECT id FROM temp.bulk_ticket_chunk)",
+    'delete': "DELETE FROM student_faqs WHERE id IN (SELECT id FROM temp.bulk_ticket_chunk)",
+    # Placeholders are filled per row inside the UPDATE, so a template costs one statement per chunk
+    'answer': '''
+        UPDATE student_faqs
+        SET answer = REPLACE(REPLACE(REPLACE(:answer,
+                         '{student_name}', COALESCE((SELECT full_name FROM users WHERE id = student_faqs.student_id), 'there')),
+                         '{ticket_id}', id),
+                         '{question}', question),
+            status = 'answered', answered_at = CURRENT_TIMESTAMP, answered_by = :user_id
+        WHERE id IN (SELECT id FROM temp.bulk_ticket_chunk) AND status = 'pending'
+    '''
+}
+
+def render_template_text(template, answer=None):
+    """Template text with {answer} filled in; the per-ticket placeholders stay for the UPDATE"""
+    return ANSWER_TEMPLATES[template].replace('{answer}', answer or '')
+
+class BulkTicketOperations:
+    def __init__(self, max_tickets=MAX_BULK_TICKETS, chunk_size=CHUNK_SIZE):
+        """Limits: selections above max_tickets are rejected; each chunk commits separately"""
+        self.max_tickets = max_tickets
+        self.chunk_size = chunk_size
+    
+    def validate(self, action, ticket_ids, answer=None):
+        """Error message for a bad request, or None"""
+        if action not in BULK_ACTIONS:
+            return 'Invalid action'
+        if not ticket_ids:
+            return 'Missing ticket IDs or action'
+        if len(ticket_ids) > self.max_tickets:
+            return f'Too many tickets selected ({len(ticket_ids)}); the limit is {self.max_tickets}'
+        if action == 'answer' and not (answer or '').strip():
+            return 'Answer cannot be empty'
+        return None
+    
+    def run(self, conn, action, ticket_ids, user_id, answer=None, on_chunk=None):
+        """Apply `action` to ticket_ids in chunks; returns (tickets affected, tickets skipped)
+
+        For PENDING_ONLY_ACTIONS each chunk is first narrowed to its pending
+        tickets, so answered or closed ones are skipped (and not audited).
+        on_chunk(cursor, chunk_ids, phase) is called with phase 'before' and
+        'after' around each chunk's write, inside its transaction, so callers
+        can capture rows for incremental metrics, and with 'committed' once
+        the chunk's commit succeeded; captures should only be kept then.
+        """
+        cursor = conn.cursor()
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS bulk_ticket_ids (id INTEGER PRIMARY KEY)')
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS bulk_ticket_chunk (id INTEGER PRIMARY KEY)')
+        cursor.execute('DELETE FROM temp.bulk_ticket_ids')
+        cursor.executemany('INSERT OR IGNORE INTO temp.bulk_ticket_ids (id) VALUES (?)',
+                           [(int(ticket_id),) for ticket_id in ticket_ids])
+        # Only ids that exist are processed (and audited)
+        cursor.execute('DELETE FROM temp.bulk_ticket_ids WHERE id NOT IN (SELECT id FROM student_faqs)')
+        conn.commit()
+        
+        affected = 0
+        skipped = 0
+        last_id = 0
+        while True:
+            cursor.execute('DELETE FROM temp.bulk_ticket_chunk')
+            cursor.execute('''
+                INSERT INTO temp.bulk_ticket_chunk (id)
+                SELECT id FROM temp.bulk_ticket_ids WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, self.chunk_size))
+            cursor.execute('SELECT MAX(id) FROM temp.bulk_ticket_chunk')
+            chunk_end = cursor.fetchone()[0]
+            if chunk_end is None:
+                break
+            if action in PENDING_ONLY_ACTIONS:
+                # Same transaction as the write below, so the status cannot change in between
+                cursor.execute('''
+                    DELETE FROM temp.bulk_ticket_chunk
+                    WHERE id IN (SELECT f.id FROM student_faqs f JOIN temp.bulk_ticket_chunk c ON c.id = f.id
+                                 WHERE f.status != 'pending')
+                ''')
+                skipped += cursor.rowcount
+            cursor.execute('SELECT id FROM temp.bulk_ticket_chunk ORDER BY id')
+            chunk_ids = [row[0] for row in cursor.fetchall()]
+            last_id = chunk_end
+            if not chunk_ids:
+                conn.commit()
+                continue
+            
+            if on_chunk:
+                on_chunk(cursor, chunk_ids, 'before')
+            cursor.execute(ACTION_SQL[action], {'answer': answer, 'user_id': user_id})
+            affected += cursor.rowcount
+            self._audit(cursor, action, user_id)
+            if on_chunk:
+                on_chunk(cursor, chunk_ids, 'after')
+            conn.commit()
+            if on_chunk:
+                on_chunk(cursor, chunk_ids, 'committed')
+        
+        cursor.execute('DELETE FROM temp.bulk_ticket_ids')
+        cursor.execute('DELETE FROM temp.bulk_ticket_chunk')
+        conn.commit()
+        return affected, skipped
+    
+    def _audit(self, cursor, action, user_id):
+        """One audit row per ticket in the chunk, written set-based into both log tables"""
+        for table in ('system_logs', 'system_activity'):
+            cursor.execute(f'''
+                INSERT INTO {table} (user_id, action, details)
+                SELECT ?, ?, 'Bulk ' || ? || ' of support ticket #' || id FROM temp.bulk_ticket_chunk
+            ''', (user_id, f'support_ticket_bulk_{action}', action))
+
+bulk_ticket_operations = BulkTicketOperations()
+
+# === BENCHMARK ===
+
+def _benchmark_database(path, tickets):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE users (id INTEGER PRIMARY KEY, full_name TEXT);
+        CREATE TABLE student_faqs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER NOT NULL, question TEXT NOT NULL,
+            answer TEXT, category TEXT DEFAULT 'general', status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, answered_by INTEGER, answered_at TIMESTAMP
+        );
+        CREATE INDEX idx_student_faqs_status_created ON student_faqs (status, created_at);
+        CREATE TABLE system_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+                                  action TEXT NOT NULL, details TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE system_activity (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+                                      action TEXT NOT NULL, details TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    ''')
+    conn.executemany('INSERT INTO users (id, full_name) VALUES (?, ?)', [(i, f'Student {i}') for i in range(1, 501)])
+    conn.executemany('INSERT INTO student_faqs (student_id, question) VALUES (?, ?)',
+                     [(i % 500 + 1, f'Question number {i}') for i in range(tickets)])
+    conn.commit()
+    return conn
+
+def benchmark(tickets=20000):
+    """Time the per-id executemany approach against the chunked set-based one
+
+    Both do the same work: per-ticket audit rows in both log tables and, for
+    'answer', the template personalised with each student's name.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ('per_id', 'set_based'):
+            path = os.path.join(directory, f'{name}.db')
+            conn = _benchmark_database(path, tickets)
+            ids = [row[0] for row in conn.execute('SELECT id FROM student_faqs ORDER BY RANDOM()')]
+            timings = {}
+            template = render_template_text('resolved')
+            for action in ('close', 'reopen', 'answer', 'delete'):
+                started = time.perf_counter()
+                if name == 'per_id':
+                    if action == 'delete':
+                        conn.executemany('DELETE FROM student_faqs WHERE id = ?', [(i,) for i in ids])
+                    elif action == 'answer':
+                        answers = []
+                        for i in ids:
+                            question, student_name = conn.execute('''
+                                SELECT f.question, COALESCE(u.full_name, 'there') FROM student_faqs f
+                                LEFT JOIN users u ON u.id = f.student_id
+                                WHERE f.id = ?
+                            ''', (i,)).fetchone()
+                            answers.append((template.replace('{student_name}', student_name)
+                                            .replace('{ticket_id}', str(i)).replace('{question}', question), i))
+                        conn.executemany('''
+                            UPDATE student_faqs SET answer = ?, status = 'answered',
+                                   answered_at = CURRENT_TIMESTAMP, answered_by = 1
+                            WHERE id = ?
+                        ''', answers)
+                    else:
+                        status = 'closed' if action == 'close' else 'pending'
+                        conn.executemany('UPDATE student_faqs SET status = ? WHERE id = ?', [(status, i) for i in ids])
+                    for table in ('system_logs', 'system_activity'):
+                        conn.executemany(f'INSERT INTO {table} (user_id, action, details) VALUES (1, ?, ?)',
+                                         [(f'support_ticket_bulk_{action}', f'Bulk {action} of support ticket #{i}')
+                                          for i in ids])
+                    conn.commit()
+                else:
+                    bulk_ticket_operations.run(conn, action, ids, 1, answer=template)
+                timings[action] = round(time.perf_counter() - started, 3)
+            conn.close()
+            results[name] = timings
+    return results
+
+def main():
+    """Benchmark from the command line: python bulk_tickets.py [tickets]"""
+    tickets = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    results = benchmark(tickets)
+    print(f"Bulk ticket operations on {tickets} tickets (seconds)")
+    print(f"{'action':<10}{'per-id':>10}{'set-based':>12}")
+    for action in results['per_id']:
+        print(f"{action:<10}{results['per_id'][action]:>10}{results['set_based'][action]:>12}")
+
+if __name__ == '__main__':
+    main()
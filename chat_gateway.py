@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Chat Gateway for B's Nexora Educational Platform
+Optional asyncio process for the long-lived chat connections (WebSocket
+and Server-Sent Events) that the threaded Flask server cannot hold in the
+thousands. Clients authenticate with the Flask session cookie and must
+come from an allowed page origin; events arrive from the main app over a
+local socket (event_stream.GatewayForwarder, authenticated with a token
+derived from the session key) and are fanned out to every connection of
+the users they concern.
+
+Requires aiohttp. Run: python chat_gateway.py [--port 5010]
+Load test:             python chat_gateway.py loadtest --connections 2000
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import multiprocessing
+import os
+import random
+import time
+from collections import deque
+
+try:
+    import aiohttp
+    from aiohttp import web
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+from event_stream import (GATEWAY_FEED_ADDRESS, HISTORY_PER_USER, BUFFER_PER_STREAM, HEARTBEAT_SECONDS,
+                          RETRY_MILLISECONDS, feed_token, format_sse)
+
+SESSION_SECRET_FILE = 'session_secret.key'
+GATEWAY_ADDRESS = ('127.0.0.1', 5010)
+# Pages allowed to open streams; add the public origin with --origin when behind a proxy
+APP_ORIGINS = ('http://127.0.0.1:5000', 'http://localhost:5000')
+FEED_AUTH_SECONDS = 5
+
+class SessionReader:
+    """Reads (and, for the load test, writes) Flask session cookies"""
+    
+    def __init__(self, secret):
+        flask_app = Flask(__name__)
+        flask_app.secret_key = secret
+        interface = SecureCookieSessionInterface()
+        self.cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+        self.max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        self.serializer = interface.get_signing_serializer(flask_app)
+    
+    def user_id(self, cookies):
+        value = cookies.get(self.cookie_name)
+        if not value:
+            return None
+        try:
+            data = self.serializer.loads(value, max_age=self.max_age)
+        except Exception:
+            return None
+        return data.get('user_id')
+    
+    def cookie(self, user_id, role='student'):
+        return self.serializer.dumps({'user_id': user_id, 'role': role})
+
+class Connection:
+    def __init__(self, user_id, buffer_size):
+        self.user_id = user_id
+        self.backlog = []
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.overflowed = False
+
+class ChatGateway:
+    def __init__(self, secret, allowed_origins=APP_ORIGINS, history_per_user=HISTORY_PER_USER,
+                 buffer_per_stream=BUFFER_PER_STREAM, heartbeat_seconds=HEARTBEAT_SECONDS):
+        """Same replay and buffering rules as event_stream.EventBroker, on asyncio queues"""
+        self.sessions = SessionReader(secret)
+        self.feed_token = feed_token(secret)
+        self.allowed_origins = {origin.rstrip('/') for origin in allowed_origins}
+        self.history_per_user = history_per_user
+        self.buffer_per_stream = buffer_per_stream
+        self.heartbeat_seconds = heartbeat_seconds
+        self.connections = {}       # user id -> set of Connection
+        self.history = {}           # user id -> deque of (sequence, event id, event type, data)
+        self.evicted = {}           # user id -> sequence of the newest event dropped from history
+        self.boot = None            # boot part of the app's event ids; a change means the app restarted
+        self.stats = {'events': 0, 'deliveries': 0, 'overflows': 0, 'resyncs': 0, 'connections': 0,
+                      'open': 0, 'peak_open': 0, 'feeds': 0, 'rejected_feeds': 0, 'rejected_origins': 0}
+    
+    # === FEED ===
+    
+    def dispatch(self, event):
+        boot, _, sequence = event['id'].partition('-')
+        if boot != self.boot:
+            self.boot = boot
+            self.history.clear()
+            self.evicted.clear()
+        sequence = int(sequence)
+        item = (event['id'], event['event'], event['data'])
+        self.stats['events'] += 1
+        for user_id in event['user_ids']:
+            history = self.history.get(user_id)
+            if history is None:
+                history = self.history[user_id] = deque(maxlen=self.history_per_user)
+            if len(history) == self.history_per_user:
+                self.evicted[user_id] = history[0][0]
+            history.append((sequence,) + item)
+            for connection in self.connections.get(user_id, ()):
+                try:
+                    connection.queue.put_nowait(item)
+                    self.stats['deliveries'] += 1
+                except asyncio.QueueFull:
+                    connection.overflowed = True
+    
+    async def handle_feed(self, reader, writer):
+        """One JSON event per line from the main app, after a {"token": ...} line"""
+        try:
+            try:
+                line = await asyncio.wait_for(reader.readline(), FEED_AUTH_SECONDS)
+                if not line:
+                    return      # a port probe
+                token = json.loads(line).get('token')
+            except (asyncio.TimeoutError, ValueError, AttributeError):
+                token = None
+            if not isinstance(token, str) or not hmac.compare_digest(token, self.feed_token):
+                self.stats['rejected_feeds'] += 1
+                print("WARNING: Chat gateway rejected an event feed without a valid token")
+                return
+            self.stats['feeds'] += 1
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.dispatch(json.loads(line))
+                except (ValueError, KeyError) as e:
+                    print(f"WARNING: Chat gateway skipped a bad feed line: {e}")
+        finally:
+            writer.close()
+    
+    # === CONNECTIONS ===
+    
+    def open(self, user_id, last_event_id):
+        connection = Connection(user_id, self.buffer_per_stream)
+        if last_event_id:
+            boot, _, sequence = last_event_id.partition('-')
+            if boot != self.boot or not sequence.isdigit() or int(sequence) < self.evicted.get(user_id, 0):
+                connection.backlog.append((None, 'resync', {'reason': 'history unavailable'}))
+                self.stats['resyncs'] += 1
+            else:
+                connection.backlog.extend(item[1:] for item in self.history.get(user_id, ())
+                                          if item[0] > int(sequence))
+        self.connections.setdefault(user_id, set()).add(connection)
+        self.stats['connections'] += 1
+        self.stats['open'] += 1
+        self.stats['peak_open'] = max(self.stats['peak_open'], self.stats['open'])
+        return connection
+    
+    def close(self, connection):
+        connections = self.connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.connections[connection.user_id]
+        self.stats['open'] -= 1
+    
+    async def events(self, connection):
+        """Yield events for one connection; None means send a heartbeat. Ends after a resync"""
+        for item in connection.backlog:
+            yield item
+            if item[1] == 'resync':
+                return
+        connection.backlog = []
+        while True:
+            if connection.overflowed:
+                self.stats['overflows'] += 1
+                self.stats['resyncs'] += 1
+                yield (None, 'resync', {'reason': 'buffer overflow'})
+                return
+            try:
+                yield await asyncio.wait_for(connection.queue.get(), self.heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield None
+    
+    def check_origin(self, request, required):
+        """Refuse pages from other sites riding on the user's session cookie"""
+        origin = request.headers.get('Origin')
+        if origin is None and not required:
+            return
+        if origin is None or (origin.rstrip('/') not in self.allowed_origins
+                              and origin != f'{request.scheme}://{request.host}'):
+            self.stats['rejected_origins'] += 1
+            raise web.HTTPForbidden(text='Origin not allowed')
+    
+    async def handle_sse(self, request):
+        self.check_origin(request, required=False)
+        user_id = self.sessions.user_id(request.cookies)
+        if user_id is None:
+            raise web.HTTPUnauthorized()
+        last_event_id = request.headers.get('Last-Event-ID') or request.query.get('last_event_id')
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                               'X-Accel-Buffering': 'no'})
+        await response.prepare(request)
+        connection = self.open(user_id, last_event_id)
+        try:
+            await response.write(f'retry: {RETRY_MILLISECONDS}\n\n'.encode())
+            async for item in self.events(connection):
+                text = ': heartbeat\n\n' if item is None else format_sse(*item)
+                await response.write(text.encode('utf-8'))
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            self.close(connection)
+        return response
+    
+    async def handle_websocket(self, request):
+        """WebSocket messages are JSON objects: {"id", "event", "data"}
+
+        Browsers always send Origin on the handshake, so it is required here:
+        the cookie alone would let any site open a socket as the user.
+        """
+        self.check_origin(request, required=True)
+        user_id = self.sessions.user_id(request.cookies)
+        if user_id is None:
+            raise web.HTTPUnauthorized()
+        ws = web.WebSocketResponse(heartbeat=self.heartbeat_seconds)
+        await ws.prepare(request)
+        connection = self.open(user_id, request.query.get('last_event_id'))
+        
+        async def send_events():
+            async for item in self.events(connection):
+                if item is not None:
+                    event_id, event_type, data = item
+                    await ws.send_str(json.dumps({'id': event_id, 'event': event_type, 'data': data},
+                                                 separators=(',', ':')))
+            await ws.close()
+        
+        sender = asyncio.create_task(send_events())
+        try:
+            async for _ in ws:
+                pass    # clients send through the regular HTTP endpoints
+        finally:
+            sender.cancel()
+            self.close(connection)
+        return ws
+    
+    async def handle_status(self, request):
+        return web.json_response(dict(self.stats, users_online=len(self.connections)))
+    
+    def build_app(self):
+        app = web.Application()
+        app.router.add_get('/events/stream', self.handle_sse)
+        app.router.add_get('/ws', self.handle_websocket)
+        app.router.add_get('/gateway/status', self.handle_status)
+        return app
+    
+    async def serve(self, address=GATEWAY_ADDRESS, feed_address=GATEWAY_FEED_ADDRESS):
+        runner = web.AppRunner(self.build_app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, address[0], address[1], backlog=4096).start()
+        feed = await asyncio.start_server(self.handle_feed, feed_address[0], feed_address[1])
+        print(f"SUCCESS: Chat gateway on http://{address[0]}:{address[1]}, "
+              f"event feed on {feed_address[0]}:{feed_address[1]}")
+        async with feed:
+            await feed.serve_forever()
+
+def read_session_secret(path=SESSION_SECRET_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+# === LOAD TEST ===
+
+def _run_gateway(secret, address, feed_address):
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {min(os.sched_getaffinity(0))})
+    asyncio.run(ChatGateway(secret).serve(address, feed_address))
+
+def _rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+
+async def _wait_for_port(address, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(*address)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+async def _load_client(session, url, transport, cookie, ready, latencies, received):
+    headers = {'Cookie': cookie, 'Origin': APP_ORIGINS[0]}
+    if transport == 'ws':
+        async with session.ws_connect(url.replace('http', 'ws', 1) + '/ws', headers=headers) as ws:
+            ready.release()
+            async for message in ws:
+                event = json.loads(message.data)
+                latencies.append(time.time() - event['data']['sent'])
+                received[0] += 1
+    else:
+        async with session.get(url + '/events/stream', headers=headers) as response:
+            ready.release()
+            async for line in response.content:
+                if line.startswith(b'data: '):
+                    event = json.loads(line[6:])
+                    latencies.append(time.time() - event['sent'])
+                    received[0] += 1
+
+async def _load_test(args, secret, address, feed_address):
+    sessions = SessionReader(secret)
+    url = f'http://{address[0]}:{address[1]}'
+    await _wait_for_port(address)
+    await _wait_for_port(feed_address)
+    
+    latencies, received = [], [0]
+    ready = asyncio.Semaphore(0)
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.monotonic()
+        clients = []
+        for user_id in range(1, args.connections + 1):
+            transport = args.transport if args.transport != 'mixed' else ('ws' if user_id % 2 else 'sse')
+            cookie = f'{sessions.cookie_name}={sessions.cookie(user_id)}'
+            clients.append(asyncio.create_task(
+                _load_client(session, url, transport, cookie, ready, latencies, received)))
+        for _ in clients:
+            await asyncio.wait_for(ready.acquire(), 60)
+        connect_seconds = time.monotonic() - started
+        
+        # Publish like the main app does, at a steady rate, each event to one random user
+        _, feed = await asyncio.open_connection(*feed_address)
+        feed.write((json.dumps({'token': feed_token(secret)}) + '\n').encode())
+        interval = 1 / args.rate
+        started = time.monotonic()
+        for sequence in range(1, args.messages + 1):
+            user_id = random.randint(1, args.connections)
+            event = {'user_ids': [user_id], 'id': f'loadtest-{sequence}', 'event': 'message',
+                     'data': {'sent': time.time()}}
+            feed.write((json.dumps(event) + '\n').encode())
+            await feed.drain()
+            await asyncio.sleep(max(0.0, started + sequence * interval - time.monotonic()))
+        deadline = time.monotonic() + 10
+        while received[0] < args.messages and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        publish_seconds = time.monotonic() - started
+        feed.close()
+        
+        for client in clients:
+            client.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+    
+    latencies.sort()
+    def percentile(fraction):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 2) if latencies else None
+    return {
+        'connections': args.connections,
+        'transport': args.transport,
+        'connect_seconds': round(connect_seconds, 2),
+        'messages': args.messages,
+        'delivered': received[0],
+        'seconds': round(publish_seconds, 2),
+        'latency_ms_p50': percentile(0.50),
+        'latency_ms_p95': percentile(0.95),
+        'latency_ms_p99': percentile(0.99),
+        'latency_ms_max': round(latencies[-1] * 1000, 2) if latencies else None
+    }
+
+def load_test(args):
+    """Gateway in a child process pinned to one core; clients and publisher in this one"""
+    secret = os.urandom(16).hex()
+    address = ('127.0.0.1', args.port)
+    feed_address = ('127.0.0.1', args.feed_port)
+    process = multiprocessing.Process(target=_run_gateway, args=(secret, address, feed_address), daemon=True)
+    process.start()
+    try:
+        result = asyncio.run(_load_test(args, secret, address, feed_address))
+        result['gateway_rss_mb'] = _rss_mb(process.pid)
+    finally:
+        process.terminate()
+        process.join()
+    print(f"Chat gateway load test ({os.cpu_count()} CPU(s) on this machine, gateway pinned to one)")
+    for key, value in result.items():
+        print(f"  {key:<18}{value}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat gateway for B's Nexora (WebSocket and SSE)")
+    parser.add_argument('command', nargs='?', choices=('serve', 'loadtest'), default='serve')
+    parser.add_argument('--port', type=int, default=GATEWAY_ADDRESS[1])
+    parser.add_argument('--feed-port', type=int, default=GATEWAY_FEED_ADDRESS[1])
+    parser.add_argument('--secret-file', default=SESSION_SECRET_FILE, help="The main app's session key file")
+    parser.add_argument('--origin', action='append', default=[],
+                        help='Extra page origin allowed to connect (repeatable)')
+    parser.add_argument('--connections', type=int, default=2000, help='loadtest: concurrent clients')
+    parser.add_argument('--messages', type=int, default=5000, help='loadtest: events to publish')
+    parser.add_argument('--rate', type=int, default=500, help='loadtest: events per second')
+    parser.add_argument('--transport', choices=('ws', 'sse', 'mixed'), default='mixed')
+    args = parser.parse_args()
+    
+    if not AIOHTTP_AVAILABLE:
+        parser.error('the chat gateway requires aiohttp (pip install aiohttp)')
+    if args.command == 'loadtest':
+        # Ports offset from the defaults so a running gateway is left alone
+        if args.port == GATEWAY_ADDRESS[1]:
+            args.port += 100
+        if args.feed_port == GATEWAY_FEED_ADDRESS[1]:
+            args.feed_port += 100
+        load_test(args)
+        return
+    gateway = ChatGateway(read_session_secret(args.secret_file), allowed_origins=APP_ORIGINS + tuple(args.origin))
+    asyncio.run(gateway.serve(('127.0.0.1', args.port), ('127.0.0.1', args.feed_port)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Chat Inbox for B's Nexora Educational Platform
+One chat_conversations row per pair of users (user1_id < user2_id) carrying
+each participant's unread count and a snippet of the last message, kept in
+step with chat_messages inside the send and read transactions so the inbox
+is a single indexed query. Also pages conversation history by keyset
+"""
+
+import sqlite3
+
+from search_index import encode_cursor, decode_cursor
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+SNIPPET_LENGTH = 120
+HISTORY_PAGE_SIZE = 50
+
+INBOX_COLUMNS = (('user1_unread', 'INTEGER NOT NULL DEFAULT 0'), ('user2_unread', 'INTEGER NOT NULL DEFAULT 0'),
+                 ('last_message_snippet', 'TEXT'), ('last_sender_id', 'INTEGER'))
+
+def snippet(message):
+    message = ' '.join((message or '').split())
+    return message if len(message) <= SNIPPET_LENGTH else message[:SNIPPET_LENGTH - 1].rstrip() + '…'
+
+class ChatInbox:
+    def __init__(self, db_path=DATABASE_PATH):
+        """Initialize the inbox; all state lives in chat_conversations"""
+        self.db_path = db_path
+    
+    def _has_unique_pair(self, cursor):
+        cursor.execute("PRAGMA index_list(chat_conversations)")
+        for _, name, unique, _, _ in cursor.fetchall():
+            if unique:
+                cursor.execute(f"PRAGMA index_info('{name}')")
+                if [column[2] for column in cursor.fetchall()] == ['user1_id', 'user2_id']:
+                    return True
+        return False
+    
+    def ensure_schema(self, cursor):
+        """Add the counter columns, merge duplicate pairs and enforce uniqueness (called from init_database)"""
+        cursor.execute("PRAGMA table_info(chat_conversations)")
+        existing = {column[1] for column in cursor.fetchall()}
+        added = False
+        for name, column_type in INBOX_COLUMNS:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE chat_conversations ADD COLUMN {name} {column_type}")
+                added = True
+        
+        merged = 0
+        if not self._has_unique_pair(cursor):
+            merged = self.merge_duplicates(cursor)
+            cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_conversations_pair '
+                           'ON chat_conversations (user1_id, user2_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_conversations_user1 '
+                       'ON chat_conversations (user1_id, last_activity)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_conversations_user2 '
+                       'ON chat_conversations (user2_id, last_activity)')
+        # Covers the per-direction keyset scans in history_page()
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_messages_history '
+                       'ON chat_messages (sender_id, receiver_id, is_deleted, created_at, id)')
+        
+        if added or merged:
+            self.rebuild(cursor)
+    
+    def merge_duplicates(self, cursor):
+        """Collapse rows for the same pair (in either order) into the oldest one; returns rows removed"""
+        cursor.execute('DROP TABLE IF EXISTS temp.chat_conversation_pairs')
+        cursor.execute('''
+            CREATE TEMP TABLE chat_conversation_pairs AS
+            SELECT MIN(id) AS keep_id,
+                   MIN(user1_id, user2_id) AS low_id, MAX(user1_id, user2_id) AS high_id,
+                   MAX(last_message_id) AS last_message_id, MAX(last_activity) AS last_activity,
+                   MIN(created_at) AS created_at, COUNT(*) AS row_count
+            FROM chat_conversations
+            GROUP BY MIN(user1_id, user2_id), MAX(user1_id, user2_id)
+        ''')
+        cursor.execute('''
+            DELETE FROM chat_conversations
+            WHERE id NOT IN (SELECT keep_id FROM temp.chat_conversation_pairs)
+        ''')
+        merged = cursor.rowcount
+        cursor.execute('''
+            UPDATE chat_conversations
+            SET user1_id = pairs.low_id, user2_id = pairs.high_id,
+                last_message_id = pairs.last_message_id, last_activity = pairs.last_activity,
+                created_at = pairs.created_at
+            FROM temp.chat_conversation_pairs AS pairs
+            WHERE chat_conversations.id = pairs.keep_id
+        ''')
+        cursor.execute('DROP TABLE temp.chat_conversation_pairs')
+        if merged:
+            print(f"INFO: Merged {merged} duplicate chat conversation rows")
+        return merged
+    
+    def rebuild(self, cursor=None):
+        """Recompute every conversation's counters and last message from chat_messages"""
+        conn = None
+        if cursor is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                UPDATE chat_conversations
+                SET user1_unread = (SELECT COUNT(*) FROM chat_messages
+                                    WHERE receiver_id = chat_conversations.user1_id
+                                      AND sender_id = chat_conversations.user2_id AND is_read = 0),
+                    user2_unread = (SELECT COUNT(*) FROM chat_messages
+                                    WHERE receiver_id = chat_conversations.user2_id
+                                      AND sender_id = chat_conversations.user1_id AND is_read = 0),
+                    last_message_id = COALESCE(
+                        (SELECT MAX(id) FROM chat_messages
+                         WHERE (sender_id = chat_conversations.user1_id AND receiver_id = chat_conversations.user2_id)
+                            OR (sender_id = chat_conversations.user2_id AND receiver_id = chat_conversations.user1_id)),
+                        last_message_id)
+            ''')
+            cursor.execute('''
+                UPDATE chat_conversations
+                SET last_message_snippet = m.message, last_sender_id = m.sender_id, last_activity = m.created_at
+                FROM chat_messages AS m
+                WHERE m.id = chat_conversations.last_message_id
+            ''')
+            cursor.execute('SELECT id, last_message_snippet FROM chat_conversations WHERE last_message_snippet IS NOT NULL')
+            cursor.executemany('UPDATE chat_conversations SET last_message_snippet = ? WHERE id = ?',
+                               [(snippet(message), conversation_id) for conversation_id, message in cursor.fetchall()])
+            if conn is not None:
+                conn.commit()
+        finally:
+            if conn is not None:
+                conn.close()
+    
+    # === WRITE HOOKS (same transaction as the chat_messages write) ===
+    
+    def record_message(self, cursor, sender_id, receiver_id, message_id, message, created_at):
+        """Upsert the pair's row for a new message and count it unread for the receiver"""
+        sender_id, receiver_id = int(sender_id), int(receiver_id)
+        low_id, high_id = min(sender_id, receiver_id), max(sender_id, receiver_id)
+        cursor.execute('''
+            INSERT INTO chat_conversations
+                (user1_id, user2_id, last_message_id, last_activity, last_message_snippet, last_sender_id,
+                 user1_unread, user2_unread)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user1_id, user2_id) DO UPDATE SET
+                last_message_id = excluded.last_message_id,
+                last_activity = excluded.last_activity,
+                last_message_snippet = excluded.last_message_snippet,
+                last_sender_id = excluded.last_sender_id,
+                user1_unread = user1_unread + excluded.user1_unread,
+                user2_unread = user2_unread + excluded.user2_unread
+        ''', (low_id, high_id, message_id, created_at, snippet(message), sender_id,
+              int(receiver_id == low_id), int(receiver_id == high_id)))
+    
+    def mark_read(self, cursor, reader_id, other_id):
+        """Zero the reader's unread count after their messages from other_id were marked read
+
+        Cheap enough to call on every conversation view: one lookup on the
+        pair index, and no write when the count is already zero.
+        """
+        reader_id, other_id = int(reader_id), int(other_id)
+        column = 'user1_unread' if reader_id < other_id else 'user2_unread'
+        cursor.execute(f'UPDATE chat_conversations SET {column} = 0 '
+                       f'WHERE user1_id = ? AND user2_id = ? AND {column} != 0',
+                       (min(reader_id, other_id), max(reader_id, other_id)))
+    
+    # === READS ===
+    
+    def history_page(self, cursor, user_a, user_b, limit=HISTORY_PAGE_SIZE, before=None):
+        """One page of the conversation between two users, newest page first
+
+        Returns (message ids oldest first, cursor for the next older page or
+        None). `before` is a cursor from a previous call; a bad one raises
+        ValueError. Each direction reads at most limit + 1 entries of
+        idx_chat_messages_history, so a page costs the same however long the
+        conversation is.
+        """
+        keyset, keyset_params = '', []
+        if before:
+            keyset = 'AND (created_at, id) < (?, ?)'
+            keyset_params = decode_cursor(before, 2)
+            created_at, message_id = keyset_params
+            if not isinstance(created_at, str) or not isinstance(message_id, int) or isinstance(message_id, bool):
+                raise ValueError('Invalid pagination cursor')
+        branch = f'''
+            SELECT id, created_at FROM (
+                SELECT id, created_at FROM chat_messages
+                WHERE sender_id = ? AND receiver_id = ? AND is_deleted = 0 {keyset}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            )
+        '''
+        if int(user_a) == int(user_b):
+            # Notes to self: both directions are the same rows
+            cursor.execute(f'{branch} ORDER BY created_at DESC, id DESC',
+                           [user_a, user_a, *keyset_params, limit + 1])
+        else:
+            cursor.execute(f'''
+                {branch}
+                UNION ALL
+                {branch}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', [user_a, user_b, *keyset_params, limit + 1, user_b, user_a, *keyset_params, limit + 1, limit + 1])
+        rows = cursor.fetchall()
+        next_cursor = encode_cursor([rows[limit - 1][1], rows[limit - 1][0]]) if len(rows) > limit else None
+        return [message_id for message_id, _ in reversed(rows[:limit])], next_cursor
+    
+    def recent(self, cursor, user_id, limit=10):
+        """Latest conversations for user_id:
+        (other_user_id, username, full_name, role, last_message_snippet, last_activity,
+         last_message_is_read, unread_count)
+        """
+        cursor.execute('''
+            SELECT u.id, u.username, u.full_name, u.role, c.last_message_snippet, c.last_activity,
+                   CASE WHEN c.last_sender_id = c.user1_id THEN c.user2_unread = 0 ELSE c.user1_unread = 0 END,
+                   CASE WHEN c.user1_id = :user THEN c.user1_unread ELSE c.user2_unread END
+            FROM chat_conversations c
+            JOIN users u ON u.id = CASE WHEN c.user1_id = :user THEN c.user2_id ELSE c.user1_id END
+            WHERE c.user1_id = :user OR c.user2_id = :user
+            ORDER BY c.last_activity DESC
+            LIMIT :limit
+        ''', {'user': user_id, 'limit': limit})
+        return cursor.fetchall()
+
+chat_inbox = ChatInbox()
@@ -10,9 +10,164 @@ import sqlite3
 import shutil
 import requests
 import base64
+import re
+import unicodedata
 from datetime import datetime
 from pathlib import Path
 
+# Static search index written next to docs/video_catalog.json
+SEARCH_INDEX_DIR = 'docs/search_index'
+SEARCH_INDEX_VERSION = 1
+DOCS_PER_SHARD = 200
+DESCRIPTION_PREVIEW_CHARS = 160
+# Same emphasis as the server-side FTS ranking: title, teacher, subject, category, description
+FIELD_WEIGHTS = {'title': 10, 'teacher_name': 5, 'subject': 4, 'category': 3, 'description': 2}
+DOC_FIELDS = ['id', 'title', 'description', 'teacher_name', 'upload_date', 'category', 'subject', 'filename']
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+', re.UNICODE)
+
+def tokenize(text):
+    """Lowercase, strip accents and split into word tokens of two or more characters
+    
+    search_loader.js applies exactly the same steps to queries.
+    """
+    if not text:
+        return []
+    decomposed = unicodedata.normalize('NFKD', str(text).lower())
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return [token for token in TOKEN_PATTERN.findall(stripped) if len(token) >= 2]
+
+def shard_name(token):
+    """Term shard for a token: hex code points of its first two characters"""
+    return '-'.join(format(ord(ch), 'x') for ch in token[:2])
+
+SEARCH_LOADER_JS = r'''/* B's Nexora static video search
+ * Queries the prebuilt index in search_index/ (written by enhanced_video_sync.py)
+ * and fetches only the term and document shards a query needs.
+ */
+(function (global) {
+    'use strict';
+    
+    // Must match tokenize() in enhanced_video_sync.py
+    function tokenize(text) {
+        const normalized = String(text || '').toLowerCase().normalize('NFKD').replace(/\p{M}/gu, '');
+        return (normalized.match(/[\p{L}\p{N}]+/gu) || []).filter(token => token.length >= 2);
+    }
+    
+    function shardName(token) {
+        return Array.from(token).slice(0, 2).map(ch => ch.codePointAt(0).toString(16)).join('-');
+    }
+    
+    function lowerBound(sorted, value) {
+        let low = 0, high = sorted.length;
+        while (low < high) {
+            const mid = (low + high) >>> 1;
+            if (sorted[mid] < value) low = mid + 1; else high = mid;
+        }
+        return low;
+    }
+    
+    function NexoraSearch(baseUrl) {
+        this.baseUrl = baseUrl.replace(/\/?$/, '/');
+        this.meta = null;
+        this.termShards = {};
+        this.docShards = {};
+    }
+    
+    NexoraSearch.prototype.fetchJson = function (path) {
+        return fetch(this.baseUrl + path).then(response => {
+            if (!response.ok) throw new Error(path + ': HTTP ' + response.status);
+            return response.json();
+        });
+    };
+    
+    NexoraSearch.prototype.load = function () {
+        if (!this.metaPromise) {
+            this.metaPromise = this.fetchJson('meta.json').then(meta => {
+                this.meta = meta;
+                this.knownShards = new Set(meta.term_shards);
+                return meta;
+            });
+        }
+        return this.metaPromise;
+    };
+    
+    NexoraSearch.prototype.termShard = function (key) {
+        if (!this.knownShards.has(key)) return Promise.resolve(null);
+        if (!this.termShards[key]) this.termShards[key] = this.fetchJson('terms/' + key + '.json');
+        return this.termShards[key];
+    };
+    
+    NexoraSearch.prototype.docShard = function (number) {
+        if (!this.docShards[number]) this.docShards[number] = this.fetchJson('docs/' + number + '.json');
+        return this.docShards[number];
+    };
+    
+    // Map of doc ordinal -> weight for one token (every term it prefixes when prefix is true)
+    NexoraSearch.prototype.lookup = function (token, prefix) {
+        return this.termShard(shardName(token)).then(shard => {
+            const scores = new Map();
+            if (!shard) return scores;
+            for (let i = lowerBound(shard.terms, token); i < shard.terms.length; i++) {
+                const term = shard.terms[i];
+                if (prefix ? !term.startsWith(token) : term !== token) break;
+                const postings = shard.postings[i];
+                let doc = 0;
+                for (let j = 0; j < postings.length; j += 2) {
+                    doc += postings[j];
+                    scores.set(doc, Math.max(scores.get(doc) || 0, postings[j + 1]));
+                }
+            }
+            return scores;
+        });
+    };
+    
+    // Ranked doc ordinals matching every token (the last one as a prefix), or null for an empty query
+    NexoraSearch.prototype.search = function (query) {
+        const tokens = tokenize(query);
+        if (!tokens.length) return Promise.resolve(null);
+        return this.load()
+            .then(() => Promise.all(tokens.map((token, i) => this.lookup(token, i === tokens.length - 1))))
+            .then(maps => {
+                maps.sort((a, b) => a.size - b.size);
+                const results = [];
+                maps[0].forEach((score, doc) => {
+                    let total = score;
+                    for (let k = 1; k < maps.length; k++) {
+                        const other = maps[k].get(doc);
+                        if (other === undefined) return;
+                        total += other;
+                    }
+                    results.push([doc, total]);
+                });
+                // Highest score first, then newest (lower ordinal)
+                results.sort((a, b) => b[1] - a[1] || a[0] - b[0]);
+                return results.map(result => result[0]);
+            });
+    };
+    
+    // Video objects for newest-first ordinals, loading only the document shards needed
+    NexoraSearch.prototype.documents = function (ordinals) {
+        return this.load().then(meta => {
+            const perShard = meta.docs_per_shard;
+            const needed = Array.from(new Set(ordinals.map(ordinal => Math.floor(ordinal / perShard))));
+            return Promise.all(needed.map(number => this.docShard(number))).then(shards => {
+                const rowsByShard = new Map(needed.map((number, i) => [number, shards[i]]));
+                return ordinals.map(ordinal => {
+                    const row = rowsByShard.get(Math.floor(ordinal / perShard))[ordinal % perShard];
+                    const video = {};
+                    meta.doc_fields.forEach((field, i) => { video[field] = row[i]; });
+                    return video;
+                });
+            });
+        });
+    };
+    
+    NexoraSearch.tokenize = tokenize;
+    global.NexoraSearch = NexoraSearch;
+})(window);
+'''
+
 class EnhancedVideoSync:
     def __init__(self):
         """Initialize enhanced video sync system"""
@@ -109,6 +264,9 @@ class EnhancedVideoSync:
             with open('docs/video_catalog.json', 'w') as f:
                 json.dump(video_catalog, f, indent=2)
             
+            # Prebuilt search index so the page never has to inline the catalog
+            self.build_search_index(video_catalog)
+            
             # Create YouTube-like video player page
             self.create_video_player_page(video_catalog)
             
@@ -126,6 +284,82 @@ class EnhancedVideoSync:
         except Exception as e:
             print(f"❌ Video sync error: {e}")
     
+    def build_search_index(self, video_catalog):
+        """Write a sharded inverted index and document store for docs/videos.html
+        
+        Layout under docs/search_index/:
+          meta.json        - counts, field order and the list of term shards
+          docs/<n>.json    - newest-first document rows, DOCS_PER_SHARD per file
+          terms/<key>.json - sorted terms sharing their first two characters,
+                             each with delta-encoded [doc, weight] postings
+        The loader fetches only the term shards a query touches and binary-searches
+        the sorted term list for prefix matches.
+        """
+        postings = {}
+        for ordinal, video in enumerate(video_catalog):
+            weights = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(video.get(field)):
+                    weights[token] = weights.get(token, 0) + weight
+            for token, weight in weights.items():
+                postings.setdefault(token, []).append((ordinal, weight))
+        
+        shards = {}
+        for token in sorted(postings):
+            flat = []
+            previous = 0
+            for ordinal, weight in postings[token]:
+                flat.extend((ordinal - previous, weight))
+                previous = ordinal
+            shard = shards.setdefault(shard_name(token), {'terms': [], 'postings': []})
+            shard['terms'].append(token)
+            shard['postings'].append(flat)
+        
+        # Build beside the live index and swap, so readers never see a half-written set
+        build_dir = SEARCH_INDEX_DIR + '.tmp'
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.makedirs(os.path.join(build_dir, 'docs'))
+        os.makedirs(os.path.join(build_dir, 'terms'))
+        
+        doc_shards = 0
+        for start in range(0, len(video_catalog), DOCS_PER_SHARD):
+            rows = []
+            for video in video_catalog[start:start + DOCS_PER_SHARD]:
+                row = [video.get(field) for field in DOC_FIELDS]
+                row[DOC_FIELDS.index('description')] = (video.get('description') or '')[:DESCRIPTION_PREVIEW_CHARS]
+                row[DOC_FIELDS.index('upload_date')] = (video.get('upload_date') or '')[:10]
+                rows.append(row)
+            with open(os.path.join(build_dir, 'docs', f'{doc_shards}.json'), 'w', encoding='utf-8') as f:
+                json.dump(rows, f, ensure_ascii=False, separators=(',', ':'))
+            doc_shards += 1
+        
+        for key, shard in shards.items():
+            with open(os.path.join(build_dir, 'terms', f'{key}.json'), 'w', encoding='utf-8') as f:
+                json.dump(shard, f, ensure_ascii=False, separators=(',', ':'))
+        
+        meta = {
+            'version': SEARCH_INDEX_VERSION,
+            'generated_at': datetime.now().isoformat(),
+            'total_videos': len(video_catalog),
+            'total_categories': len(set(v['category'] for v in video_catalog)),
+            'docs_per_shard': DOCS_PER_SHARD,
+            'doc_shards': doc_shards,
+            'doc_fields': DOC_FIELDS,
+            'term_shards': sorted(shards),
+            'term_count': len(postings)
+        }
+        with open(os.path.join(build_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, separators=(',', ':'))
+        
+        shutil.rmtree(SEARCH_INDEX_DIR, ignore_errors=True)
+        os.replace(build_dir, SEARCH_INDEX_DIR)
+        
+        with open('docs/search_loader.js', 'w', encoding='utf-8') as f:
+            f.write(SEARCH_LOADER_JS)
+        
+        print(f"✅ Search index built: {len(postings)} terms in {len(shards)} shards")
+        return meta
+    
     def create_video_player_page(self, video_catalog):
         """Create YouTube-like video player page"""
         
@@ -275,6 +509,18 @@ class EnhancedVideoSync:
             margin-top: 0.5rem;
         }
         
+        .load-more {
+            display: block;
+            margin: 2rem auto 0;
+            padding: 0.8rem 2rem;
+            background: #667eea;
+            color: white;
+            border: none;
+            border-radius: 25px;
+            font-size: 1rem;
+            cursor: pointer;
+        }
+        
         .no-videos {
             text-align: center;
             padding: 3rem;
@@ -359,56 +605,77 @@ class EnhancedVideoSync:
         <div class="video-grid" id="video-grid">
 '''
         
-        # Add video cards
-        for video in video_catalog:
-            player_html += f'''
-            <div class="video-card" onclick="playVideo('{video['filename']}', '{video['title']}')">
-                <div class="video-thumbnail">
-                    🎥
-                    <div class="play-button">▶</div>
-                </div>
-                <div class="video-info">
-                    <div class="video-title">{video['title']}</div>
-                    <div class="video-meta">
-                        👨‍🏫 {video['teacher_name']} • 📅 {video['upload_date'][:10]}
-                    </div>
-                    <div class="video-description">{video.get('description', 'No description available')}</div>
-                    <div class="category-tag">{video['category']}</div>
-                </div>
-            </div>
-'''
-        
+        # Cards are rendered from the prebuilt search index, not inlined here
         player_html += '''
         </div>
         
+        <button class="load-more" id="load-more" style="display: none;">Load more videos</button>
+        
         <div class="no-videos" id="no-videos" style="display: none;">
             <h3>No videos found</h3>
             <p>Try adjusting your search terms</p>
         </div>
     </div>
     
+    <script src="search_loader.js"></script>
     <script>
-        // Search functionality
-        document.getElementById('search-input').addEventListener('input', function(e) {
-            const searchTerm = e.target.value.toLowerCase();
-            const videoCards = document.querySelectorAll('.video-card');
-            const noVideos = document.getElementById('no-videos');
-            let visibleCount = 0;
+        const searchIndex = new NexoraSearch('search_index/');
+        const PAGE_SIZE = 24;
+        let matches = null;  // Ranked ordinals for the current query; null shows the whole catalog
+        let shown = 0;
+        let generation = 0;  // Drops results of queries superseded while loading
+        
+        function createCard(video) {
+            const card = document.createElement('div');
+            card.className = 'video-card';
+            card.innerHTML = '<div class="video-thumbnail">🎥<div class="play-button">▶</div></div>' +
+                '<div class="video-info"><div class="video-title"></div><div class="video-meta"></div>' +
+                '<div class="video-description"></div><div class="category-tag"></div></div>';
+            card.querySelector('.video-title').textContent = video.title;
+            card.querySelector('.video-meta').textContent = `👨‍🏫 ${video.teacher_name} • 📅 ${video.upload_date}`;
+            card.querySelector('.video-description').textContent = video.description || 'No description available';
+            card.querySelector('.category-tag').textContent = video.category;
+            card.addEventListener('click', () => playVideo(video.filename, video.title));
+            return card;
+        }
+        
+        function showMore() {
+            const current = generation;
+            const total = matches ? matches.length : searchIndex.meta.total_videos;
+            const ordinals = [];
+            for (let i = shown; i < Math.min(shown + PAGE_SIZE, total); i++) {
+                ordinals.push(matches ? matches[i] : i);
+            }
+            const append = shown > 0;
+            shown += ordinals.length;
             
-            videoCards.forEach(card => {
-                const title = card.querySelector('.video-title').textContent.toLowerCase();
-                const teacher = card.querySelector('.video-meta').textContent.toLowerCase();
-                const category = card.querySelector('.category-tag').textContent.toLowerCase();
-                
-                if (title.includes(searchTerm) || teacher.includes(searchTerm) || category.includes(searchTerm)) {
-                    card.style.display = 'block';
-                    visibleCount++;
-                } else {
-                    card.style.display = 'none';
-                }
+            return searchIndex.documents(ordinals).then(videos => {
+                if (current !== generation) return;
+                const grid = document.getElementById('video-grid');
+                if (!append) grid.textContent = '';
+                videos.forEach(video => grid.appendChild(createCard(video)));
+                document.getElementById('total-videos').textContent = total;
+                document.getElementById('no-videos').style.display = total === 0 ? 'block' : 'none';
+                document.getElementById('load-more').style.display = shown < total ? 'block' : 'none';
             });
-            
-            noVideos.style.display = visibleCount === 0 ? 'block' : 'none';
+        }
+        
+        // Search functionality - only the index shards for the typed terms are fetched
+        document.getElementById('search-input').addEventListener('input', function(e) {
+            const current = ++generation;
+            searchIndex.search(e.target.value).then(results => {
+                if (current !== generation) return;
+                matches = results;
+                shown = 0;
+                return showMore();
+            }).catch(error => console.error('Search failed:', error));
+        });
+        
+        document.getElementById('load-more').addEventListener('click', showMore);
+        
+        searchIndex.load().then(showMore).catch(error => {
+            console.error('Could not load the video index:', error);
+            document.getElementById('no-videos').style.display = 'block';
         });
         
         // Play video function
@@ -421,12 +688,6 @@ class EnhancedVideoSync:
                 alert(`Video: ${title}\\n\\nTo watch this video, please:\\n1. Run the desktop application\\n2. Or access via local server\\n\\nFilename: ${filename}`);
             }
         }
-        
-        // Auto-refresh video count
-        setInterval(() => {
-            const visibleVideos = document.querySelectorAll('.video-card[style*="block"], .video-card:not([style*="none"])').length;
-            document.getElementById('total-videos').textContent = visibleVideos;
-        }, 1000);
     </script>
 </body>
 </html>'''
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Event Stream for B's Nexora Educational Platform
+In-process publish/subscribe behind the Server-Sent Events endpoint: chat
+messages, read receipts and ticket-answered notifications are published
+after their write commits and pushed to every open stream of the users
+they concern. Events are also forwarded to the optional chat gateway
+(chat_gateway.py) over a local socket
+"""
+
+import hashlib
+import hmac
+import json
+import queue
+import socket
+import threading
+import time
+from collections import deque
+
+HISTORY_PER_USER = 200      # events kept per user for Last-Event-ID replay
+BUFFER_PER_STREAM = 100     # undelivered events per connection before it is told to resync
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+
+# The chat gateway listens here for the event feed (see chat_gateway.py)
+GATEWAY_FEED_ADDRESS = ('127.0.0.1', 5011)
+
+def feed_token(secret):
+    """Token the app sends as the first feed line; derived from the session key both processes read"""
+    return hmac.new(secret.encode('utf-8'), b'chat-gateway-feed', hashlib.sha256).hexdigest()
+
+def format_sse(event_id, event_type, data):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+class Subscription:
+    """One open stream: a bounded buffer of events for a single user"""
+    
+    def __init__(self, user_id, size=BUFFER_PER_STREAM):
+        self.user_id = user_id
+        self.events = deque()
+        self.size = size
+        self.overflowed = False
+        self.condition = threading.Condition()
+    
+    def push(self, event):
+        with self.condition:
+            if len(self.events) >= self.size:
+                # A stalled reader loses its buffer; it reconnects and replays or resyncs
+                self.events.clear()
+                self.overflowed = True
+            else:
+                self.events.append(event)
+            self.condition.notify()
+    
+    def get(self, timeout):
+        """Buffered events, waiting up to `timeout` seconds; [] on timeout"""
+        with self.condition:
+            if not self.events and not self.overflowed:
+                self.condition.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            return events
+
+class EventBroker:
+    def __init__(self, history_per_user=HISTORY_PER_USER, buffer_per_stream=BUFFER_PER_STREAM,
+                 heartbeat_seconds=HEARTBEAT_SECONDS):
+        """Initialize an empty broker; event ids restart with each process"""
+        self.history_per_user = history_per_user
+        self.buffer_per_stream = buffer_per_stream
+        self.heartbeat_seconds = heartbeat_seconds
+        self.lock = threading.Lock()
+        # Event ids are '<boot>-<sequence>' so a client reconnecting after a
+        # restart is detected and told to resync instead of missing events
+        self.boot = format(int(time.time()), 'x')
+        self.sequence = 0
+        self.history = {}           # user id -> deque of (sequence, event type, data)
+        self.evicted = {}           # user id -> sequence of the newest event dropped from history
+        self.subscribers = {}       # user id -> set of Subscription
+        self.listeners = []         # callables(user_ids, event_id, event_type, data)
+        self.stats = {'published': 0, 'delivered': 0, 'replayed': 0, 'resyncs': 0, 'connections': 0}
+    
+    # === PUBLISH ===
+    
+    def publish(self, user_ids, event_type, data):
+        """Send one event to every open stream of `user_ids`; returns its event id"""
+        user_ids = {int(user_id) for user_id in user_ids if user_id is not None}
+        with self.lock:
+            self.sequence += 1
+            sequence = self.sequence
+            targets = []
+            for user_id in user_ids:
+                history = self.history.get(user_id)
+                if history is None:
+                    history = self.history[user_id] = deque(maxlen=self.history_per_user)
+                if len(history) == self.history_per_user:
+                    self.evicted[user_id] = history[0][0]
+                history.append((sequence, event_type, data))
+                targets.extend(self.subscribers.get(user_id, ()))
+            self.stats['published'] += 1
+            self.stats['delivered'] += len(targets)
+            listeners = list(self.listeners)
+        event_id = f'{self.boot}-{sequence}'
+        for subscription in targets:
+            subscription.push((event_id, event_type, data))
+        for listener in listeners:
+            try:
+                listener(user_ids, event_id, event_type, data)
+            except Exception as e:
+                print(f"WARNING: Event listener failed: {e}")
+        return event_id
+    
+    def add_listener(self, listener):
+        """Also hand every published event to `listener` (e.g. to forward it out of process)"""
+        with self.lock:
+            self.listeners.append(listener)
+    
+    # === SUBSCRIBE ===
+    
+    def _parse_event_id(self, last_event_id):
+        """Sequence number for an id from this boot, or None if unknown"""
+        boot, _, sequence = (last_event_id or '').partition('-')
+        if boot != self.boot or not sequence.isdigit():
+            return None
+        return int(sequence)
+    
+    def subscribe(self, user_id, last_event_id=None):
+        """Open a stream for user_id, replaying events after last_event_id
+
+        If those events are no longer in the history (or came from an earlier
+        process) the stream starts with a 'resync' event instead, telling the
+        client to reload through the regular endpoints.
+        """
+        user_id = int(user_id)
+        subscription = Subscription(user_id, self.buffer_per_stream)
+        with self.lock:
+            if last_event_id:
+                after = self._parse_event_id(last_event_id)
+                history = self.history.get(user_id, ())
+                if after is None or after < self.evicted.get(user_id, 0):
+                    subscription.push((None, 'resync', {'reason': 'history unavailable'}))
+                    self.stats['resyncs'] += 1
+                else:
+                    # Replay is not limited by the live buffer size
+                    missed = [(f'{self.boot}-{sequence}', event_type, data)
+                              for sequence, event_type, data in history if sequence > after]
+                    subscription.events.extend(missed)
+                    self.stats['replayed'] += len(missed)
+            self.subscribers.setdefault(user_id, set()).add(subscription)
+            self.stats['connections'] += 1
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.user_id]
+    
+    def stream(self, user_id, last_event_id=None):
+        """Generator of SSE text for one connection; ends when the buffer overflows"""
+        subscription = self.subscribe(user_id, last_event_id)
+        try:
+            yield f'retry: {RETRY_MILLISECONDS}\n\n'
+            while True:
+                events = subscription.get(self.heartbeat_seconds)
+                if subscription.overflowed:
+                    with self.lock:
+                        self.stats['resyncs'] += 1
+                    yield format_sse(None, 'resync', {'reason': 'buffer overflow'})
+                    return
+                if not events:
+                    yield ': heartbeat\n\n'
+                    continue
+                for event_id, event_type, data in events:
+                    yield format_sse(event_id, event_type, data)
+        finally:
+            self.unsubscribe(subscription)
+    
+    def get_status(self):
+        with self.lock:
+            return dict(self.stats, open_streams=sum(len(subscribers) for subscribers in self.subscribers.values()),
+                        users_online=len(self.subscribers))
+
+event_broker = EventBroker()
+
+class GatewayForwarder:
+    """Sends published events to the chat gateway as JSON lines
+
+    Events are dropped while no gateway is listening; its clients resync on
+    reconnect. publish() never blocks on the socket: events go through a
+    bounded queue drained by one background thread. Each connection opens
+    with {"token": feed_token(secret)} so the gateway accepts only this app.
+    """
+    
+    def __init__(self, address=GATEWAY_FEED_ADDRESS, queue_size=10000, retry_seconds=5):
+        self.address = address
+        self.retry_seconds = retry_seconds
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.connected = False
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.token = None
+        self.stats = {'forwarded': 0, 'dropped': 0, 'connects': 0}
+    
+    def send(self, user_ids, event_id, event_type, data):
+        """Broker listener: queue one event for the gateway"""
+        if not self.connected:
+            self.stats['dropped'] += 1
+            return
+        try:
+            self.queue.put_nowait({'user_ids': sorted(user_ids), 'id': event_id, 'event': event_type, 'data': data})
+        except queue.Full:
+            self.stats['dropped'] += 1
+    
+    def _pump(self, connection):
+        while not self.stop_event.is_set():
+            try:
+                event = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            lines = [event]
+            while len(lines) < 500:
+                try:
+                    lines.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            payload = ''.join(json.dumps(line, separators=(',', ':')) + '\n' for line in lines)
+            connection.sendall(payload.encode('utf-8'))
+            self.stats['forwarded'] += len(lines)
+    
+    def run_forever(self):
+        while not self.stop_event.is_set():
+            try:
+                with socket.create_connection(self.address, timeout=5) as connection:
+                    connection.settimeout(None)
+                    connection.sendall((json.dumps({'token': self.token}) + '\n').encode('utf-8'))
+                    self.connected = True
+                    self.stats['connects'] += 1
+                    self._pump(connection)
+            except OSError:
+                pass
+            finally:
+                self.connected = False
+            if self.stop_event.wait(self.retry_seconds):
+                return
+    
+    def start(self, secret):
+        """Connect to the gateway in the background, retrying while it is down (idempotent)"""
+        self.token = feed_token(secret)
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_forever, name='gateway-forwarder', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+    
+    def get_status(self):
+        return dict(self.stats, connected=self.connected, queued=self.queue.qsize())
+
+gateway_forwarder = GatewayForwarder()
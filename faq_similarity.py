@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+FAQ Similarity Engine for B's Nexora Educational Platform
+Keeps hashed word n-gram TF-IDF vectors of every answered question in NumPy
+arrays, suggests existing answers for new questions and groups pending
+near-duplicates so they can be answered together
+"""
+
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+# Unigrams and bigrams are hashed into this many buckets (power of two)
+HASH_BUCKETS = 1 << 18
+SUGGEST_MIN_SCORE = 0.5
+CLUSTER_MIN_SCORE = 0.6
+# Pending tickets considered for clustering, newest first
+MAX_CLUSTER_TICKETS = 5000
+# Features shared by more pending tickets than this carry no signal and are skipped when pairing
+MAX_FEATURE_GROUP = 200
+# Recent additions are scanned linearly until they are merged into the sorted arrays
+MAX_DELTA_ENTRIES = 20000
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset('''
+    a an and are be can do does for from have how i in is it me my of on or the
+    there this to what when where which why will with you your
+'''.split())
+
+def question_features(text):
+    """(bucket indices, sublinear tf) for the question's unigrams and bigrams"""
+    words = [word for word in TOKEN_PATTERN.findall((text or '').lower()) if word not in STOPWORDS]
+    grams = words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+    counts = {}
+    for gram in grams:
+        bucket = zlib.crc32(gram.encode('utf-8')) & (HASH_BUCKETS - 1)
+        counts[bucket] = counts.get(bucket, 0) + 1
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    tf = 1 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+    return indices, tf
+
+def public_answer(ticket_id, question, answer, student_name=None):
+    """The answer as it may be shown to other students, or None if it is tied to its ticket
+
+    Answers quoting the ticket number or the question are skipped; the
+    student's name (e.g. from a "Hi {student_name}" template) becomes "there".
+    """
+    if not answer or f'#{ticket_id}' in answer or (question and question.strip() in answer):
+        return None
+    if student_name and student_name.strip():
+        names = [student_name.strip()] + [part for part in student_name.split() if len(part) > 1]
+        for name in names:
+            answer = re.sub(r'\b' + re.escape(name) + r'\b', 'there', answer, flags=re.IGNORECASE)
+    return answer
+
+def concatenated_ranges(starts, ends):
+    """np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)]) without the loop"""
+    lengths = ends - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+def within_group_pairs(group_keys):
+    """Position pairs (i, j), i < j, of equal neighbours in a sorted key array"""
+    if len(group_keys) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate(([True], group_keys[1:] != group_keys[:-1])))
+    ends = np.append(starts[1:], len(group_keys))
+    group_end = np.repeat(ends, ends - starts)
+    partners = group_end - np.arange(len(group_keys)) - 1
+    left = np.repeat(np.arange(len(group_keys)), partners)
+    offsets = np.arange(partners.sum()) - np.repeat(np.cumsum(partners) - partners, partners)
+    return left, left + offsets + 1
+
+class FaqSimilarityIndex:
+    def __init__(self, db_path=DATABASE_PATH, rebuild_seconds=6 * 60 * 60):
+        """Initialize an empty index; build() or start() fills it
+
+        Answers are folded in one at a time as they are written; a periodic
+        rebuild re-weights every row with current document frequencies.
+        """
+        self.db_path = db_path
+        self.rebuild_seconds = rebuild_seconds
+        self.lock = threading.RLock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self._reset()
+        self.built_at = None
+        self.stats = {'builds': 0, 'added': 0, 'removed': 0, 'suggestions': 0}
+    
+    def _reset(self):
+        self.document_frequency = np.zeros(HASH_BUCKETS, dtype=np.int32) if NUMPY_AVAILABLE else None
+        self.documents = 0
+        self.row_tickets = []        # row -> ticket id
+        self.row_active = []         # row -> still answered
+        self.ticket_rows = {}        # ticket id -> row
+        self.entries = {}            # ticket id -> (question, answer safe to show other students or None)
+        self.active_mask = None
+        # Flattened sparse rows sorted by feature (an inverted index), plus unsorted recent additions
+        self.features = np.empty(0, dtype=np.int64) if NUMPY_AVAILABLE else None
+        self.weights = np.empty(0, dtype=np.float64) if NUMPY_AVAILABLE else None
+        self.rows = np.empty(0, dtype=np.int64) if NUMPY_AVAILABLE else None
+        self.chunks = []
+        self.delta = None
+        self.delta_entries = 0
+    
+    def _idf(self, indices):
+        return np.log((1 + self.documents) / (1 + self.document_frequency[indices])) + 1
+    
+    def _vector(self, question, features=None):
+        """L2-normalized TF-IDF weights for a question under the current frequencies"""
+        indices, tf = features if features is not None else question_features(question)
+        weights = tf * self._idf(indices)
+        norm = np.sqrt(np.dot(weights, weights))
+        return indices, (weights / norm if norm else weights)
+    
+    # === BUILD / UPDATE ===
+    
+    def build(self):
+        """Index every answered ticket from scratch"""
+        if not NUMPY_AVAILABLE:
+            return
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            rows = conn.execute('''
+                SELECT f.id, f.question, f.answer, u.full_name FROM student_faqs f
+                LEFT JOIN users u ON u.id = f.student_id
+                WHERE f.status IN ('answered', 'closed') AND f.answer IS NOT NULL AND f.answer != ''
+                ORDER BY f.id
+            ''').fetchall()
+        finally:
+            conn.close()
+        
+        features = [question_features(question) for _, question, _, _ in rows]
+        with self.lock:
+            self._reset()
+            if features:
+                np.add.at(self.document_frequency, np.concatenate([indices for indices, _ in features]), 1)
+            self.documents = len(rows)
+            for (ticket_id, question, answer, student_name), question_vector in zip(rows, features):
+                self._append(ticket_id, question, public_answer(ticket_id, question, answer, student_name),
+                             question_vector)
+            self._merge()
+            self.built_at = time.time()
+            self.stats['builds'] += 1
+        print(f"INFO: FAQ similarity index built from {len(rows)} answered questions")
+    
+    def _append(self, ticket_id, question, answer, features=None):
+        indices, weights = self._vector(question, features)
+        row = len(self.row_tickets)
+        self.row_tickets.append(ticket_id)
+        self.row_active.append(True)
+        self.active_mask = None
+        self.ticket_rows[ticket_id] = row
+        self.entries[ticket_id] = (question, answer)
+        self.chunks.append((indices, weights, np.full(len(indices), row, dtype=np.int64)))
+        self.delta = None
+        self.delta_entries += len(indices)
+    
+    def _merge(self):
+        """Fold recent additions into the feature-sorted arrays"""
+        if not self.chunks:
+            return
+        features = np.concatenate([self.features] + [chunk[0] for chunk in self.chunks])
+        order = np.argsort(features, kind='stable')
+        self.features = features[order]
+        self.weights = np.concatenate([self.weights] + [chunk[1] for chunk in self.chunks])[order]
+        self.rows = np.concatenate([self.rows] + [chunk[2] for chunk in self.chunks])[order]
+        self.chunks = []
+        self.delta = None
+        self.delta_entries = 0
+    
+    def _matches(self, indices, weights):
+        """(rows, weight products) for every stored entry sharing a feature with the sorted query"""
+        if self.delta_entries > max(MAX_DELTA_ENTRIES, len(self.features) // 10):
+            self._merge()
+        starts = np.searchsorted(self.features, indices, side='left')
+        ends = np.searchsorted(self.features, indices, side='right')
+        positions = concatenated_ranges(starts, ends)
+        rows = self.rows[positions]
+        products = self.weights[positions] * np.repeat(weights, ends - starts)
+        
+        if self.chunks:
+            if self.delta is None:
+                self.delta = tuple(np.concatenate([chunk[part] for chunk in self.chunks]) for part in range(3))
+            delta_features, delta_weights, delta_rows = self.delta
+            matched = np.isin(delta_features, indices)
+            query_positions = np.searchsorted(indices, delta_features[matched])
+            rows = np.concatenate((rows, delta_rows[matched]))
+            products = np.concatenate((products, delta_weights[matched] * weights[query_positions]))
+        return rows, products
+    
+    def add(self, ticket_id, question, answer, student_name=None):
+        """Index (or re-index) one answered ticket; student_name is stripped from suggestions"""
+        if not NUMPY_AVAILABLE or self.built_at is None:
+            return
+        with self.lock:
+            if ticket_id in self.ticket_rows:
+                self.row_active[self.ticket_rows.pop(ticket_id)] = False
+                self.active_mask = None
+            else:
+                np.add.at(self.document_frequency, question_features(question)[0], 1)
+                self.documents += 1
+            self._append(ticket_id, question, public_answer(ticket_id, question, answer, student_name))
+            self.stats['added'] += 1
+    
+    def remove(self, ticket_ids):
+        """Drop tickets that were reopened or deleted"""
+        if not NUMPY_AVAILABLE or self.built_at is None:
+            return
+        with self.lock:
+            for ticket_id in ticket_ids:
+                row = self.ticket_rows.pop(ticket_id, None)
+                if row is None:
+                    continue
+                self.row_active[row] = False
+                self.active_mask = None
+                question = self.entries.pop(ticket_id)[0]
+                np.subtract.at(self.document_frequency, question_features(question)[0], 1)
+                self.documents -= 1
+                self.stats['removed'] += 1
+    
+    # === QUERIES ===
+    
+    def suggest(self, question, limit=3, min_score=SUGGEST_MIN_SCORE):
+        """Answers to the questions most similar to `question`: [{'score', 'answer'}]
+
+        Only answer text is returned, never another student's question or
+        ticket id, and answers tied to their ticket are left out.
+        """
+        if not NUMPY_AVAILABLE or self.built_at is None:
+            return []
+        with self.lock:
+            indices, weights = self._vector(question)
+            if not len(indices) or not self.row_tickets:
+                return []
+            order = np.argsort(indices)
+            indices, weights = indices[order], weights[order]
+            
+            # Sparse dot product against the rows sharing at least one feature with the question
+            rows, products = self._matches(indices, weights)
+            candidates, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=products)
+            if self.active_mask is None:
+                self.active_mask = np.array(self.row_active, dtype=bool)
+            scores[~self.active_mask[candidates]] = 0
+            
+            self.stats['suggestions'] += 1
+            suggestions = []
+            seen_answers = set()
+            for position in np.argsort(-scores).tolist():
+                if scores[position] < min_score or len(suggestions) >= limit:
+                    break
+                answer = self.entries[self.row_tickets[candidates[position]]][1]
+                # Many tickets share one answer after a bulk reply; suggest each answer once
+                if answer is None or answer in seen_answers:
+                    continue
+                seen_answers.add(answer)
+                suggestions.append({'score': round(float(scores[position]), 4), 'answer': answer})
+            return suggestions
+    
+    def pending_clusters(self, min_score=CLUSTER_MIN_SCORE, limit=MAX_CLUSTER_TICKETS):
+        """Groups of near-duplicate pending tickets, largest first
+
+        Each cluster lists its ticket ids (oldest first), a representative
+        question and the best existing answer for it, if any.
+        """
+        if not NUMPY_AVAILABLE:
+            return []
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            tickets = conn.execute('''
+                SELECT id, question FROM student_faqs
+                WHERE status = 'pending'
+                ORDER BY created_at DESC
+                LIMIT ?
+            ''', (limit,)).fetchall()
+        finally:
+            conn.close()
+        if len(tickets) < 2:
+            return []
+        
+        with self.lock:
+            vectors = [self._vector(question) for _, question in tickets]
+        features = np.concatenate([indices for indices, _ in vectors])
+        weights = np.concatenate([values for _, values in vectors])
+        rows = np.repeat(np.arange(len(tickets)), [len(indices) for indices, _ in vectors])
+        
+        # Pairwise cosine similarity = sum over shared features of the weight products
+        order = np.lexsort((rows, features))
+        features, weights, rows = features[order], weights[order], rows[order]
+        _, group_sizes = np.unique(features, return_counts=True)
+        keep = np.repeat(group_sizes <= MAX_FEATURE_GROUP, group_sizes)
+        features, weights, rows = features[keep], weights[keep], rows[keep]
+        left, right = within_group_pairs(features)
+        if not len(left):
+            return []
+        codes, inverse = np.unique(rows[left] * len(tickets) + rows[right], return_inverse=True)
+        similarity = np.bincount(inverse, weights=weights[left] * weights[right])
+        similar = codes[similarity >= min_score]
+        
+        # Union-find over the similar pairs
+        parent = list(range(len(tickets)))
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+        for first, second in zip((similar // len(tickets)).tolist(), (similar % len(tickets)).tolist()):
+            parent[find(first)] = find(second)
+        
+        groups = {}
+        for position in range(len(tickets)):
+            groups.setdefault(find(position), []).append(position)
+        clusters = []
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=lambda position: tickets[position][0])
+            representative = tickets[members[0]][1]
+            suggestions = self.suggest(representative, limit=1)
+            clusters.append({
+                'ticket_ids': [tickets[position][0] for position in members],
+                'question': representative,
+                'size': len(members),
+                'suggested_answer': suggestions[0] if suggestions else None
+            })
+        clusters.sort(key=lambda cluster: -cluster['size'])
+        return clusters
+    
+    def get_status(self):
+        with self.lock:
+            return dict(self.stats,
+                        numpy_available=NUMPY_AVAILABLE,
+                        indexed=len(self.ticket_rows),
+                        built_at=self.built_at)
+    
+    # === SCHEDULER ===
+    
+    def run_forever(self):
+        while True:
+            try:
+                self.build()
+            except Exception as e:
+                print(f"WARNING: FAQ similarity build failed: {e}")
+            if self.stop_event.wait(self.rebuild_seconds):
+                return
+    
+    def start(self):
+        """Start the build/rebuild thread (idempotent; no-op without NumPy)"""
+        if not NUMPY_AVAILABLE:
+            print("WARNING: NumPy not available - duplicate question suggestions disabled")
+            return
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_forever, name='faq-similarity', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+
+faq_similarity = FaqSimilarityIndex()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Fragment Cache for B's Nexora Educational Platform
+In-process cache for rendered HTML blocks and the query results behind them,
+with explicit keys, per-entry TTLs and tag generations for invalidation
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Tags used by app.py; bump() one whenever the data behind it changes
+TAG_CATALOG = 'catalog'
+TAG_USERS = 'users'
+TAG_FAQS = 'faqs'
+
+class FragmentCache:
+    def __init__(self, max_entries=2000):
+        """Initialize an empty LRU cache holding at most max_entries fragments"""
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.metrics = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+    
+    def _full_key(self, key, tags):
+        # Tag generations are part of the key, so a bump orphans every dependent entry at once
+        return (key, tuple((tag, self.generations.get(tag, 0)) for tag in tags))
+    
+    def get_or_render(self, key, render, ttl=300, tags=()):
+        """Return the cached value for `key`, calling render() on a miss
+
+        `key` must be a hashable tuple naming everything the fragment varies
+        by (page, role, versions...). Entries expire after `ttl` seconds or when
+        any tag in `tags` is bumped.
+        """
+        now = time.monotonic()
+        with self.lock:
+            full_key = self._full_key(key, tags)
+            entry = self.entries.get(full_key)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(full_key)
+                self.metrics['hits'] += 1
+                return entry[0]
+            self.metrics['misses'] += 1
+        
+        # Render outside the lock; concurrent misses may render twice, which is harmless
+        value = render()
+        with self.lock:
+            self.entries[full_key] = (value, now + ttl)
+            self.entries.move_to_end(full_key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.metrics['evictions'] += 1
+        return value
+    
+    def bump(self, *tags):
+        """Invalidate every fragment that depends on any of the given tags"""
+        with self.lock:
+            for tag in tags:
+                self.generations[tag] = self.generations.get(tag, 0) + 1
+            self.metrics['invalidations'] += 1
+    
+    def invalidate(self, key_prefix):
+        """Drop entries whose key starts with `key_prefix` (e.g. ('dashboard',))"""
+        with self.lock:
+            stale = [full_key for full_key in self.entries
+                     if full_key[0][:len(key_prefix)] == key_prefix]
+            for full_key in stale:
+                del self.entries[full_key]
+            self.metrics['invalidations'] += 1
+            return len(stale)
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+    
+    def get_metrics(self):
+        with self.lock:
+            lookups = self.metrics['hits'] + self.metrics['misses']
+            return dict(self.metrics,
+                        entries=len(self.entries),
+                        hit_rate=round(self.metrics['hits'] / lookups * 100, 1) if lookups else 0.0)
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Media Garbage Collector for B's Nexora Educational Platform
+Mark-and-sweep cleanup of video files, publish copies and thumbnails that no
+longer belong to any row in the videos table
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+# Every directory the platform writes media into
+MEDIA_ROOTS = ['uploads', 'static/videos', 'docs/videos', 'docs/videos/thumbnails', 'local_video_cache']
+PUBLISH_DIRECTORIES = ['static/videos', 'docs/videos', 'local_video_cache']
+THUMBNAIL_DIRECTORY = 'docs/videos/thumbnails'
+
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv'}
+THUMBNAIL_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp'}
+
+def normalize_path(path):
+    return os.path.normcase(os.path.abspath(path))
+
+def is_within(path, root):
+    """True if the resolved path is root itself or inside it"""
+    path, root = os.path.realpath(path), os.path.realpath(root)
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+class MediaGarbageCollector:
+    def __init__(self, db_path=DATABASE_PATH, app_root='.', grace_seconds=24 * 60 * 60,
+                 interval_seconds=24 * 60 * 60):
+        """Initialize the collector; files younger than grace_seconds are never swept"""
+        self.db_path = db_path
+        self.app_root = app_root
+        self.grace_seconds = grace_seconds
+        self.interval_seconds = interval_seconds
+        # The scheduled sweep only reports unless start() is told to delete
+        self.delete_orphans = False
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_report = None
+    
+    def mark(self):
+        """Build the live set of absolute paths from the videos table"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT filename, file_path FROM videos')
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+        
+        live = set()
+        for filename, file_path in rows:
+            if file_path:
+                live.add(normalize_path(file_path))
+            if filename:
+                live.add(normalize_path(os.path.join('uploads', filename)))
+                for directory in PUBLISH_DIRECTORIES:
+                    live.add(normalize_path(os.path.join(directory, filename)))
+                for ext in THUMBNAIL_EXTENSIONS:
+                    live.add(normalize_path(os.path.join(THUMBNAIL_DIRECTORY, f"{filename}.{ext}")))
+        return live
+    
+    def candidate_files(self, roots=MEDIA_ROOTS):
+        """Media files directly inside each root (no recursion into unrelated trees)
+
+        Only the fixed media roots are swept, never directories taken from
+        videos.file_path, and a root that resolves outside the app root (e.g.
+        through a symlink) is skipped.
+        """
+        seen = set()
+        thumbnail_root = normalize_path(THUMBNAIL_DIRECTORY)
+        for root in roots:
+            if not os.path.isdir(root):
+                continue
+            if not is_within(root, self.app_root):
+                print(f"WARNING: Media GC skipped {root}: resolves outside {os.path.realpath(self.app_root)}")
+                continue
+            is_thumbnail_root = normalize_path(root) == thumbnail_root
+            allowed = THUMBNAIL_EXTENSIONS if is_thumbnail_root else VIDEO_EXTENSIONS
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    ext = entry.name.rsplit('.', 1)[-1].lower() if '.' in entry.name else ''
+                    if ext not in allowed:
+                        continue
+                    path = normalize_path(entry.path)
+                    if path in seen:
+                        continue
+                    seen.add(path)
+                    yield entry.path, path, entry.stat(follow_symlinks=False)
+    
+    def collect(self, dry_run=True):
+        """Mark live media from the database and sweep orphans; returns a report"""
+        started = time.time()
+        live = self.mark()
+        cutoff = time.time() - self.grace_seconds
+        
+        report = {
+            'dry_run': dry_run,
+            'live_files': len(live),
+            'scanned_files': 0,
+            'orphaned_files': [],
+            'skipped_grace_period': 0,
+            'reclaimed_bytes': 0,
+            'errors': []
+        }
+        
+        for display_path, path, stat in self.candidate_files():
+            report['scanned_files'] += 1
+            if path in live:
+                continue
+            if stat.st_mtime > cutoff:
+                # Possibly an upload whose row has not been committed yet
+                report['skipped_grace_period'] += 1
+                continue
+            try:
+                if not dry_run:
+                    os.remove(path)
+                report['orphaned_files'].append({'path': display_path, 'size_bytes': stat.st_size})
+                report['reclaimed_bytes'] += stat.st_size
+            except OSError as e:
+                report['errors'].append({'path': display_path, 'error': str(e)})
+        
+        report['duration_seconds'] = round(time.time() - started, 3)
+        self.last_report = report
+        
+        action = "Would reclaim" if dry_run else "Reclaimed"
+        print(f"INFO: Media GC {action} {report['reclaimed_bytes'] / 1024 / 1024:.1f} MB "
+              f"from {len(report['orphaned_files'])} orphaned files")
+        return report
+    
+    def run_forever(self):
+        while not self.stop_event.wait(self.interval_seconds):
+            try:
+                self.collect(dry_run=not self.delete_orphans)
+            except Exception as e:
+                print(f"WARNING: Media GC failed: {e}")
+    
+    def start(self, delete_orphans=False):
+        """Start the periodic sweep thread (idempotent); it is a dry run unless delete_orphans is set"""
+        self.delete_orphans = delete_orphans
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_forever, name='media-gc', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+
+media_gc = MediaGarbageCollector()
+
+def main():
+    """Run the collector from the command line (dry run unless --apply is given)"""
+    import sys
+    
+    dry_run = '--apply' not in sys.argv
+    print("B's Nexora Media Garbage Collector")
+    print("=" * 50)
+    report = media_gc.collect(dry_run=dry_run)
+    for orphan in report['orphaned_files']:
+        print(f"  - {orphan['path']} ({orphan['size_bytes'] / 1024 / 1024:.1f} MB)")
+    print(f"Scanned files:  {report['scanned_files']}")
+    print(f"Orphaned files: {len(report['orphaned_files'])}")
+    print(f"In grace period: {report['skipped_grace_period']}")
+    print(f"{'Reclaimable' if dry_run else 'Reclaimed'}: {report['reclaimed_bytes'] / 1024 / 1024:.1f} MB")
+    if dry_run:
+        print("Dry run only - re-run with --apply to delete orphaned files")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Media Integrity Scrubber for B's Nexora Educational Platform
+Walks every video row and its published copies in the background and verifies
+that each file still exists with the expected size and checksum
+"""
+
+import os
+import hashlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+# Publish locations written by EnhancedVideoSync next to the original upload
+PUBLISH_DIRECTORIES = ['static/videos', 'docs/videos']
+
+STATUS_OK = 'ok'
+STATUS_MISSING = 'missing'
+STATUS_SIZE_MISMATCH = 'size_mismatch'
+STATUS_CHECKSUM_MISMATCH = 'checksum_mismatch'
+STATUS_ERROR = 'error'
+
+class IORateLimiter:
+    """Token bucket shared by all scrubber threads to cap disk read throughput"""
+    
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.tokens = float(bytes_per_second)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def consume(self, amount):
+        """Block until `amount` bytes may be read"""
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= amount or self.tokens >= self.rate:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+class MediaIntegrityScrubber:
+    def __init__(self, db_path=DATABASE_PATH, workers=4, bytes_per_second=32 * 1024 * 1024,
+                 batch_size=50, interval_seconds=6 * 60 * 60, chunk_size=1024 * 1024):
+        """Initialize the scrubber; results land in the integrity_checks table"""
+        self.db_path = db_path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.chunk_size = chunk_size
+        self.rate_limiter = IORateLimiter(bytes_per_second)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.running = False
+    
+    def ensure_schema(self, cursor):
+        """Create the integrity tables (called from init_database)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS integrity_checks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                video_id INTEGER NOT NULL,
+                file_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                size_bytes INTEGER,
+                expected_size INTEGER,
+                checksum TEXT,
+                expected_checksum TEXT,
+                error TEXT,
+                first_checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (video_id) REFERENCES videos (id),
+                UNIQUE(video_id, file_path)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_integrity_checks_status ON integrity_checks (status, checked_at)')
+        
+        # Single-row cursor so a restarted scrubber resumes mid-pass
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS integrity_scrub_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                last_video_id INTEGER DEFAULT 0,
+                pass_started_at TIMESTAMP,
+                pass_completed_at TIMESTAMP
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO integrity_scrub_state (id, last_video_id) VALUES (1, 0)')
+    
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        self.ensure_schema(conn.cursor())
+        return conn
+    
+    def targets_for_video(self, filename, file_path, known_paths=()):
+        """Original upload plus its published copies: those that exist, and
+        those in known_paths (already baselined) so a vanished copy shows up as missing"""
+        targets = [file_path]
+        for directory in PUBLISH_DIRECTORIES:
+            copy_path = os.path.join(directory, filename)
+            if os.path.normpath(copy_path) == os.path.normpath(file_path):
+                continue
+            if copy_path in known_paths or os.path.exists(copy_path):
+                targets.append(copy_path)
+        return targets
+    
+    def hash_file(self, path):
+        """SHA-256 of a file, reading through the shared rate limiter"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while True:
+                self.rate_limiter.consume(self.chunk_size)
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def check_file(self, video_id, path, baseline):
+        """Verify one file against its recorded baseline (size, checksum)"""
+        expected_size, expected_checksum = baseline or (None, None)
+        result = {
+            'video_id': video_id,
+            'file_path': path,
+            'status': STATUS_OK,
+            'size_bytes': None,
+            'checksum': None,
+            'expected_size': expected_size,
+            'expected_checksum': expected_checksum,
+            'error': None
+        }
+        try:
+            if not os.path.exists(path):
+                result['status'] = STATUS_MISSING
+                return result
+            
+            size = os.path.getsize(path)
+            result['size_bytes'] = size
+            if expected_size is not None and size != expected_size:
+                # No point hashing a file that is already known to be truncated
+                result['status'] = STATUS_SIZE_MISMATCH
+                return result
+            
+            checksum = self.hash_file(path)
+            result['checksum'] = checksum
+            if expected_checksum and checksum != expected_checksum:
+                result['status'] = STATUS_CHECKSUM_MISMATCH
+            elif expected_size is None:
+                # First sighting establishes the baseline
+                result['expected_size'] = size
+                result['expected_checksum'] = checksum
+        except Exception as e:
+            result['status'] = STATUS_ERROR
+            result['error'] = str(e)
+        return result
+    
+    def record_results(self, cursor, results):
+        cursor.executemany('''
+            INSERT INTO integrity_checks (video_id, file_path, status, size_bytes, expected_size,
+                                          checksum, expected_checksum, error, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(video_id, file_path) DO UPDATE SET
+                status = excluded.status,
+                size_bytes = excluded.size_bytes,
+                expected_size = COALESCE(integrity_checks.expected_size, excluded.expected_size),
+                checksum = excluded.checksum,
+                expected_checksum = COALESCE(integrity_checks.expected_checksum, excluded.expected_checksum),
+                error = excluded.error,
+                checked_at = CURRENT_TIMESTAMP
+        ''', [(r['video_id'], r['file_path'], r['status'], r['size_bytes'], r['expected_size'],
+               r['checksum'], r['expected_checksum'], r['error']) for r in results])
+    
+    def scrub_batch(self, conn, executor, after_id):
+        """Check the next batch of videos after `after_id`; returns the last id seen"""
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, filename, file_path FROM videos
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (after_id, self.batch_size))
+        videos = cursor.fetchall()
+        if not videos:
+            return None
+        
+        video_ids = [video[0] for video in videos]
+        cursor.execute(f'''
+            SELECT video_id, file_path, expected_size, expected_checksum
+            FROM integrity_checks
+            WHERE video_id IN ({",".join("?" * len(video_ids))})
+        ''', video_ids)
+        baselines = {(row[0], row[1]): (row[2], row[3]) for row in cursor.fetchall()}
+        known_paths = {}
+        for video_id, path in baselines:
+            known_paths.setdefault(video_id, set()).add(path)
+        
+        futures = []
+        for video_id, filename, file_path in videos:
+            for path in self.targets_for_video(filename, file_path, known_paths.get(video_id, ())):
+                futures.append(executor.submit(self.check_file, video_id, path, baselines.get((video_id, path))))
+        results = [future.result() for future in futures]
+        
+        self.record_results(cursor, results)
+        cursor.execute('UPDATE integrity_scrub_state SET last_video_id = ? WHERE id = 1', (video_ids[-1],))
+        conn.commit()
+        
+        failures = [r for r in results if r['status'] != STATUS_OK]
+        for failure in failures:
+            print(f"WARNING: Integrity check {failure['status']} for video {failure['video_id']}: {failure['file_path']}")
+        return video_ids[-1]
+    
+    def run_pass(self):
+        """Run (or resume) one full pass over the video table"""
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT last_video_id FROM integrity_scrub_state WHERE id = 1')
+            last_video_id = cursor.fetchone()[0]
+            if last_video_id:
+                print(f"INFO: Resuming media integrity scrub after video {last_video_id}")
+            else:
+                cursor.execute('UPDATE integrity_scrub_state SET pass_started_at = ? WHERE id = 1', (datetime.now(),))
+                conn.commit()
+            
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                while not self.stop_event.is_set():
+                    next_id = self.scrub_batch(conn, executor, last_video_id)
+                    if next_id is None:
+                        break
+                    last_video_id = next_id
+            
+            if not self.stop_event.is_set():
+                # Rows for videos that no longer exist are not failures worth reporting
+                cursor.execute('DELETE FROM integrity_checks WHERE video_id NOT IN (SELECT id FROM videos)')
+                cursor.execute('''
+                    UPDATE integrity_scrub_state
+                    SET last_video_id = 0, pass_completed_at = ?
+                    WHERE id = 1
+                ''', (datetime.now(),))
+                conn.commit()
+                print("SUCCESS: Media integrity scrub pass completed")
+        finally:
+            conn.close()
+    
+    def run_forever(self):
+        self.running = True
+        while not self.stop_event.is_set():
+            try:
+                self.run_pass()
+            except Exception as e:
+                print(f"WARNING: Media integrity scrub failed: {e}")
+            self.stop_event.wait(self.interval_seconds)
+        self.running = False
+    
+    def start(self):
+        """Start the background scrubber thread (idempotent)"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_forever, name='media-integrity-scrubber', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+    
+    def get_summary(self, failure_limit=20, recent_seconds=None):
+        """Status counts and most recent failures for the CTO monitoring page
+
+        Read-only. failed_files counts only failures confirmed within
+        recent_seconds (default two scrub intervals, at least a day); each pass
+        re-checks an unresolved file, so older failing rows are files the
+        scrubber no longer visits and are reported separately as stale.
+        """
+        if recent_seconds is None:
+            recent_seconds = max(2 * self.interval_seconds, 24 * 60 * 60)
+        conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, timeout=30)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT status, COUNT(*), SUM(status != ? AND checked_at >= datetime('now', ?))
+                FROM integrity_checks
+                GROUP BY status
+            ''', (STATUS_OK, f'-{int(recent_seconds)} seconds'))
+            rows = cursor.fetchall()
+            cursor.execute('''
+                SELECT i.video_id, v.title, i.file_path, i.status, i.error, i.checked_at
+                FROM integrity_checks i
+                LEFT JOIN videos v ON v.id = i.video_id
+                WHERE i.status != ?
+                ORDER BY i.checked_at DESC
+                LIMIT ?
+            ''', (STATUS_OK, failure_limit))
+            failures = cursor.fetchall()
+            cursor.execute('SELECT last_video_id, pass_started_at, pass_completed_at FROM integrity_scrub_state WHERE id = 1')
+            state = cursor.fetchone()
+        finally:
+            conn.close()
+        
+        counts = {status: count for status, count, _ in rows}
+        failed = sum(count for status, count in counts.items() if status != STATUS_OK)
+        recent_failed = sum(recent or 0 for _, _, recent in rows)
+        return {
+            'checked_files': sum(counts.values()),
+            'healthy_files': counts.get(STATUS_OK, 0),
+            'failed_files': recent_failed,
+            'stale_failures': failed - recent_failed,
+            'status_counts': counts,
+            'recent_failures': failures,
+            'resume_after_video_id': state[0] if state else 0,
+            'pass_started_at': state[1] if state else None,
+            'pass_completed_at': state[2] if state else None,
+            'running': self.running
+        }
+
+integrity_scrubber = MediaIntegrityScrubber()
+
+def main():
+    """Run a single scrub pass from the command line"""
+    print("B's Nexora Media Integrity Scrubber")
+    print("=" * 50)
+    integrity_scrubber.run_pass()
+    summary = integrity_scrubber.get_summary()
+    print(f"Checked files: {summary['checked_files']}")
+    print(f"Healthy files: {summary['healthy_files']}")
+    print(f"Failed files:  {summary['failed_files']} ({summary['stale_failures']} older failures not re-checked)")
+    for video_id, title, file_path, status, error, checked_at in summary['recent_failures']:
+        print(f"  - [{status}] video {video_id} ({title}): {file_path} {error or ''}")
+
+if __name__ == "__main__":
+    main()
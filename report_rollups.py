@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Report Rollups for B's Nexora Educational Platform
+Daily aggregates (new users by role, uploads by category, activity by action,
+tickets created and resolved) maintained incrementally behind id watermarks
+by a background thread, so report pages only read a few dozen rows and never
+write or group whole tables
+"""
+
+import sqlite3
+import threading
+import time
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+# Append-only sources: rows are folded in once, in id order, behind a watermark
+INCREMENTAL_METRICS = {
+    'new_users': {'table': 'users', 'time': 'created_date', 'dimension': 'role'},
+    'uploads': {'table': 'videos', 'time': 'upload_date', 'dimension': 'course_category'},
+    'activity': {'table': 'system_logs', 'time': 'timestamp', 'dimension': 'action'},
+    'tickets_created': {'table': 'student_faqs', 'time': 'created_at', 'dimension': 'category'}
+}
+
+# Sources whose rows change after insert: the most recent days are recomputed on every run
+RECOMPUTED_METRICS = {
+    'tickets_resolved': {'table': 'student_faqs', 'time': 'answered_at', 'dimension': 'category',
+                         'where': "status IN ('answered', 'closed')"}
+}
+RECOMPUTE_DAYS = 2
+
+ALL_METRICS = dict(INCREMENTAL_METRICS, **RECOMPUTED_METRICS)
+
+def watermark_name(metric):
+    return f'report:{metric}'
+
+class ReportRollups:
+    def __init__(self, db_path=DATABASE_PATH, interval_seconds=60, check_days=35,
+                 check_interval_seconds=24 * 60 * 60, full_check_interval_seconds=7 * 24 * 60 * 60):
+        """Initialize the rollup job; call backfill() once for an existing database
+
+        Reports lag the source tables by at most interval_seconds. The last
+        check_days days are verified daily; all of history (and so the
+        all-time totals) every full_check_interval_seconds.
+        """
+        self.db_path = db_path
+        self.interval_seconds = interval_seconds
+        self.check_days = check_days
+        self.check_interval_seconds = check_interval_seconds
+        self.full_check_interval_seconds = full_check_interval_seconds
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_run = 0
+        self.last_check = None
+    
+    def ensure_schema(self, cursor):
+        """Create the rollup tables and the source indexes they rely on (called from init_database)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                metric TEXT NOT NULL,
+                day DATE NOT NULL,
+                dimension TEXT NOT NULL DEFAULT '',
+                value INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (metric, day, dimension)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Date range scans for recomputation and the consistency check (videos already has one)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_created_date ON users (created_date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_system_logs_timestamp ON system_logs (timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_faqs_created_at ON student_faqs (created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_faqs_answered_at ON student_faqs (answered_at)')
+        
+        # A fresh rollup table on a populated database needs a full backfill
+        cursor.execute('SELECT COUNT(*) FROM rollup_watermarks WHERE name LIKE ?', ('report:%',))
+        if cursor.fetchone()[0] < len(INCREMENTAL_METRICS):
+            self.backfill(cursor)
+    
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+    
+    def _set_watermark(self, cursor, metric, last_id):
+        cursor.execute('''
+            INSERT INTO rollup_watermarks (name, last_id, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at
+        ''', (watermark_name(metric), last_id))
+    
+    def _get_watermark(self, cursor, metric):
+        cursor.execute('SELECT last_id FROM rollup_watermarks WHERE name = ?', (watermark_name(metric),))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    
+    def _grouped_source(self, source, where, params=()):
+        """SELECT day, dimension, count over one source, restricted by `where`"""
+        conditions = [f"DATE({source['time']}) IS NOT NULL", where]
+        if source.get('where'):
+            conditions.append(source['where'])
+        return (f"SELECT DATE({source['time']}), COALESCE({source['dimension']}, ''), COUNT(*) "
+                f"FROM {source['table']} WHERE {' AND '.join(conditions)} GROUP BY 1, 2"), params
+    
+    # === MAINTENANCE ===
+    
+    def catch_up(self, cursor):
+        """Fold rows past each watermark into the rollups and recompute recent resolved tickets"""
+        for metric, source in INCREMENTAL_METRICS.items():
+            watermark = self._get_watermark(cursor, metric)
+            cursor.execute(f"SELECT MAX(id) FROM {source['table']}")
+            high = cursor.fetchone()[0] or 0
+            if high <= watermark:
+                continue
+            # Rowid range scan bounded by the snapshot of MAX(id)
+            sql, params = self._grouped_source(source, 'id > ? AND id <= ?', (watermark, high))
+            cursor.execute(f'''
+                INSERT INTO daily_rollups (metric, day, dimension, value)
+                SELECT ?, * FROM ({sql}) WHERE true
+                ON CONFLICT (metric, day, dimension) DO UPDATE SET value = value + excluded.value
+            ''', (metric,) + params)
+            self._set_watermark(cursor, metric, high)
+        
+        for metric, source in RECOMPUTED_METRICS.items():
+            self._recompute(cursor, metric, source, f'-{RECOMPUTE_DAYS - 1} days')
+    
+    def _recompute(self, cursor, metric, source, offset):
+        since_sql = "DATE('now', ?)"
+        cursor.execute(f'DELETE FROM daily_rollups WHERE metric = ? AND day >= {since_sql}', (metric, offset))
+        sql, params = self._grouped_source(source, f"{source['time']} >= {since_sql}", (offset,))
+        cursor.execute(f'INSERT INTO daily_rollups (metric, day, dimension, value) SELECT ?, * FROM ({sql})',
+                       (metric,) + params)
+    
+    def backfill(self, cursor):
+        """Rebuild every rollup from scratch and reset the watermarks"""
+        cursor.execute('DELETE FROM daily_rollups')
+        for metric, source in INCREMENTAL_METRICS.items():
+            cursor.execute(f"SELECT MAX(id) FROM {source['table']}")
+            high = cursor.fetchone()[0] or 0
+            sql, params = self._grouped_source(source, 'id <= ?', (high,))
+            cursor.execute(f'INSERT INTO daily_rollups (metric, day, dimension, value) SELECT ?, * FROM ({sql})',
+                           (metric,) + params)
+            self._set_watermark(cursor, metric, high)
+        for metric, source in RECOMPUTED_METRICS.items():
+            sql, params = self._grouped_source(source, '1 = 1')
+            cursor.execute(f'INSERT INTO daily_rollups (metric, day, dimension, value) SELECT ?, * FROM ({sql})',
+                           (metric,) + params)
+        print("SUCCESS: Report rollups backfilled")
+    
+    def check(self, days=None, repair=False, all_time=False):
+        """Compare the last `days` days (or, with all_time, every day) of every rollup with its sources
+
+        Returns a list of mismatches (metric, day, dimension, expected, actual).
+        Deleted or edited source rows show up here; repair=True rewrites them.
+        """
+        days = None if all_time else (days or self.check_days)
+        # The window as (source condition, rollup condition, params); all of history when days is None
+        if days:
+            window = ("{time} >= DATE('now', ?)", "day >= DATE('now', ?)", (f'-{days - 1} days',))
+        else:
+            window = ('1 = 1', '1 = 1', ())
+        mismatches = []
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            for metric, source in ALL_METRICS.items():
+                where = window[0].format(time=source['time'])
+                params = window[2]
+                if metric in INCREMENTAL_METRICS:
+                    # Rows past the watermark are not expected in the rollup yet
+                    where += ' AND id <= ?'
+                    params += (self._get_watermark(cursor, metric),)
+                sql, params = self._grouped_source(source, where, params)
+                cursor.execute(sql, params)
+                expected = {(day, dimension): count for day, dimension, count in cursor.fetchall()}
+                
+                cursor.execute(f'''
+                    SELECT day, dimension, value FROM daily_rollups
+                    WHERE metric = ? AND {window[1]}
+                ''', (metric,) + window[2])
+                actual = {(day, dimension): value for day, dimension, value in cursor.fetchall()}
+                
+                for key in sorted(set(expected) | set(actual)):
+                    if expected.get(key, 0) != actual.get(key, 0):
+                        mismatches.append((metric, key[0], key[1], expected.get(key, 0), actual.get(key, 0)))
+            
+            if repair and mismatches:
+                for metric, day, dimension, expected_value, _ in mismatches:
+                    if expected_value:
+                        cursor.execute('''
+                            INSERT INTO daily_rollups (metric, day, dimension, value) VALUES (?, ?, ?, ?)
+                            ON CONFLICT (metric, day, dimension) DO UPDATE SET value = excluded.value
+                        ''', (metric, day, dimension, expected_value))
+                    else:
+                        cursor.execute('DELETE FROM daily_rollups WHERE metric = ? AND day = ? AND dimension = ?',
+                                       (metric, day, dimension))
+                conn.commit()
+        finally:
+            conn.close()
+        
+        self.last_check = {'checked_at': time.time(), 'days': days,
+                           'mismatches': len(mismatches), 'repaired': repair}
+        if mismatches:
+            print(f"WARNING: Report rollups had {len(mismatches)} mismatched rows"
+                  + (" (repaired)" if repair else ""))
+        return mismatches
+    
+    def run_once(self):
+        with self.lock:
+            conn = self.connect()
+            try:
+                self.catch_up(conn.cursor())
+                conn.commit()
+            finally:
+                conn.close()
+            self.last_run = time.time()
+    
+    # === READS ===
+    
+    def daily(self, metric, days, dimension=None):
+        """[(day, total)] for the last `days` days, newest first"""
+        conn = self.connect()
+        try:
+            sql = "SELECT day, SUM(value) FROM daily_rollups WHERE metric = ? AND day >= DATE('now', ?)"
+            params = [metric, f'-{days} days']
+            if dimension is not None:
+                sql += ' AND dimension = ?'
+                params.append(dimension)
+            return conn.execute(sql + ' GROUP BY day ORDER BY day DESC', params).fetchall()
+        finally:
+            conn.close()
+    
+    def totals(self, metric, days=None):
+        """[(dimension, total)] over the last `days` days, or all time"""
+        conn = self.connect()
+        try:
+            sql = 'SELECT dimension, SUM(value) FROM daily_rollups WHERE metric = ?'
+            params = [metric]
+            if days is not None:
+                sql += " AND day >= DATE('now', ?)"
+                params.append(f'-{days} days')
+            return conn.execute(sql + ' GROUP BY dimension ORDER BY dimension', params).fetchall()
+        finally:
+            conn.close()
+    
+    # === SCHEDULER ===
+    
+    def run_forever(self):
+        last_check = last_full_check = time.time()
+        while True:
+            try:
+                self.run_once()
+                if time.time() - last_full_check > self.full_check_interval_seconds:
+                    # Also covers the recent window; all-time totals are sums over every day
+                    self.check(repair=True, all_time=True)
+                    last_full_check = last_check = time.time()
+                elif time.time() - last_check > self.check_interval_seconds:
+                    self.check(repair=True)
+                    last_check = time.time()
+            except Exception as e:
+                print(f"WARNING: Report rollup run failed: {e}")
+            if self.stop_event.wait(self.interval_seconds):
+                return
+    
+    def start(self):
+        """Start the periodic rollup thread (idempotent)"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_forever, name='report-rollups', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+
+report_rollups = ReportRollups()
+
+def main():
+    """Backfill or verify the rollups from the command line (--backfill, --check, --all, --repair)"""
+    import sys
+    
+    print("B's Nexora Report Rollups")
+    print("=" * 50)
+    if '--backfill' in sys.argv:
+        conn = report_rollups.connect()
+        try:
+            report_rollups.ensure_schema(conn.cursor())
+            report_rollups.backfill(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+    mismatches = report_rollups.check(repair='--repair' in sys.argv, all_time='--all' in sys.argv)
+    for metric, day, dimension, expected, actual in mismatches:
+        print(f"  - {metric} {day} [{dimension or '-'}]: expected {expected}, rollup has {actual}")
+    print(f"Mismatched rows: {len(mismatches)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Full-Text Search Indexes for B's Nexora Educational Platform
+SQLite FTS5 tables kept in sync by triggers, with BM25 ranking, prefix
+matching and highlighted snippets
+"""
+
+import re
+import html
+import json
+import base64
+import sqlite3
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+# Private-use markers survive HTML escaping and are swapped for <mark> tags afterwards
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+MAX_QUERY_TERMS = 8
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query where every term must match as a prefix
+
+    Terms are quoted so user input can never inject FTS5 operators.
+    Returns None when the text has no searchable terms.
+    """
+    terms = TOKEN_PATTERN.findall(text or '')[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"*' for term in terms]
+    return ' '.join(quoted)
+
+def encode_cursor(values):
+    """Opaque keyset cursor for a list of sort-key values"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor_value, size):
+    """Inverse of encode_cursor; raises ValueError unless it holds `size` values"""
+    try:
+        padded = cursor_value + '=' * (-len(cursor_value) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid pagination cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid pagination cursor')
+    return values
+
+def render_highlight(text):
+    """HTML-escape an FTS5 highlight()/snippet() result and mark the matches"""
+    if text is None:
+        return None
+    escaped = html.escape(text)
+    return escaped.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+
+class VideoSearchIndex:
+    def __init__(self, db_path=DATABASE_PATH):
+        """Initialize the video search index (videos_fts)"""
+        self.db_path = db_path
+    
+    def ensure_schema(self, cursor):
+        """Create videos_fts and its sync triggers, backfilling if out of step"""
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+                title, description, subject, category, teacher_name,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS videos_fts_insert AFTER INSERT ON videos BEGIN
+                INSERT INTO videos_fts (rowid, title, description, subject, category, teacher_name)
+                VALUES (new.id, new.title, new.description, new.subject, new.course_category,
+                        (SELECT full_name FROM users WHERE id = new.uploaded_by));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS videos_fts_delete AFTER DELETE ON videos BEGIN
+                DELETE FROM videos_fts WHERE rowid = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS videos_fts_update
+            AFTER UPDATE OF title, description, subject, course_category, uploaded_by ON videos BEGIN
+                DELETE FROM videos_fts WHERE rowid = old.id;
+                INSERT INTO videos_fts (rowid, title, description, subject, category, teacher_name)
+                VALUES (new.id, new.title, new.description, new.subject, new.course_category,
+                        (SELECT full_name FROM users WHERE id = new.uploaded_by));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS videos_fts_teacher_name
+            AFTER UPDATE OF full_name ON users BEGIN
+                UPDATE videos_fts SET teacher_name = new.full_name
+                WHERE rowid IN (SELECT id FROM videos WHERE uploaded_by = new.id);
+            END
+        ''')
+        
+        cursor.execute('SELECT COUNT(*) FROM videos_fts')
+        indexed = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM videos')
+        if indexed != cursor.fetchone()[0]:
+            self.rebuild(cursor)
+    
+    def rebuild(self, cursor):
+        """Re-index every video (used for existing databases and repairs)"""
+        cursor.execute('DELETE FROM videos_fts')
+        cursor.execute('''
+            INSERT INTO videos_fts (rowid, title, description, subject, category, teacher_name)
+            SELECT v.id, v.title, v.description, v.subject, v.course_category, u.full_name
+            FROM videos v
+            LEFT JOIN users u ON u.id = v.uploaded_by
+        ''')
+        print("SUCCESS: Video search index rebuilt")
+    
+    def search(self, text, include_inactive=False, limit=20, offset=0):
+        """Ranked search; returns (results, has_more)
+
+        Column weights favour title, then teacher, subject and category over
+        the description.
+        """
+        match_query = build_match_query(text)
+        if not match_query:
+            return [], False
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT v.id, v.title, v.subject, v.course_category, v.upload_date, v.filename,
+                       v.is_active, u.full_name,
+                       highlight(videos_fts, 0, ?, ?) AS title_highlight,
+                       snippet(videos_fts, 1, ?, ?, '...', 24) AS description_snippet,
+                       bm25(videos_fts, 10.0, 2.0, 4.0, 3.0, 5.0) AS score
+                FROM videos_fts
+                JOIN videos v ON v.id = videos_fts.rowid
+                JOIN users u ON u.id = v.uploaded_by
+                WHERE videos_fts MATCH ?
+                {'' if include_inactive else 'AND v.is_active = 1'}
+                ORDER BY score, v.id DESC
+                LIMIT ? OFFSET ?
+            ''', (HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END,
+                  match_query, limit + 1, offset))
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+        
+        has_more = len(rows) > limit
+        results = [{
+            'id': row[0],
+            'title': row[1],
+            'subject': row[2],
+            'course_category': row[3],
+            'upload_date': row[4],
+            'filename': row[5],
+            'is_active': row[6],
+            'teacher_name': row[7],
+            'title_highlight': render_highlight(row[8]),
+            'description_snippet': render_highlight(row[9]),
+            'score': round(-row[10], 4),
+            'streaming_url': f"/stream_video/{row[0]}"
+        } for row in rows[:limit]]
+        return results, has_more
+
+video_search_index = VideoSearchIndex()
+
+class TicketSearchIndex:
+    def __init__(self, db_path=DATABASE_PATH):
+        """Initialize the support ticket search index (tickets_fts)"""
+        self.db_path = db_path
+    
+    def ensure_schema(self, cursor):
+        """Create tickets_fts and its sync triggers, backfilling if out of step"""
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+                question, answer, student_name,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tickets_fts_insert AFTER INSERT ON student_faqs BEGIN
+                INSERT INTO tickets_fts (rowid, question, answer, student_name)
+                VALUES (new.id, new.question, new.answer,
+                        (SELECT full_name FROM users WHERE id = new.student_id));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tickets_fts_delete AFTER DELETE ON student_faqs BEGIN
+                DELETE FROM tickets_fts WHERE rowid = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tickets_fts_update
+            AFTER UPDATE OF question, answer, student_id ON student_faqs BEGIN
+                DELETE FROM tickets_fts WHERE rowid = old.id;
+                INSERT INTO tickets_fts (rowid, question, answer, student_name)
+                VALUES (new.id, new.question, new.answer,
+                        (SELECT full_name FROM users WHERE id = new.student_id));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tickets_fts_student_name
+            AFTER UPDATE OF full_name ON users BEGIN
+                UPDATE tickets_fts SET student_name = new.full_name
+                WHERE rowid IN (SELECT id FROM student_faqs WHERE student_id = new.id);
+            END
+        ''')
+        
+        cursor.execute('SELECT COUNT(*) FROM tickets_fts')
+        indexed = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM student_faqs')
+        if indexed != cursor.fetchone()[0]:
+            self.rebuild(cursor)
+    
+    def rebuild(self, cursor):
+        """Re-index every ticket (used for existing databases and repairs)"""
+        cursor.execute('DELETE FROM tickets_fts')
+        cursor.execute('''
+            INSERT INTO tickets_fts (rowid, question, answer, student_name)
+            SELECT f.id, f.question, f.answer, u.full_name
+            FROM student_faqs f
+            LEFT JOIN users u ON u.id = f.student_id
+        ''')
+        print("SUCCESS: Ticket search index rebuilt")
+    
+    def search(self, text, status=None, limit=20, after=None):
+        """Ranked ticket search with keyset pagination; returns (results, next_cursor)
+        
+        Matches are ordered by BM25 (question weighted over answer and student
+        name) and paged with `after`, the next_cursor of the previous page.
+        Without search terms the newest tickets are listed instead. Raises
+        ValueError for a malformed cursor.
+        """
+        match_query = build_match_query(text)
+        conditions = []
+        if match_query:
+            # Scores are computed in the inner query so the keyset can compare against them
+            inner = '''
+                SELECT f.id, f.question, f.answer, f.status, f.created_at, u.full_name, u.username,
+                       highlight(tickets_fts, 0, ?, ?) AS question_highlight,
+                       snippet(tickets_fts, 1, ?, ?, '...', 24) AS answer_snippet,
+                       highlight(tickets_fts, 2, ?, ?) AS student_highlight,
+                       bm25(tickets_fts, 10.0, 4.0, 6.0) AS score
+                FROM tickets_fts
+                JOIN student_faqs f ON f.id = tickets_fts.rowid
+                JOIN users u ON u.id = f.student_id
+            '''
+            params = [HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END,
+                      HIGHLIGHT_START, HIGHLIGHT_END, match_query]
+            conditions.append('tickets_fts MATCH ?')
+            order = 'score, id DESC'
+        else:
+            inner = '''
+                SELECT f.id, f.question, f.answer, f.status, f.created_at, u.full_name, u.username,
+                       NULL, NULL, NULL, f.created_at AS score
+                FROM student_faqs f
+                JOIN users u ON u.id = f.student_id
+            '''
+            params = []
+            order = 'score DESC, id DESC'
+        if status and status != 'all':
+            conditions.append('f.status = ?')
+            params.append(status)
+        if conditions:
+            inner += ' WHERE ' + ' AND '.join(conditions)
+        
+        outer = f'SELECT * FROM ({inner})'
+        if after:
+            last_score, last_id = decode_cursor(after, 2)
+            # BM25 scores are numbers; without search terms the score is created_at
+            score_types = (int, float) if match_query else (str,)
+            if (not isinstance(last_score, score_types) or isinstance(last_score, bool)
+                    or not isinstance(last_id, int) or isinstance(last_id, bool)):
+                raise ValueError('Invalid pagination cursor')
+            outer += (' WHERE score > ? OR (score = ? AND id < ?)' if match_query
+                      else ' WHERE score < ? OR (score = ? AND id < ?)')
+            params.extend([last_score, last_score, last_id])
+        outer += f' ORDER BY {order} LIMIT ?'
+        params.append(limit + 1)
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            rows = conn.execute(outer, params).fetchall()
+        finally:
+            conn.close()
+        
+        next_cursor = encode_cursor([rows[limit - 1][10], rows[limit - 1][0]]) if len(rows) > limit else None
+        results = [{
+            'id': row[0],
+            'question': row[1],
+            'answer': row[2],
+            'status': row[3],
+            'created_at': row[4],
+            'student_name': row[5],
+            'student_username': row[6],
+            'question_highlight': render_highlight(row[7]) if match_query else html.escape(row[1] or ''),
+            'answer_snippet': render_highlight(row[8]) if match_query else None,
+            'student_highlight': render_highlight(row[9]) if match_query else html.escape(row[5] or ''),
+            'score': round(-row[10], 4) if match_query else None
+        } for row in rows[:limit]]
+        return results, next_cursor
+
+ticket_search_index = TicketSearchIndex()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Stats Snapshot Service for B's Nexora Educational Platform
+Computes every dashboard headline counter with one aggregate query per table
+and serves the snapshot from memory, refreshing it in the background once it
+goes stale (stale-while-revalidate)
+"""
+
+import sqlite3
+import threading
+import time
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+ADMIN_ROLES = ('master', 'cto')
+MANAGED_ROLES = ('student', 'teacher', 'crew_lead')
+
+class StatsSnapshotService:
+    def __init__(self, db_path=DATABASE_PATH, ttl_seconds=30, max_stale_seconds=10 * 60):
+        """Initialize the service; the first get() computes the snapshot inline
+
+        Snapshots older than ttl_seconds are served while one background refresh
+        runs. Older than max_stale_seconds (e.g. after an idle night) they are
+        recomputed before answering.
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.lock = threading.Lock()
+        self.refreshing = False
+        self.snapshot = None
+        self.computed_at = 0
+        # Bumped on every refresh; cached pages built from the snapshot key on it
+        self.generation = 0
+        self.metrics = {'fresh': 0, 'stale': 0, 'blocking': 0, 'refreshes': 0}
+    
+    def compute(self):
+        """One pass over each table; returns the flat snapshot dict"""
+        started = time.time()
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.cursor()
+            snapshot = {}
+            
+            cursor.execute('SELECT role, is_active, COUNT(*) FROM users GROUP BY role, is_active')
+            users_by_role = {}
+            inactive_users = 0
+            for role, is_active, count in cursor.fetchall():
+                users_by_role[role] = users_by_role.get(role, 0) + count
+                if is_active == 0:
+                    inactive_users += count
+            snapshot['users_by_role'] = users_by_role
+            snapshot['user_breakdown'] = sorted(users_by_role.items())
+            snapshot['total_users'] = sum(users_by_role.values())
+            snapshot['inactive_users'] = inactive_users
+            snapshot['managed_users'] = sum(users_by_role.get(role, 0) for role in MANAGED_ROLES)
+            snapshot['admin_users'] = sum(users_by_role.get(role, 0) for role in ADMIN_ROLES)
+            
+            cursor.execute('''
+                SELECT COUNT(*),
+                       COALESCE(SUM(course_category IS NOT NULL), 0),
+                       COALESCE(SUM(is_active = 1), 0)
+                FROM videos
+            ''')
+            snapshot['total_videos'], snapshot['categorized_videos'], snapshot['active_videos'] = cursor.fetchone()
+            
+            cursor.execute('''
+                SELECT COUNT(*),
+                       COALESCE(SUM(timestamp >= DATE('now', '-30 days')), 0),
+                       COALESCE(SUM(action = 'login' AND timestamp >= DATETIME('now', '-24 hours')), 0)
+                FROM system_logs
+            ''')
+            snapshot['total_logs'], snapshot['monthly_activity'], snapshot['recent_logins'] = cursor.fetchone()
+            
+            cursor.execute('''
+                SELECT COUNT(*),
+                       COALESCE(SUM(status = 'pending'), 0),
+                       COALESCE(SUM(status = 'answered'), 0),
+                       COALESCE(SUM(status = 'closed'), 0),
+                       COALESCE(SUM(status = 'answered' AND DATE(answered_at) = DATE('now')), 0)
+                FROM student_faqs
+            ''')
+            (snapshot['total_faqs'], snapshot['pending_faqs'], snapshot['answered_faqs'],
+             snapshot['closed_faqs'], snapshot['answered_today']) = cursor.fetchone()
+            
+            cursor.execute('''
+                SELECT COUNT(*), COALESCE(SUM(created_at >= DATE('now', '-24 hours')), 0)
+                FROM chat_messages
+            ''')
+            snapshot['total_messages'], snapshot['daily_messages'] = cursor.fetchone()
+            
+            table_counts = {
+                'users': snapshot['total_users'],
+                'videos': snapshot['total_videos'],
+                'system_logs': snapshot['total_logs'],
+                'student_faqs': snapshot['total_faqs']
+            }
+            for table in ('enrollments', 'video_progress'):
+                try:
+                    cursor.execute(f'SELECT COUNT(*) FROM {table}')
+                    table_counts[table] = cursor.fetchone()[0]
+                except sqlite3.Error:
+                    table_counts[table] = 0
+            snapshot['table_counts'] = table_counts
+            
+            cursor.execute('SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()')
+            snapshot['database_size'] = cursor.fetchone()[0]
+        finally:
+            conn.close()
+        
+        snapshot['computed_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        snapshot['compute_seconds'] = round(time.time() - started, 4)
+        return snapshot
+    
+    def refresh(self):
+        snapshot = self.compute()
+        with self.lock:
+            self.snapshot = snapshot
+            self.computed_at = time.monotonic()
+            self.generation += 1
+            self.metrics['refreshes'] += 1
+        return snapshot
+    
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"WARNING: Stats snapshot refresh failed: {e}")
+        finally:
+            with self.lock:
+                self.refreshing = False
+    
+    def get(self):
+        """Current snapshot; never blocks on a refresh unless it is missing or very old"""
+        with self.lock:
+            age = time.monotonic() - self.computed_at
+            snapshot = self.snapshot
+            if snapshot is not None and age <= self.ttl_seconds:
+                self.metrics['fresh'] += 1
+                return snapshot
+            if snapshot is not None and age <= self.max_stale_seconds:
+                self.metrics['stale'] += 1
+                if not self.refreshing:
+                    self.refreshing = True
+                    threading.Thread(target=self._background_refresh, name='stats-snapshot',
+                                     daemon=True).start()
+                return snapshot
+            self.metrics['blocking'] += 1
+        return self.refresh()
+    
+    def invalidate(self):
+        """Mark the snapshot stale so the next reader triggers a background refresh
+
+        Called next to fragment_cache.bump(); pages keyed on `generation`
+        re-render once the refreshed snapshot lands.
+        """
+        with self.lock:
+            self.computed_at = min(self.computed_at, time.monotonic() - self.ttl_seconds - 1)
+    
+    def get_metrics(self):
+        with self.lock:
+            return dict(self.metrics, generation=self.generation, age_seconds=round(time.monotonic() - self.computed_at, 1)
+                        if self.snapshot is not None else None)
+
+stats_snapshot = StatsSnapshotService()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Support Metrics for B's Nexora Educational Platform
+Incrementally maintained counters behind the CAO Student Support Center.
+Ticket endpoints capture the affected rows before and after their write and
+record the difference; a periodic reconciliation rebuilds everything from
+student_faqs and corrects any drift
+"""
+
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+
+from ticket_classifier import category_label
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+TICKET_COLUMNS = 'id, student_id, category, status, created_at, answered_at, answered_by'
+CAPTURE_CHUNK = 500
+
+def ticket_day(value):
+    return str(value)[:10] if value else None
+
+def response_hours(created_at, answered_at):
+    try:
+        delta = datetime.fromisoformat(str(answered_at)) - datetime.fromisoformat(str(created_at))
+    except (TypeError, ValueError):
+        return None
+    return delta.total_seconds() / 3600
+
+def bump(counter, key, sign):
+    value = counter.get(key, 0) + sign
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+class SupportState:
+    """Counters for one consistent view of student_faqs"""
+    
+    def __init__(self):
+        self.status_counts = {}
+        self.total = 0
+        self.created_by_day = {}            # created day -> tickets
+        self.resolved_by_created_day = {}   # created day -> tickets now answered
+        self.resolved_by_day = {}           # answered day -> tickets now answered
+        self.categories_by_day = {}         # (created day, category) -> tickets
+        self.response_sum = 0.0
+        self.response_count = 0
+        self.agents = {}                    # agent id -> [answered, hours sum, hours count]
+        self.students = {}                  # student id -> [questions, pending, sorted question times]
+        self.student_ranking = []           # (pending, last question, student id), ascending
+        self.rows = {}                      # ticket id -> the row these counters include
+    
+    def apply(self, row, sign):
+        ticket_id, student_id, category, status, created_at, answered_at, answered_by = row
+        if sign > 0:
+            self.rows[ticket_id] = row
+        else:
+            self.rows.pop(ticket_id, None)
+        bump(self.status_counts, status, sign)
+        self.total += sign
+        
+        created_day = ticket_day(created_at)
+        if created_day:
+            bump(self.created_by_day, created_day, sign)
+            bump(self.categories_by_day, (created_day, category_label(category)), sign)
+            if status == 'answered':
+                bump(self.resolved_by_created_day, created_day, sign)
+        
+        if status == 'answered' and answered_at:
+            bump(self.resolved_by_day, ticket_day(answered_at), sign)
+            hours = response_hours(created_at, answered_at)
+            if hours is not None:
+                self.response_sum += sign * hours
+                self.response_count += sign
+            if answered_by is not None:
+                agent = self.agents.setdefault(answered_by, [0, 0.0, 0])
+                agent[0] += sign
+                if hours is not None:
+                    agent[1] += sign * hours
+                    agent[2] += sign
+                if agent[0] <= 0:
+                    del self.agents[answered_by]
+        
+        student = self.students.setdefault(student_id, [0, 0, []])
+        if student[0]:
+            self.student_ranking.pop(bisect_left(self.student_ranking, self.rank_key(student_id)))
+        student[0] += sign
+        if status == 'pending':
+            student[1] += sign
+        if created_at is not None:
+            if sign > 0:
+                insort(student[2], str(created_at))
+            else:
+                times = student[2]
+                index = bisect_left(times, str(created_at))
+                if index < len(times) and times[index] == str(created_at):
+                    times.pop(index)
+        if student[0] <= 0:
+            del self.students[student_id]
+        else:
+            insort(self.student_ranking, self.rank_key(student_id))
+    
+    def rank_key(self, student_id):
+        _, pending, times = self.students[student_id]
+        return (pending, times[-1] if times else '', student_id)
+    
+    def apply_write(self, before, after):
+        """Move each ticket to its row in `after` (or drop it if only in `before`)
+
+        Idempotent: a write whose rows are already counted changes nothing.
+        """
+        after_ids = {row[0] for row in after}
+        for row in before:
+            if row[0] not in after_ids:
+                self.replace(row[0], None)
+        for row in after:
+            self.replace(row[0], tuple(row))
+    
+    def replace(self, ticket_id, row):
+        old = self.rows.get(ticket_id)
+        if old == row:
+            return
+        if old is not None:
+            self.apply(old, -1)
+        if row is not None:
+            self.apply(row, 1)
+    
+    def counters(self):
+        return (self.total, sorted(self.status_counts.items()), self.response_count)
+
+class SupportMetrics:
+    def __init__(self, db_path=DATABASE_PATH, reconcile_seconds=10 * 60):
+        """Initialize empty metrics; the first read (or start()) builds them"""
+        self.db_path = db_path
+        self.reconcile_seconds = reconcile_seconds
+        self.lock = threading.Lock()
+        # One reconciliation at a time, so a scan's log is not reset by another
+        self.reconcile_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.state = None
+        # Writes recorded while a reconciliation scan runs; None when no scan is running
+        self.scan_log = None
+        self.last_reconcile = None
+        self.stats = {'recorded': 0, 'reconciles': 0, 'drift_corrections': 0}
+    
+    def ensure_schema(self, cursor):
+        """Indexes for the support page's ticket lists and per-student lookups (called from init_database)"""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_faqs_status_created ON student_faqs (status, created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_faqs_status_answered ON student_faqs (status, answered_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_faqs_student ON student_faqs (student_id, created_at)')
+    
+    # === WRITE HOOKS ===
+    
+    def capture(self, cursor, ticket_ids):
+        """Current rows for ticket_ids; call before and after a write, in the same transaction"""
+        ticket_ids = list(ticket_ids)
+        rows = []
+        for start in range(0, len(ticket_ids), CAPTURE_CHUNK):
+            chunk = ticket_ids[start:start + CAPTURE_CHUNK]
+            cursor.execute(f'SELECT {TICKET_COLUMNS} FROM student_faqs WHERE id IN ({",".join("?" * len(chunk))})',
+                           chunk)
+            rows.extend(cursor.fetchall())
+        return rows
+    
+    def record(self, before, after):
+        """Fold a committed write into the counters: tickets take their `after` rows, the rest are dropped"""
+        with self.lock:
+            if self.scan_log is not None:
+                self.scan_log.append((before, after))
+            if self.state is None:
+                return
+            self.state.apply_write(before, after)
+            self.stats['recorded'] += 1
+    
+    # === RECONCILIATION ===
+    
+    def reconcile(self):
+        """Rebuild the counters from student_faqs and swap them in; returns True if they had drifted
+
+        Writes recorded during the scan are replayed onto the new counters.
+        The scan may or may not include them, which is why records are
+        idempotent; a write recorded after the swap lands on the new counters.
+        """
+        with self.reconcile_lock:
+            with self.lock:
+                self.scan_log = []
+            try:
+                state = SupportState()
+                conn = sqlite3.connect(self.db_path, timeout=30)
+                try:
+                    for row in conn.execute(f'SELECT {TICKET_COLUMNS} FROM student_faqs'):
+                        state.apply(row, 1)
+                finally:
+                    conn.close()
+            except Exception:
+                with self.lock:
+                    self.scan_log = None
+                raise
+            
+            with self.lock:
+                for before, after in self.scan_log:
+                    state.apply_write(before, after)
+                self.scan_log = None
+                drifted = self.state is not None and self.state.counters() != state.counters()
+                self.state = state
+                self.last_reconcile = time.time()
+                self.stats['reconciles'] += 1
+                if drifted:
+                    self.stats['drift_corrections'] += 1
+                    print("WARNING: Support metrics drifted from student_faqs and were rebuilt")
+                return drifted
+    
+    # === READS ===
+    
+    def _ensure_state(self):
+        if self.state is None:
+            self.reconcile()
+    
+    def summary(self):
+        """Headline counters, daily metrics and category breakdown from memory"""
+        self._ensure_state()
+        today = datetime.now(timezone.utc).date()
+        week_days = [(today - timedelta(days=offset)).isoformat() for offset in range(8)]
+        month_start = (today - timedelta(days=30)).isoformat()
+        
+        with self.lock:
+            state = self.state
+            categories = {}
+            for (day, category), count in state.categories_by_day.items():
+                if day >= month_start:
+                    categories[category] = categories.get(category, 0) + count
+            return {
+                'open_tickets': state.status_counts.get('pending', 0),
+                'resolved_today': state.resolved_by_day.get(week_days[0], 0),
+                'total_tickets': state.total,
+                'resolved_week': sum(state.resolved_by_day.get(day, 0) for day in week_days),
+                'avg_response_hours': state.response_sum / state.response_count if state.response_count else None,
+                'daily_metrics': [(day, state.created_by_day[day], state.resolved_by_created_day.get(day, 0))
+                                  for day in week_days if day in state.created_by_day],
+                'support_categories': sorted(categories.items(), key=lambda item: -item[1])
+            }
+    
+    def top_agents(self, limit=5):
+        """[(agent_id, tickets_answered, avg_response_hours)], most tickets first"""
+        self._ensure_state()
+        with self.lock:
+            ranked = sorted(self.state.agents.items(), key=lambda item: (-item[1][0], item[0]))[:limit]
+        return [(agent_id, answered, hours / counted if counted else None)
+                for agent_id, (answered, hours, counted) in ranked]
+    
+    def ranked_students(self, start=0, count=40):
+        """[(student_id, questions, pending, last question)] at positions start..start+count
+        of the ranking: most pending first, then latest question first
+
+        The ranking is kept sorted as tickets change, so a page costs a slice.
+        """
+        self._ensure_state()
+        with self.lock:
+            ranking = self.state.student_ranking
+            end = max(len(ranking) - start, 0)
+            page = []
+            for pending, last_question, student_id in reversed(ranking[max(end - count, 0):end]):
+                page.append((student_id, self.state.students[student_id][0], pending, last_question or None))
+            return page
+    
+    def get_status(self):
+        with self.lock:
+            return dict(self.stats, built=self.state is not None, last_reconcile=self.last_reconcile)
+    
+    # === SCHEDULER ===
+    
+    def run_forever(self):
+        while True:
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"WARNING: Support metrics reconciliation failed: {e}")
+            if self.stop_event.wait(self.reconcile_seconds):
+                return
+    
+    def start(self):
+        """Start the reconciliation thread (idempotent)"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_forever, name='support-metrics', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+
+support_metrics = SupportMetrics()
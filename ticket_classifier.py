@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Support Ticket Classifier for B's Nexora Educational Platform
+Assigns student_faqs.category once, when a question is submitted: ordered
+keyword rules first, then an optional TF-IDF model trained on already
+rule-labelled tickets. Includes a batched backfill for tickets submitted
+before classification existed
+"""
+
+import argparse
+import math
+import re
+import sqlite3
+import threading
+import time
+
+from report_rollups import ReportRollups
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+DEFAULT_CATEGORY = 'general'
+# Display names used by the support center
+CATEGORY_LABELS = {
+    'video': 'Video Issues',
+    'login': 'Login Issues',
+    'course_access': 'Course Access',
+    'progress': 'Progress Tracking',
+    'account': 'Account Issues',
+    DEFAULT_CATEGORY: 'General Support'
+}
+# Checked in order; a keyword matches anywhere in the lowercased question
+KEYWORD_RULES = [
+    ('video', ('video', 'watch')),
+    ('login', ('login', 'password')),
+    ('course_access', ('course', 'enroll')),
+    ('progress', ('progress', 'track')),
+    ('account', ('account', 'profile'))
+]
+
+BACKFILL_WATERMARK = 'ticket_categories'
+# Highest ticket id submitted before categories were assigned at submit time
+LEGACY_BOUNDARY = 'ticket_categories:legacy'
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+def category_label(category):
+    return CATEGORY_LABELS.get(category or DEFAULT_CATEGORY, (category or DEFAULT_CATEGORY).replace('_', ' ').title())
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall((text or '').lower()) if len(token) > 2]
+
+class KeywordModel:
+    """Ordered substring rules; returns (category, 1.0) or (None, 0.0)"""
+    
+    def __init__(self, rules=KEYWORD_RULES):
+        self.rules = rules
+    
+    def predict(self, text):
+        text = (text or '').lower()
+        for category, keywords in self.rules:
+            if any(keyword in text for keyword in keywords):
+                return category, 1.0
+        return None, 0.0
+
+class TfidfModel:
+    """Nearest-centroid classifier over TF-IDF vectors
+
+    fit() takes (question, category) examples; predict() returns the closest
+    category and its cosine similarity, or (None, 0.0) for unknown words.
+    """
+    
+    def __init__(self):
+        self.idf = {}
+        self.centroids = {}
+        self.examples = 0
+    
+    def _vector(self, tokens):
+        counts = {}
+        for token in tokens:
+            if token in self.idf:
+                counts[token] = counts.get(token, 0) + 1
+        vector = {token: (1 + math.log(count)) * self.idf[token] for token, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {token: weight / norm for token, weight in vector.items()} if norm else {}
+    
+    def fit(self, examples):
+        documents = [(set(tokenize(text)), tokenize(text), category) for text, category in examples]
+        document_frequency = {}
+        for unique_tokens, _, _ in documents:
+            for token in unique_tokens:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        total = len(documents)
+        self.idf = {token: math.log((1 + total) / (1 + frequency)) + 1
+                    for token, frequency in document_frequency.items()}
+        
+        sums = {}
+        for _, tokens, category in documents:
+            centroid = sums.setdefault(category, {})
+            for token, weight in self._vector(tokens).items():
+                centroid[token] = centroid.get(token, 0.0) + weight
+        self.centroids = {}
+        for category, centroid in sums.items():
+            norm = math.sqrt(sum(weight * weight for weight in centroid.values()))
+            if norm:
+                self.centroids[category] = {token: weight / norm for token, weight in centroid.items()}
+        self.examples = total
+        return self
+    
+    def predict(self, text):
+        vector = self._vector(tokenize(text))
+        best, best_score = None, 0.0
+        for category, centroid in self.centroids.items():
+            score = sum(weight * centroid.get(token, 0.0) for token, weight in vector.items())
+            if score > best_score:
+                best, best_score = category, score
+        return best, best_score
+
+class TicketClassifier:
+    def __init__(self, db_path=DATABASE_PATH, rules=KEYWORD_RULES, min_score=0.25, retrain_seconds=6 * 60 * 60):
+        """Initialize with keyword rules only; set_model() or train() adds a learned fallback"""
+        self.db_path = db_path
+        self.rules = KeywordModel(rules)
+        self.model = None
+        self.min_score = min_score
+        self.retrain_seconds = retrain_seconds
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.on_batch = None
+        self.stats = {'classified': 0, 'by_rule': 0, 'by_model': 0, 'backfilled': 0}
+    
+    def ensure_schema(self, cursor):
+        """Index the category column and record the legacy boundary (called from init_database)
+    
+        Tickets up to the boundary predate submit-time classification and are
+        classified once by the scheduled backfill; later ones never are.
+        """
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_faqs_category ON student_faqs (category, created_at)')
+        cursor.execute('''
+            INSERT INTO rollup_watermarks (name, last_id)
+            SELECT ?, COALESCE(MAX(id), 0) FROM student_faqs WHERE true
+            ON CONFLICT (name) DO NOTHING
+        ''', (LEGACY_BOUNDARY,))
+    
+    # === CLASSIFICATION ===
+    
+    def set_model(self, model):
+        """Plug in any object with predict(text) -> (category, score), or None for rules only"""
+        with self.lock:
+            self.model = model
+    
+    def classify(self, question):
+        """Category for one question; rules win, the model only decides what they miss"""
+        category, _ = self.rules.predict(question)
+        with self.lock:
+            self.stats['classified'] += 1
+            if category:
+                self.stats['by_rule'] += 1
+                return category
+            model = self.model
+        if model is not None:
+            category, score = model.predict(question)
+            if category and score >= self.min_score:
+                with self.lock:
+                    self.stats['by_model'] += 1
+                return category
+        return DEFAULT_CATEGORY
+    
+    def train(self, limit=20000):
+        """Fit a TfidfModel on recent tickets the keyword rules label
+    
+        Labels come from the rules, never from stored categories, so the
+        model does not learn from its own earlier predictions.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            questions = conn.execute('SELECT question FROM student_faqs ORDER BY id DESC LIMIT ?',
+                                     (limit,)).fetchall()
+        finally:
+            conn.close()
+        examples = []
+        for (question,) in questions:
+            category, _ = self.rules.predict(question)
+            if category:
+                examples.append((question, category))
+        if len({category for _, category in examples}) < 2:
+            return None
+        model = TfidfModel().fit(examples)
+        self.set_model(model)
+        return model
+    
+    # === BACKFILL ===
+    
+    def backfill(self, batch_size=2000, reclassify_all=False, on_batch=None):
+        """Classify tickets in id order, one transaction per batch; returns tickets whose category changed
+    
+        By default only tickets submitted before categories were assigned at
+        submit time (up to the boundary ensure_schema recorded) and tickets
+        with no category are classified, each once; the legacy pass resumes
+        from its watermark. reclassify_all goes over every ticket again (e.g.
+        after changing the rules). on_batch(cursor, ticket_ids, phase) is
+        called with 'before' and 'after' around each batch's update and with
+        'committed' after its commit, so callers can record the change in the
+        support metrics. Report rollups are repaired whenever a category changed.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        changed = 0
+        try:
+            cursor = conn.cursor()
+            if reclassify_all:
+                changed += self._classify_range(cursor, 0, None, batch_size, on_batch)
+            else:
+                cursor.execute('SELECT name, last_id FROM rollup_watermarks WHERE name IN (?, ?)',
+                               (BACKFILL_WATERMARK, LEGACY_BOUNDARY))
+                marks = dict(cursor.fetchall())
+                changed += self._classify_range(cursor, marks.get(BACKFILL_WATERMARK, 0),
+                                                marks.get(LEGACY_BOUNDARY, 0), batch_size, on_batch,
+                                                watermark=BACKFILL_WATERMARK)
+                changed += self._classify_uncategorized(cursor, batch_size, on_batch)
+        finally:
+            conn.close()
+    
+        with self.lock:
+            self.stats['backfilled'] += changed
+        if changed:
+            print(f"INFO: Ticket classifier backfill changed {changed} categories")
+            ReportRollups(db_path=self.db_path).check(all_time=True, repair=True)
+        return changed
+    
+    def _classify_range(self, cursor, last_id, high, batch_size, on_batch, watermark=None):
+        """Classify tickets with last_id < id <= high (no upper bound when high is None)"""
+        changed = 0
+        while True:
+            if high is None:
+                cursor.execute('SELECT id, question, category FROM student_faqs WHERE id > ? ORDER BY id LIMIT ?',
+                               (last_id, batch_size))
+            else:
+                cursor.execute('''
+                    SELECT id, question, category FROM student_faqs
+                    WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+                ''', (last_id, high, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                return changed
+            last_id = rows[-1][0]
+            changed += self._apply(cursor, rows, on_batch, watermark, last_id)
+    
+    def _classify_uncategorized(self, cursor, batch_size, on_batch):
+        """Classify tickets with no category at all (rows from before the column had a default)"""
+        changed = 0
+        while True:
+            cursor.execute('SELECT id, question, category FROM student_faqs WHERE category IS NULL ORDER BY id LIMIT ?',
+                           (batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                return changed
+            changed += self._apply(cursor, rows, on_batch)
+    
+    def _apply(self, cursor, rows, on_batch, watermark=None, last_id=None):
+        """Write one batch of new categories (and the watermark) in one transaction"""
+        updates = []
+        for ticket_id, question, category in rows:
+            new_category = self.classify(question)
+            if new_category != category:
+                updates.append((new_category, ticket_id))
+        ticket_ids = [ticket_id for _, ticket_id in updates]
+        if updates and on_batch:
+            on_batch(cursor, ticket_ids, 'before')
+        cursor.executemany('UPDATE student_faqs SET category = ? WHERE id = ?', updates)
+        if updates and on_batch:
+            on_batch(cursor, ticket_ids, 'after')
+        if watermark:
+            cursor.execute('''
+                INSERT INTO rollup_watermarks (name, last_id, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at
+            ''', (watermark, last_id))
+        cursor.connection.commit()
+        if updates and on_batch:
+            on_batch(cursor, ticket_ids, 'committed')
+        return len(updates)
+    
+    def get_status(self):
+        with self.lock:
+            return dict(self.stats,
+                        model=type(self.model).__name__ if self.model is not None else None,
+                        model_examples=getattr(self.model, 'examples', None))
+    
+    # === SCHEDULER ===
+    
+    def run_forever(self):
+        while True:
+            try:
+                self.backfill(on_batch=self.on_batch)
+                self.train()
+            except Exception as e:
+                print(f"WARNING: Ticket classifier maintenance failed: {e}")
+            if self.stop_event.wait(self.retrain_seconds):
+                return
+    
+    def start(self, on_batch=None):
+        """Backfill legacy tickets once, then retrain the model periodically (idempotent)
+
+        on_batch is passed to backfill() so changed categories reach the support metrics.
+        """
+        if self.thread and self.thread.is_alive():
+            return
+        self.on_batch = on_batch
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_forever, name='ticket-classifier', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+
+ticket_classifier = TicketClassifier()
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify support tickets into categories')
+    parser.add_argument('--db', default=DATABASE_PATH, help='Path to the SQLite database')
+    parser.add_argument('--all', action='store_true',
+                        help='Reclassify every ticket, not just legacy and uncategorized ones')
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--with-model', action='store_true',
+                        help='Train the TF-IDF fallback before classifying')
+    args = parser.parse_args()
+    
+    classifier = TicketClassifier(db_path=args.db)
+    if args.with_model:
+        classifier.train()
+    started = time.time()
+    changed = classifier.backfill(batch_size=args.batch_size, reclassify_all=args.all)
+    print(f"Backfill complete: {changed} categories changed in {time.time() - started:.1f}s")
+    if changed:
+        print("Report rollups repaired; the app's support metrics pick this up at their next reconciliation")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Support Ticket Queue for B's Nexora Educational Platform
+Pending student_faqs ordered by a persisted priority column: the ticket's
+SLA deadline (created_at plus its category's SLA) pushed back a little for
+each earlier pending ticket from the same student. Agents claim tickets
+under a lease, so several CAO agents can work the queue without colliding
+"""
+
+import argparse
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from ticket_classifier import DEFAULT_CATEGORY, category_label
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+# Hours from submission until a pending ticket breaches its SLA
+SLA_HOURS = {
+    'login': 4,
+    'course_access': 8,
+    'video': 12,
+    'account': 24,
+    'progress': 24,
+    DEFAULT_CATEGORY: 48
+}
+# Each earlier pending ticket from the same student delays the next one by
+# this much (up to BACKLOG_CAP tickets), so one student cannot flood the head
+BACKLOG_STEP_SECONDS = 2 * 60 * 60
+BACKLOG_CAP = 5
+LEASE_SECONDS = 15 * 60
+
+QUEUE_COLUMNS = (('sla_due_at', 'INTEGER'), ('priority', 'INTEGER'),
+                 ('claimed_by', 'INTEGER'), ('claim_expires_at', 'INTEGER'))
+
+def sla_expression(row):
+    """SQL for a ticket's SLA deadline in unix seconds; `row` is the table alias or NEW"""
+    cases = ' '.join(f"WHEN '{category}' THEN {hours * 3600}" for category, hours in SLA_HOURS.items()
+                     if category != DEFAULT_CATEGORY)
+    return (f"(CAST(strftime('%s', COALESCE({row}.created_at, CURRENT_TIMESTAMP)) AS INTEGER) + "
+            f"CASE {row}.category {cases} ELSE {SLA_HOURS[DEFAULT_CATEGORY] * 3600} END)")
+
+def backlog_expression(row):
+    """SQL for the number of earlier pending tickets from the same student, capped at BACKLOG_CAP"""
+    return f'''(SELECT COUNT(*) FROM (
+        SELECT 1 FROM student_faqs p
+        WHERE p.student_id = {row}.student_id AND p.status = 'pending' AND p.id < {row}.id
+        LIMIT {BACKLOG_CAP}))'''
+
+def format_epoch(value):
+    return datetime.fromtimestamp(value, timezone.utc).strftime('%Y-%m-%d %H:%M:%S') if value is not None else None
+
+class TicketQueue:
+    def __init__(self, db_path=DATABASE_PATH, lease_seconds=LEASE_SECONDS, rescore_seconds=15 * 60):
+        """Initialize the queue; priorities live in student_faqs, kept current by triggers"""
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.rescore_seconds = rescore_seconds
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {'claims': 0, 'empty_claims': 0, 'renewals': 0, 'releases': 0, 'rescored': 0}
+    
+    def ensure_schema(self, cursor):
+        """Add the queue columns, (status, ...) indexes and triggers (called from init_database)"""
+        cursor.execute("PRAGMA table_info(student_faqs)")
+        existing = {column[1] for column in cursor.fetchall()}
+        for name, column_type in QUEUE_COLUMNS:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE student_faqs ADD COLUMN {name} {column_type}")
+        
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_faqs_queue ON student_faqs (status, priority)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_faqs_sla ON student_faqs (status, sla_due_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_faqs_student_status ON student_faqs (student_id, status)')
+        
+        # Recreated every start so the triggers always carry the current SLA table
+        for trigger in ('ticket_queue_insert', 'ticket_queue_requeue', 'ticket_queue_dequeue'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        cursor.execute(f'''
+            CREATE TRIGGER ticket_queue_insert AFTER INSERT ON student_faqs
+            WHEN new.status = 'pending' BEGIN
+                UPDATE student_faqs
+                SET sla_due_at = {sla_expression('new')},
+                    priority = {sla_expression('new')} + {backlog_expression('new')} * {BACKLOG_STEP_SECONDS}
+                WHERE id = new.id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER ticket_queue_requeue AFTER UPDATE OF status, category ON student_faqs
+            WHEN new.status = 'pending' AND (old.status IS NOT 'pending' OR old.category IS NOT new.category) BEGIN
+                UPDATE student_faqs
+                SET sla_due_at = {sla_expression('new')},
+                    priority = {sla_expression('new')} + {backlog_expression('new')} * {BACKLOG_STEP_SECONDS}
+                WHERE id = new.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER ticket_queue_dequeue AFTER UPDATE OF status ON student_faqs
+            WHEN old.status = 'pending' AND new.status IS NOT 'pending' BEGIN
+                UPDATE student_faqs SET priority = NULL, claimed_by = NULL, claim_expires_at = NULL
+                WHERE id = new.id;
+            END
+        ''')
+        
+        cursor.execute("SELECT 1 FROM student_faqs WHERE status = 'pending' AND priority IS NULL LIMIT 1")
+        if cursor.fetchone():
+            self.rescore(cursor)
+    
+    # === SCORING ===
+    
+    def rescore(self, cursor=None):
+        """Recompute every pending ticket's deadline and priority in one statement
+
+        Triggers score tickets as they enter the queue; this corrects backlog
+        positions after earlier tickets are answered and applies SLA changes.
+        Returns the number of pending tickets rescored.
+        """
+        conn = None
+        if cursor is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            cursor = conn.cursor()
+        try:
+            cursor.execute(f'''
+                UPDATE student_faqs
+                SET sla_due_at = ranked.sla_due_at,
+                    priority = ranked.sla_due_at + MIN(ranked.backlog, {BACKLOG_CAP}) * {BACKLOG_STEP_SECONDS}
+                FROM (
+                    SELECT f.id, {sla_expression('f')} AS sla_due_at,
+                           ROW_NUMBER() OVER (PARTITION BY f.student_id ORDER BY f.id) - 1 AS backlog
+                    FROM student_faqs f
+                    WHERE f.status = 'pending'
+                ) AS ranked
+                WHERE student_faqs.id = ranked.id
+            ''')
+            rescored = cursor.rowcount
+            if conn is not None:
+                conn.commit()
+        finally:
+            if conn is not None:
+                conn.close()
+        with self.lock:
+            self.stats['rescored'] += rescored
+        return rescored
+    
+    # === QUEUE ===
+    
+    def _ticket(self, row, now):
+        (ticket_id, question, category, created_at, sla_due_at, priority, claimed_by, claim_expires_at,
+         student_name, username, email) = row
+        claimed = claimed_by is not None and claim_expires_at is not None and claim_expires_at > now
+        try:
+            created = datetime.fromisoformat(str(created_at)).replace(tzinfo=timezone.utc)
+            hours_waiting = round((now - created.timestamp()) / 3600, 1)
+        except (TypeError, ValueError):
+            hours_waiting = None
+        return {
+            'id': ticket_id,
+            'question': question,
+            'category': category_label(category),
+            'created_at': created_at,
+            'hours_waiting': hours_waiting,
+            'sla_due_at': format_epoch(sla_due_at),
+            'sla_breached': sla_due_at is not None and sla_due_at <= now,
+            'priority': priority,
+            'claimed_by': claimed_by if claimed else None,
+            'claim_expires_at': format_epoch(claim_expires_at) if claimed else None,
+            'student_name': student_name,
+            'student_username': username,
+            'student_email': email
+        }
+    
+    def _fetch(self, cursor, where, params, limit=None):
+        now = int(time.time())
+        cursor.execute(f'''
+            SELECT f.id, f.question, f.category, f.created_at, f.sla_due_at, f.priority,
+                   f.claimed_by, f.claim_expires_at, u.full_name, u.username, u.email
+            FROM student_faqs f
+            JOIN users u ON f.student_id = u.id
+            WHERE {where}
+            ORDER BY f.priority, f.id
+            {'LIMIT ?' if limit else ''}
+        ''', list(params) + ([limit] if limit else []))
+        return [self._ticket(row, now) for row in cursor.fetchall()]
+    
+    def peek(self, cursor, limit=15, include_claimed=True):
+        """The first `limit` pending tickets in priority order, without claiming them"""
+        where = "f.status = 'pending'"
+        params = []
+        if not include_claimed:
+            where += ' AND (f.claimed_by IS NULL OR f.claim_expires_at <= ?)'
+            params.append(int(time.time()))
+        return self._fetch(cursor, where, params, limit)
+    
+    def claim_next(self, conn, agent_id):
+        """Lease the most urgent unclaimed ticket to agent_id; returns the ticket or None
+
+        An agent holding an unexpired claim gets that ticket back (with the
+        lease renewed) instead of a second one. Each claim is one UPDATE, so
+        concurrent agents can never be handed the same ticket.
+        """
+        cursor = conn.cursor()
+        now = int(time.time())
+        params = {'agent': agent_id, 'now': now, 'expires': now + self.lease_seconds}
+        cursor.execute('''
+            UPDATE student_faqs SET claim_expires_at = :expires
+            WHERE id = (SELECT id FROM student_faqs
+                        WHERE status = 'pending' AND claimed_by = :agent AND claim_expires_at > :now
+                        ORDER BY priority, id LIMIT 1)
+            RETURNING id
+        ''', params)
+        row = cursor.fetchone()
+        stat = 'renewals'
+        if row is None:
+            cursor.execute('''
+                UPDATE student_faqs SET claimed_by = :agent, claim_expires_at = :expires
+                WHERE id = (SELECT id FROM student_faqs
+                            WHERE status = 'pending' AND (claimed_by IS NULL OR claim_expires_at <= :now)
+                            ORDER BY priority, id LIMIT 1)
+                RETURNING id
+            ''', params)
+            row = cursor.fetchone()
+            stat = 'claims' if row else 'empty_claims'
+        conn.commit()
+        with self.lock:
+            self.stats[stat] += 1
+        if row is None:
+            return None
+        tickets = self._fetch(cursor, 'f.id = ?', [row[0]])
+        return tickets[0] if tickets else None
+    
+    def claim(self, conn, ticket_id, agent_id):
+        """Lease a specific pending ticket (or renew the agent's own lease); returns True on success"""
+        cursor = conn.cursor()
+        now = int(time.time())
+        cursor.execute('''
+            UPDATE student_faqs SET claimed_by = ?, claim_expires_at = ?
+            WHERE id = ? AND status = 'pending'
+              AND (claimed_by IS NULL OR claimed_by = ? OR claim_expires_at <= ?)
+        ''', (agent_id, now + self.lease_seconds, ticket_id, agent_id, now))
+        claimed = cursor.rowcount == 1
+        conn.commit()
+        if claimed:
+            with self.lock:
+                self.stats['claims'] += 1
+        return claimed
+    
+    def release(self, conn, ticket_id, agent_id):
+        """Give back a lease held by agent_id; returns True if one was released"""
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE student_faqs SET claimed_by = NULL, claim_expires_at = NULL
+            WHERE id = ? AND claimed_by = ?
+        ''', (ticket_id, agent_id))
+        released = cursor.rowcount == 1
+        conn.commit()
+        if released:
+            with self.lock:
+                self.stats['releases'] += 1
+        return released
+    
+    def holder(self, cursor, ticket_id):
+        """Agent id holding an unexpired lease on the ticket, or None"""
+        cursor.execute('''
+            SELECT claimed_by FROM student_faqs
+            WHERE id = ? AND status = 'pending' AND claimed_by IS NOT NULL AND claim_expires_at > ?
+        ''', (ticket_id, int(time.time())))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def leased_by_others(self, cursor, agent_id):
+        """Ids of pending tickets under an unexpired lease held by someone other than agent_id"""
+        cursor.execute('''
+            SELECT id FROM student_faqs
+            WHERE status = 'pending' AND claimed_by IS NOT NULL AND claimed_by != ? AND claim_expires_at > ?
+        ''', (agent_id, int(time.time())))
+        return {row[0] for row in cursor.fetchall()}
+    
+    # === SLA ===
+    
+    def sla_report(self, cursor, due_soon_seconds=60 * 60):
+        """Breached and soon-due counts; range scans on the (status, sla_due_at) index"""
+        now = int(time.time())
+        cursor.execute('''
+            SELECT COUNT(*), MIN(sla_due_at) FROM student_faqs
+            WHERE status = 'pending' AND sla_due_at <= ?
+        ''', (now,))
+        breached, oldest_due = cursor.fetchone()
+        cursor.execute('''
+            SELECT COUNT(*) FROM student_faqs
+            WHERE status = 'pending' AND sla_due_at > ? AND sla_due_at <= ?
+        ''', (now, now + due_soon_seconds))
+        due_soon = cursor.fetchone()[0]
+        cursor.execute('''
+            SELECT category, COUNT(*) FROM student_faqs
+            WHERE status = 'pending' AND sla_due_at <= ?
+            GROUP BY category
+        ''', (now,))
+        by_category = {}
+        for category, count in cursor.fetchall():
+            label = category_label(category)
+            by_category[label] = by_category.get(label, 0) + count
+        return {
+            'breached': breached,
+            'due_soon': due_soon,
+            'due_soon_hours': round(due_soon_seconds / 3600, 1),
+            'longest_breach_hours': round((now - oldest_due) / 3600, 1) if oldest_due is not None else None,
+            'breached_by_category': sorted(by_category.items(), key=lambda item: -item[1]),
+            'sla_hours': {category_label(category): hours for category, hours in SLA_HOURS.items()}
+        }
+    
+    def get_status(self):
+        with self.lock:
+            return dict(self.stats)
+    
+    # === SCHEDULER ===
+    
+    def run_forever(self):
+        while not self.stop_event.wait(self.rescore_seconds):
+            try:
+                self.rescore()
+            except Exception as e:
+                print(f"WARNING: Ticket queue rescore failed: {e}")
+    
+    def start(self):
+        """Rescore pending tickets periodically (idempotent)"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_forever, name='ticket-queue', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+
+ticket_queue = TicketQueue()
+
+def main():
+    parser = argparse.ArgumentParser(description='Rescore the support ticket queue and print its SLA report')
+    parser.add_argument('--db', default=DATABASE_PATH, help='Path to the SQLite database')
+    args = parser.parse_args()
+    
+    queue = TicketQueue(db_path=args.db)
+    started = time.time()
+    rescored = queue.rescore()
+    print(f"Rescored {rescored} pending tickets in {time.time() - started:.2f}s")
+    conn = sqlite3.connect(args.db)
+    try:
+        report = queue.sla_report(conn.cursor())
+    finally:
+        conn.close()
+    print(f"SLA breached: {report['breached']}, due within {report['due_soon_hours']}h: {report['due_soon']}")
+    for category, count in report['breached_by_category']:
+        print(f"  {category}: {count}")
+
+if __name__ == '__main__':
+    main()
@@ -51,13 +51,14 @@ class UniversalLauncher:
     def start_flask_server(self):
         """Start Flask server in background"""
         try:
-            from app import app, init_database, create_default_accounts
+            from app import app, init_database, create_default_accounts, start_background_services
             
             print("Initializing B's Nexora Educational Platform...")
             
             # Initialize database silently
             init_database()
             create_default_accounts()
+            start_background_services()
             
             # Verify video system and cloud accounts
             self.verify_video_system()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Video Catalog Cache for B's Nexora Educational Platform
+Keeps the videos/users JOIN in memory as compact records indexed by id,
+uploader, category and subject, patched incrementally on catalog events
+"""
+
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, insort
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+CATALOG_QUERY = '''
+    SELECT v.id, v.title, v.description, v.filename, v.file_path, v.uploaded_by,
+           v.course_category, v.subject, v.teacher_subdivision, v.upload_date,
+           v.is_active, v.views,
+           u.username, u.full_name, u.role, u.subdivision
+    FROM videos v
+    JOIN users u ON v.uploaded_by = u.id
+'''
+
+class VideoRecord:
+    """One catalog row; __slots__ keeps tens of thousands of these small"""
+    __slots__ = ('id', 'title', 'description', 'filename', 'file_path', 'uploaded_by',
+                 'course_category', 'subject', 'teacher_subdivision', 'upload_date',
+                 'is_active', 'views', 'uploader_username', 'uploader_name',
+                 'uploader_role', 'uploader_subdivision')
+    
+    def __init__(self, row):
+        (self.id, self.title, self.description, self.filename, self.file_path, self.uploaded_by,
+         self.course_category, self.subject, self.teacher_subdivision, self.upload_date,
+         self.is_active, self.views, self.uploader_username, self.uploader_name,
+         self.uploader_role, self.uploader_subdivision) = row
+    
+    @property
+    def sort_key(self):
+        # Newest-first ordering used everywhere is the reverse of this key
+        return (self.upload_date or '', self.id)
+
+class FacetIndex:
+    """Bitmap inverted index over one catalog snapshot
+    
+    Bit i of every bitmap is the i-th newest video, so date ranges and keyset
+    cursors are contiguous bit ranges and facet counts are popcounts.
+    """
+    FACETS = {
+        'category': 'course_category',
+        'subject': 'subject',
+        'subdivision': 'teacher_subdivision',
+        'teacher': 'uploaded_by'
+    }
+    
+    def __init__(self, records_newest_first, generation):
+        self.generation = generation
+        self.records = records_newest_first
+        self.size = len(records_newest_first)
+        # Ascending keys for bisect; position p corresponds to ascending index size-1-p
+        self.ascending_keys = [record.sort_key for record in reversed(records_newest_first)]
+        self.ascending_dates = [key[0] for key in self.ascending_keys]
+        self.active_bitmap = 0
+        self.bitmaps = {name: {} for name in self.FACETS}
+        self.teacher_names = {}
+        
+        for position, record in enumerate(records_newest_first):
+            bit = 1 << position
+            if record.is_active:
+                self.active_bitmap |= bit
+            for name, attribute in self.FACETS.items():
+                value = getattr(record, attribute)
+                self.bitmaps[name][value] = self.bitmaps[name].get(value, 0) | bit
+            self.teacher_names[record.uploaded_by] = record.uploader_name
+    
+    def prefix_mask(self, ascending_index):
+        """Bits for positions whose ascending index is below `ascending_index`"""
+        first_position = self.size - ascending_index
+        return ((1 << self.size) - 1) ^ ((1 << first_position) - 1)
+    
+    def date_mask(self, date_from=None, date_to=None):
+        mask = (1 << self.size) - 1
+        if date_from:
+            mask &= ~self.prefix_mask(bisect_left(self.ascending_dates, date_from))
+        if date_to:
+            # Inclusive of the whole end day
+            mask &= self.prefix_mask(bisect_left(self.ascending_dates, date_to + '\uffff'))
+        return mask
+    
+    def value_mask(self, name, values):
+        mask = 0
+        for value in values:
+            mask |= self.bitmaps[name].get(value, 0)
+        return mask
+    
+    def query(self, filters, include_inactive=False, date_from=None, date_to=None,
+              limit=20, after_key=None):
+        """Filter by facet values (OR within a facet, AND across facets)
+        
+        Returns (records, has_more, total, facet_counts). Counts for each facet
+        apply every other filter but not its own, so they show what selecting
+        another value of that facet would return.
+        """
+        base = self.date_mask(date_from, date_to)
+        if not include_inactive:
+            base &= self.active_bitmap
+        facet_masks = {name: self.value_mask(name, values)
+                       for name, values in filters.items() if values}
+        
+        matched = base
+        for mask in facet_masks.values():
+            matched &= mask
+        
+        facet_counts = {}
+        for name in self.FACETS:
+            scope = base
+            for other, mask in facet_masks.items():
+                if other != name:
+                    scope &= mask
+            counts = []
+            for value, bitmap in self.bitmaps[name].items():
+                count = (scope & bitmap).bit_count()
+                if count:
+                    label = self.teacher_names.get(value) if name == 'teacher' else value
+                    counts.append({'value': value, 'label': label, 'count': count})
+            counts.sort(key=lambda item: (-item['count'], str(item['label'])))
+            facet_counts[name] = counts
+        
+        remaining = matched
+        if after_key:
+            remaining &= self.prefix_mask(bisect_left(self.ascending_keys, after_key))
+        
+        results = []
+        while remaining and len(results) < limit:
+            lowest = remaining & -remaining
+            results.append(self.records[lowest.bit_length() - 1])
+            remaining ^= lowest
+        
+        return results, bool(remaining), matched.bit_count(), facet_counts
+
+class VideoCatalogCache:
+    # Secondary indexes: name -> VideoRecord attribute
+    INDEXED_ATTRIBUTES = {
+        'uploader': 'uploaded_by',
+        'category': 'course_category',
+        'subject': 'subject'
+    }
+    
+    def __init__(self, db_path=DATABASE_PATH, max_age_seconds=300):
+        """Initialize an empty cache; it is built lazily on first use
+
+        max_age_seconds bounds staleness from writers outside this process
+        (sync tools, manual SQL) that never raise catalog events.
+        """
+        self.db_path = db_path
+        self.max_age_seconds = max_age_seconds
+        self.lock = threading.RLock()
+        self.records = {}
+        self.ordered_keys = []
+        self.indexes = {name: {} for name in self.INDEXED_ATTRIBUTES}
+        # Active videos overall and per index value, kept in step with the indexes
+        self.active_total = 0
+        self.active_counts = {name: {} for name in self.INDEXED_ATTRIBUTES}
+        self.built_at = None
+        self.generation = 0
+        self.facets = None
+        self.metrics = {'hits': 0, 'misses': 0, 'rebuilds': 0, 'patches': 0}
+    
+    # === BUILD / PATCH ===
+    
+    def rebuild(self):
+        """Reload the whole catalog with one JOIN"""
+        with self.lock:
+            self._rebuild_locked()
+    
+    def _rebuild_locked(self):
+        # Held under the lock so a concurrent patch cannot be lost mid-rebuild
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            rows = conn.execute(CATALOG_QUERY).fetchall()
+        finally:
+            conn.close()
+        
+        records = {row[0]: VideoRecord(row) for row in rows}
+        indexes = {name: {} for name in self.INDEXED_ATTRIBUTES}
+        for record in records.values():
+            for name, attribute in self.INDEXED_ATTRIBUTES.items():
+                indexes[name].setdefault(getattr(record, attribute), []).append(record.sort_key)
+        for index in indexes.values():
+            for keys in index.values():
+                keys.sort()
+        
+        self.records = records
+        self.ordered_keys = sorted(record.sort_key for record in records.values())
+        self.indexes = indexes
+        self.active_total = 0
+        self.active_counts = {name: {} for name in self.INDEXED_ATTRIBUTES}
+        for record in records.values():
+            self._count_active(record, 1)
+        self.built_at = time.monotonic()
+        self.generation += 1
+        self.metrics['rebuilds'] += 1
+    
+    def _count_active(self, record, sign):
+        if not record.is_active:
+            return
+        self.active_total += sign
+        for name, attribute in self.INDEXED_ATTRIBUTES.items():
+            counts = self.active_counts[name]
+            value = getattr(record, attribute)
+            counts[value] = counts.get(value, 0) + sign
+            if not counts[value]:
+                del counts[value]
+    
+    def _unindex(self, record):
+        self.ordered_keys.pop(bisect_left(self.ordered_keys, record.sort_key))
+        for name, attribute in self.INDEXED_ATTRIBUTES.items():
+            keys = self.indexes[name].get(getattr(record, attribute))
+            if keys:
+                keys.pop(bisect_left(keys, record.sort_key))
+        self._count_active(record, -1)
+    
+    def _index(self, record):
+        insort(self.ordered_keys, record.sort_key)
+        for name, attribute in self.INDEXED_ATTRIBUTES.items():
+            insort(self.indexes[name].setdefault(getattr(record, attribute), []), record.sort_key)
+        self._count_active(record, 1)
+    
+    def patch(self, video_id):
+        """Reload a single video (or drop it if it no longer exists)"""
+        with self.lock:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                row = conn.execute(CATALOG_QUERY + ' WHERE v.id = ?', (video_id,)).fetchone()
+            finally:
+                conn.close()
+            
+            old = self.records.pop(video_id, None)
+            if old is not None:
+                self._unindex(old)
+            if row is not None:
+                record = VideoRecord(row)
+                self.records[video_id] = record
+                self._index(record)
+            self.generation += 1
+            self.metrics['patches'] += 1
+    
+    def invalidate(self, event, video_id=None):
+        """Apply a catalog event (upload, delete, toggle, edit)
+
+        Events for a single video are patched in place; anything else drops
+        the cache so the next reader rebuilds it.
+        """
+        if self.built_at is None:
+            return
+        if video_id is not None:
+            try:
+                self.patch(video_id)
+                return
+            except Exception as e:
+                print(f"WARNING: Catalog cache patch failed for video {video_id}: {e}")
+        with self.lock:
+            self.built_at = None
+    
+    def record_view(self, video_id):
+        """Keep the in-memory view counter in step with stream_video"""
+        with self.lock:
+            record = self.records.get(video_id)
+            if record is not None:
+                record.views = (record.views or 0) + 1
+    
+    def ensure_fresh(self):
+        with self.lock:
+            stale = self.built_at is None or time.monotonic() - self.built_at > self.max_age_seconds
+            self.metrics['misses' if stale else 'hits'] += 1
+            if stale:
+                self._rebuild_locked()
+    
+    # === QUERIES (all newest first) ===
+    
+    def _records_for_keys(self, keys, include_inactive):
+        records = self.records
+        for key in reversed(keys):
+            record = records[key[1]]
+            if include_inactive or record.is_active:
+                yield record
+    
+    def get(self, video_id):
+        self.ensure_fresh()
+        with self.lock:
+            return self.records.get(video_id)
+    
+    def videos(self, include_inactive=False, **filters):
+        """Videos matching optional uploader/category/subject filters"""
+        self.ensure_fresh()
+        with self.lock:
+            keys = self.ordered_keys
+            for name, value in filters.items():
+                if value is not None:
+                    keys = self.indexes[name].get(value, [])
+                    break
+            results = []
+            for record in self._records_for_keys(keys, include_inactive):
+                if all(value is None or getattr(record, self.INDEXED_ATTRIBUTES[name]) == value
+                       for name, value in filters.items()):
+                    results.append(record)
+            return results
+    
+    def page(self, include_inactive, limit, after_key=None):
+        """Keyset page after (upload_date, id); returns (records, has_more)"""
+        self.ensure_fresh()
+        with self.lock:
+            end = bisect_left(self.ordered_keys, after_key) if after_key else len(self.ordered_keys)
+            results = []
+            for index in range(end - 1, -1, -1):
+                record = self.records[self.ordered_keys[index][1]]
+                if include_inactive or record.is_active:
+                    if len(results) == limit:
+                        return results, True
+                    results.append(record)
+            return results, False
+    
+    def distinct_count(self, index_name):
+        """Number of distinct values with at least one video (e.g. uploaders)"""
+        self.ensure_fresh()
+        with self.lock:
+            return sum(1 for keys in self.indexes[index_name].values() if keys)
+    
+    def group_counts(self, index_name, include_inactive=False):
+        """[(value, video count)] for one index, like SELECT value, COUNT(*) ... GROUP BY value"""
+        self.ensure_fresh()
+        with self.lock:
+            if include_inactive:
+                counts = [(value, len(keys)) for value, keys in self.indexes[index_name].items() if keys]
+            else:
+                counts = list(self.active_counts[index_name].items())
+            return sorted(counts, key=lambda item: (item[0] is not None, str(item[0])))
+    
+    def count(self, include_inactive=False):
+        """Catalog size from the maintained counters"""
+        self.ensure_fresh()
+        with self.lock:
+            return len(self.records) if include_inactive else self.active_total
+    
+    def facet_index(self):
+        """Bitmap facet index for the current generation (rebuilt from memory after changes)"""
+        self.ensure_fresh()
+        with self.lock:
+            if self.facets is None or self.facets.generation != self.generation:
+                newest_first = [self.records[key[1]] for key in reversed(self.ordered_keys)]
+                self.facets = FacetIndex(newest_first, self.generation)
+            return self.facets
+    
+    def get_metrics(self):
+        with self.lock:
+            lookups = self.metrics['hits'] + self.metrics['misses']
+            return dict(self.metrics,
+                        videos=len(self.records),
+                        generation=self.generation,
+                        hit_rate=round(self.metrics['hits'] / lookups * 100, 1) if lookups else 0.0)
+
+video_catalog_cache = VideoCatalogCache()
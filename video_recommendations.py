@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Co-View Video Recommendations for B's Nexora Educational Platform
+Item-item co-occurrence over who watched what (video_progress and
+video_view_events), kept as a sparse NumPy matrix and served as top-K
+"up next" lists per video from memory
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+# Pair codes are row * PAIR_STRIDE + column, so sorting codes sorts by row first
+PAIR_STRIDE = 1 << 31
+# Only a student's most recent videos are paired, bounding the work per student
+MAX_HISTORY = 50
+TOP_K = 20
+
+INTERACTIONS_QUERY = '''
+    SELECT user_id, video_id, MAX(seen_at) AS last_seen
+    FROM (
+        SELECT student_id AS user_id, video_id, last_watched AS seen_at FROM video_progress
+        UNION ALL
+        SELECT user_id, video_id, viewed_at AS seen_at FROM video_view_events
+    )
+    GROUP BY user_id, video_id
+    ORDER BY user_id, last_seen DESC
+'''
+
+def expand_pairs(groups):
+    """All ordered (a, b) pairs, a != b, within each group of a grouped item array
+
+    `groups` is a sequence of 1-D integer arrays (one per student). Returns
+    int64 pair codes, built without a Python loop over the pairs themselves.
+    """
+    groups = [group for group in groups if len(group) > 1]
+    if not groups:
+        return np.empty(0, dtype=np.int64)
+    items = np.concatenate(groups).astype(np.int64)
+    sizes = np.array([len(group) for group in groups], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    
+    # Every item is paired with each member of its own group
+    per_item = np.repeat(sizes, sizes)
+    item_starts = np.repeat(starts, sizes)
+    left = np.repeat(items, per_item)
+    block_offsets = np.repeat(np.cumsum(per_item) - per_item, per_item)
+    right_index = np.repeat(item_starts, per_item) + (np.arange(per_item.sum()) - block_offsets)
+    right = items[right_index]
+    
+    keep = left != right
+    return left[keep] * PAIR_STRIDE + right[keep]
+
+class CoViewRecommender:
+    def __init__(self, db_path=DATABASE_PATH, refresh_seconds=15 * 60, rebuild_seconds=24 * 60 * 60, top_k=TOP_K):
+        """Initialize an empty recommender; build() or start() fills it
+
+        Incremental refreshes run every refresh_seconds and only pair newly
+        seen (student, video) interactions; a full rebuild every
+        rebuild_seconds re-normalizes every row.
+        """
+        self.db_path = db_path
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.top_k = top_k
+        self.lock = threading.RLock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        
+        # Sparse co-occurrence matrix as sorted pair codes with counts
+        self.pair_codes = None
+        self.pair_counts = None
+        # Distinct students per video: sorted video ids and their counts, looked up with searchsorted
+        self.viewer_ids = np.empty(0, dtype=np.int64) if NUMPY_AVAILABLE else None
+        self.viewer_counts = np.empty(0, dtype=np.int64) if NUMPY_AVAILABLE else None
+        self.histories = {}      # user_id -> OrderedDict of the last MAX_HISTORY video ids, most recent last
+        self.seen = {}           # user_id -> every video id the student counts as a viewer of
+        self.related = {}        # video_id -> [(video_id, score)], best first
+        self.progress_watermark = None
+        self.event_watermark = 0
+        self.built_at = None
+        self.last_refresh = None
+        self.stats = {'builds': 0, 'refreshes': 0, 'pairs': 0, 'students': 0}
+    
+    # === BUILD / REFRESH ===
+    
+    def build(self):
+        """Rebuild the matrix and every top-K list from all interactions"""
+        if not NUMPY_AVAILABLE:
+            return
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            progress_watermark, event_watermark = self._watermarks(conn)
+            rows = conn.execute(INTERACTIONS_QUERY).fetchall()
+        finally:
+            conn.close()
+        
+        # Rows are grouped by student, most recent first; only the first MAX_HISTORY are kept
+        histories = {}
+        seen = {}
+        for user_id, video_id, _ in rows:
+            seen.setdefault(user_id, set()).add(video_id)
+            history = histories.setdefault(user_id, [])
+            if len(history) < MAX_HISTORY:
+                history.append(video_id)
+        
+        groups = [np.array(videos, dtype=np.int64) for videos in histories.values()]
+        codes, counts = np.unique(expand_pairs(groups), return_counts=True)
+        viewer_ids, viewer_counts = np.unique(np.array([video_id for videos in seen.values()
+                                                        for video_id in videos], dtype=np.int64),
+                                              return_counts=True)
+        
+        with self.lock:
+            self.pair_codes = codes
+            self.pair_counts = counts
+            self.viewer_ids = viewer_ids
+            self.viewer_counts = viewer_counts.astype(np.int64)
+            self.histories = {user_id: OrderedDict.fromkeys(reversed(videos))
+                              for user_id, videos in histories.items()}
+            self.seen = seen
+            self.progress_watermark = progress_watermark
+            self.event_watermark = event_watermark
+            self.related = self._top_k(codes, counts)
+            self.built_at = self.last_refresh = time.time()
+            self.stats['builds'] += 1
+            self.stats['pairs'] = len(codes)
+            self.stats['students'] = len(histories)
+        print(f"INFO: Recommendations built from {len(rows)} interactions ({len(codes)} co-view pairs)")
+    
+    def refresh(self):
+        """Fold in interactions newer than the watermarks and re-rank touched rows"""
+        if not NUMPY_AVAILABLE:
+            return
+        if self.pair_codes is None:
+            self.build()
+            return
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            progress_watermark, event_watermark = self._watermarks(conn)
+            rows = conn.execute('''
+                SELECT student_id, video_id, last_watched FROM video_progress
+                WHERE last_watched >= ?
+                UNION ALL
+                SELECT user_id, video_id, viewed_at FROM video_view_events
+                WHERE id > ?
+                ORDER BY 3
+            ''', (self.progress_watermark or '', self.event_watermark)).fetchall()
+        finally:
+            conn.close()
+        
+        with self.lock:
+            new_groups = []
+            new_viewers = []
+            touched = set()
+            for user_id, video_id, _ in rows:
+                history = self.histories.setdefault(user_id, OrderedDict())
+                seen = self.seen.setdefault(user_id, set())
+                if video_id in seen:
+                    # Already counted; just make it the most recent entry of the history
+                    history[video_id] = None
+                    history.move_to_end(video_id)
+                    if len(history) > MAX_HISTORY:
+                        history.popitem(last=False)
+                    continue
+                # Pair the new video with the student's existing recent history only
+                partners = list(history)[-(MAX_HISTORY - 1):]
+                history[video_id] = None
+                if len(history) > MAX_HISTORY:
+                    history.popitem(last=False)
+                seen.add(video_id)
+                new_viewers.append(video_id)
+                touched.add(video_id)
+                touched.update(partners)
+                if partners:
+                    new_groups.append((video_id, partners))
+            
+            if new_viewers:
+                merged, inverse = np.unique(np.concatenate((self.viewer_ids, np.array(new_viewers, dtype=np.int64))),
+                                            return_inverse=True)
+                self.viewer_counts = np.bincount(inverse, weights=np.concatenate(
+                    (self.viewer_counts, np.ones(len(new_viewers), dtype=np.int64)))).astype(np.int64)
+                self.viewer_ids = merged
+            if new_groups:
+                new_videos = np.concatenate([np.full(len(p), v, dtype=np.int64) for v, p in new_groups])
+                partners = np.concatenate([np.array(p, dtype=np.int64) for _, p in new_groups])
+                added = np.concatenate((new_videos * PAIR_STRIDE + partners, partners * PAIR_STRIDE + new_videos))
+                merged, inverse = np.unique(np.concatenate((self.pair_codes, added)), return_inverse=True)
+                self.pair_counts = np.bincount(inverse, weights=np.concatenate(
+                    (self.pair_counts, np.ones(len(added), dtype=np.int64)))).astype(np.int64)
+                self.pair_codes = merged
+                self.related.update(self._top_k(self.pair_codes, self.pair_counts, rows=touched))
+            
+            self.progress_watermark = progress_watermark
+            self.event_watermark = event_watermark
+            self.last_refresh = time.time()
+            self.stats['refreshes'] += 1
+            self.stats['pairs'] = len(self.pair_codes)
+            self.stats['students'] = len(self.histories)
+    
+    def _watermarks(self, conn):
+        progress = conn.execute('SELECT MAX(last_watched) FROM video_progress').fetchone()[0]
+        events = conn.execute('SELECT MAX(id) FROM video_view_events').fetchone()[0]
+        return progress, events or 0
+    
+    def _viewer_counts(self, video_ids):
+        """Distinct viewers for each id (1 if unknown), by binary search in the sorted id array"""
+        if not len(self.viewer_ids):
+            return np.ones(len(video_ids), dtype=np.float64)
+        positions = np.minimum(np.searchsorted(self.viewer_ids, video_ids), len(self.viewer_ids) - 1)
+        found = self.viewer_ids[positions] == video_ids
+        return np.where(found, self.viewer_counts[positions], 1).astype(np.float64)
+    
+    def _top_k(self, codes, counts, rows=None):
+        """Top-K lists from the co-occurrence matrix, optionally for selected rows only
+
+        Scores are cosine-normalized (count / sqrt(viewers_a * viewers_b)) so
+        videos everyone watches do not dominate every list.
+        """
+        if rows is not None:
+            row_ids = np.array(sorted(rows), dtype=np.int64)
+            starts = np.searchsorted(codes, row_ids * PAIR_STRIDE)
+            ends = np.searchsorted(codes, (row_ids + 1) * PAIR_STRIDE)
+            selected = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)] or [np.empty(0, dtype=np.int64)])
+            codes, counts = codes[selected], counts[selected]
+        
+        related = {video_id: [] for video_id in rows} if rows is not None else {}
+        if len(codes) == 0:
+            return related
+        
+        left = codes // PAIR_STRIDE
+        right = codes % PAIR_STRIDE
+        scores = counts / np.sqrt(self._viewer_counts(left) * self._viewer_counts(right))
+        
+        # Sort by row, then best score first, and keep the first top_k of each row
+        order = np.lexsort((-scores, left))
+        left, right, scores = left[order], right[order], scores[order]
+        row_starts = np.flatnonzero(np.concatenate(([True], left[1:] != left[:-1])))
+        rank = np.arange(len(left)) - np.repeat(row_starts, np.diff(np.append(row_starts, len(left))))
+        keep = rank < self.top_k
+        
+        for video_id, other_id, score in zip(left[keep].tolist(), right[keep].tolist(), scores[keep].tolist()):
+            related.setdefault(video_id, []).append((other_id, round(score, 4)))
+        return related
+    
+    # === SERVING ===
+    
+    def recommend(self, video_id):
+        """Up to top_k (video_id, score) pairs, best first; empty without co-view data"""
+        with self.lock:
+            return list(self.related.get(video_id, ()))
+    
+    def get_status(self):
+        with self.lock:
+            return dict(self.stats,
+                        numpy_available=NUMPY_AVAILABLE,
+                        videos_ranked=sum(1 for items in self.related.values() if items),
+                        built_at=self.built_at,
+                        last_refresh=self.last_refresh)
+    
+    # === SCHEDULER ===
+    
+    def run_forever(self):
+        try:
+            self.build()
+        except Exception as e:
+            print(f"WARNING: Recommendation build failed: {e}")
+        while not self.stop_event.wait(self.refresh_seconds):
+            try:
+                if self.built_at is None or time.time() - self.built_at > self.rebuild_seconds:
+                    self.build()
+                else:
+                    self.refresh()
+            except Exception as e:
+                print(f"WARNING: Recommendation refresh failed: {e}")
+    
+    def start(self):
+        """Start the build/refresh thread (idempotent; no-op without NumPy)"""
+        if not NUMPY_AVAILABLE:
+            print("WARNING: NumPy not available - related videos fall back to same-subject picks")
+            return
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_forever, name='video-recommendations', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+
+video_recommender = CoViewRecommender()
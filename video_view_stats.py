@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Video View Rollups for B's Nexora Educational Platform
+Folds video_view_events into per-day view counts and an exponentially
+decaying trending score in batches, and keeps the resulting rankings in memory
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+DATABASE_PATH = 'bs_nexora_educational.db'
+
+ROLLUP_NAME = 'video_views'
+TRENDING_HALF_LIFE_HOURS = 48
+# Fixed reference point for forward decay; scores are stored as log(sum(exp(rate * (t - epoch))))
+DECAY_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+POPULAR_PERIODS = {'today': 1, 'week': 7, 'month': 30}
+RANKING_SIZE = 100
+
+def parse_timestamp(value):
+    # video_view_events.viewed_at is CURRENT_TIMESTAMP, i.e. UTC
+    return datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+def log_add(a, b):
+    """log(exp(a) + exp(b)) without overflow"""
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+class VideoViewRollup:
+    def __init__(self, db_path=DATABASE_PATH, batch_size=5000, interval_seconds=60,
+                 half_life_hours=TRENDING_HALF_LIFE_HOURS):
+        """Initialize the rollup worker; rankings are empty until the first run"""
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.decay_rate = math.log(2) / (half_life_hours * 3600)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.rankings = {'trending': []}
+        self.rankings.update({period: [] for period in POPULAR_PERIODS})
+        self.ranked_day = None
+        self.last_run = None
+    
+    def ensure_schema(self, cursor):
+        """Create the rollup tables (called from init_database)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS video_views_daily (
+                video_id INTEGER NOT NULL,
+                day DATE NOT NULL,
+                views INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (video_id, day)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_video_views_daily_day ON video_views_daily (day, video_id, views)')
+        
+        # Forward-decayed trending score: ordering by log_score is ordering by current score
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS video_trending (
+                video_id INTEGER PRIMARY KEY,
+                log_score REAL NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_video_trending_score ON video_trending (log_score DESC)')
+    
+    def event_weight(self, viewed_at):
+        """log(exp(rate * (t - epoch))) for one view"""
+        return self.decay_rate * (parse_timestamp(viewed_at) - DECAY_EPOCH).total_seconds()
+    
+    # === BATCH FEED ===
+    
+    def process_batch(self, conn):
+        """Fold the next batch of view events into both rollups; returns rows consumed"""
+        cursor = conn.cursor()
+        cursor.execute('SELECT last_id FROM rollup_watermarks WHERE name = ?', (ROLLUP_NAME,))
+        row = cursor.fetchone()
+        watermark = row[0] if row else 0
+        
+        cursor.execute('''
+            SELECT id, video_id, viewed_at FROM video_view_events
+            WHERE id > ? ORDER BY id LIMIT ?
+        ''', (watermark, self.batch_size))
+        events = cursor.fetchall()
+        if not events:
+            return 0
+        
+        daily = {}
+        trending = {}
+        for _, video_id, viewed_at in events:
+            key = (video_id, viewed_at[:10])
+            daily[key] = daily.get(key, 0) + 1
+            trending[video_id] = log_add(trending.get(video_id), self.event_weight(viewed_at))
+        
+        cursor.execute('SELECT video_id, log_score FROM video_trending WHERE video_id IN (%s)'
+                       % ','.join('?' * len(trending)), list(trending))
+        for video_id, log_score in cursor.fetchall():
+            trending[video_id] = log_add(log_score, trending[video_id])
+        
+        # One transaction per batch: counts, scores and watermark move together
+        cursor.executemany('''
+            INSERT INTO video_views_daily (video_id, day, views) VALUES (?, ?, ?)
+            ON CONFLICT (video_id, day) DO UPDATE SET views = views + excluded.views
+        ''', [(video_id, day, views) for (video_id, day), views in daily.items()])
+        cursor.executemany('''
+            INSERT INTO video_trending (video_id, log_score, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (video_id) DO UPDATE SET log_score = excluded.log_score, updated_at = excluded.updated_at
+        ''', list(trending.items()))
+        cursor.execute('''
+            INSERT INTO rollup_watermarks (name, last_id, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at
+        ''', (ROLLUP_NAME, events[-1][0]))
+        conn.commit()
+        return len(events)
+    
+    def run_once(self):
+        """Drain pending events in batches, then refresh the in-memory rankings if anything changed"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            consumed = 0
+            while True:
+                processed = self.process_batch(conn)
+                consumed += processed
+                if processed < self.batch_size:
+                    break
+            
+            today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+            if consumed or self.ranked_day != today:
+                self.refresh_rankings(conn, today)
+        finally:
+            conn.close()
+        self.last_run = time.time()
+        return consumed
+    
+    def refresh_rankings(self, conn, today):
+        """Precompute trending and popular lists so endpoints never aggregate on request"""
+        cursor = conn.cursor()
+        now_weight = self.decay_rate * (datetime.now(timezone.utc) - DECAY_EPOCH).total_seconds()
+        cursor.execute('''
+            SELECT video_id, log_score FROM video_trending
+            ORDER BY log_score DESC LIMIT ?
+        ''', (RANKING_SIZE,))
+        rankings = {'trending': [(video_id, round(math.exp(log_score - now_weight), 4))
+                                 for video_id, log_score in cursor.fetchall()]}
+        
+        for period, days in POPULAR_PERIODS.items():
+            since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+            cursor.execute('''
+                SELECT video_id, SUM(views) AS total FROM video_views_daily
+                WHERE day >= ?
+                GROUP BY video_id
+                ORDER BY total DESC, video_id DESC
+                LIMIT ?
+            ''', (since, RANKING_SIZE))
+            rankings[period] = cursor.fetchall()
+        
+        with self.lock:
+            self.rankings = rankings
+            self.ranked_day = today
+    
+    # === READS ===
+    
+    def ranking(self, name):
+        """Precomputed [(video_id, value)] list: 'trending' or a POPULAR_PERIODS key"""
+        with self.lock:
+            return list(self.rankings.get(name, ()))
+    
+    def daily_views(self, video_id, days=30):
+        """Per-day view counts for one video over the last `days` days (primary key range scan)"""
+        since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            return conn.execute('''
+                SELECT day, views FROM video_views_daily
+                WHERE video_id = ? AND day >= ?
+                ORDER BY day
+            ''', (video_id, since)).fetchall()
+        finally:
+            conn.close()
+    
+    # === SCHEDULER ===
+    
+    def run_forever(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"WARNING: View rollup failed: {e}")
+            if self.stop_event.wait(self.interval_seconds):
+                return
+    
+    def start(self):
+        """Start the batch rollup thread (idempotent)"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_forever, name='video-view-rollup', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+
+video_view_rollup = VideoViewRollup()